@@ -0,0 +1,108 @@
+"""Streams @Lupin answers into a Discord reply that is edited as text arrives."""
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+
+import discord
+
+logger = logging.getLogger('LupinBot.answers')
+
+# Embed descriptions allow 4096 characters; leave room for the cursor and a closing code fence
+PAGE_LIMIT = 4000
+CURSOR = " ▌"
+TITLE = "🤖 Lupin AI Assistant"
+
+
+def split_page(text: str, limit: int = PAGE_LIMIT) -> tuple[str, str]:
+    """Split text that overflows one page, preferring a line break, and keep code fences balanced.
+
+    Returns (page, remainder). A code block cut in two is closed on this page and reopened
+    on the next one.
+    """
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    page, rest = text[:cut], text[cut:].lstrip("\n")
+    if page.count("```") % 2:
+        page += "\n```"
+        rest = "```\n" + rest
+    return page, rest
+
+
+class StreamingAnswer:
+    """Posts a placeholder reply, then edits it as answer chunks arrive.
+
+    The first chunk is shown immediately; after that, edits are throttled to one per
+    `edit_interval` seconds so a long answer doesn't hit Discord's edit rate limit. Text
+    that outgrows one embed continues in follow-up messages.
+    """
+
+    def __init__(self, message: discord.Message, edit_interval: float = 1.0, page_limit: int = PAGE_LIMIT):
+        self.message = message
+        self.edit_interval = edit_interval
+        self.page_limit = page_limit
+        self.messages: List[discord.Message] = []
+        self.pages: List[str] = [""]
+        # Whitespace (or a reopened code fence) left over from a split, held until more text arrives
+        self.held = ""
+        self.last_edit = 0.0
+        self.shown: Optional[str] = None
+
+    def _embed(self, index: int, text: str, done: bool) -> discord.Embed:
+        embed = discord.Embed(
+            title=TITLE if index == 0 else f"{TITLE} (continued)",
+            description=text if done else (text + CURSOR),
+            color=discord.Color.blue()
+        )
+        if done and index == len(self.pages) - 1:
+            embed.set_footer(text=f"Asked by {self.message.author.name}")
+        return embed
+
+    async def start(self):
+        """Send the placeholder reply so the user sees a response right away."""
+        placeholder = discord.Embed(title=TITLE, description="✍️ Thinking…", color=discord.Color.blue())
+        self.messages.append(await self.message.reply(embed=placeholder, mention_author=False))
+
+    async def _flush(self, done: bool = False):
+        index = len(self.pages) - 1
+        text = self.pages[index]
+        if not text or (text == self.shown and not done):
+            return
+        await self.messages[index].edit(embed=self._embed(index, text, done))
+        self.shown = text
+        self.last_edit = time.monotonic()
+
+    async def _overflow(self):
+        """Freeze the full page and continue the answer in a new message."""
+        page, rest = split_page(self.pages[-1], self.page_limit)
+        if not rest.replace("```", "").strip():
+            # Nothing to continue with yet; a continuation is only sent once real text follows
+            self.pages[-1], self.held = page, rest
+            return
+        self.pages[-1:] = [page, rest]
+        await self.messages[-1].edit(embed=self._embed(len(self.pages) - 2, page, True))
+        self.messages.append(await self.message.channel.send(embed=self._embed(len(self.pages) - 1, rest, False)))
+        self.shown = rest
+        self.last_edit = time.monotonic()
+
+    async def write(self, chunk: str):
+        self.pages[-1] += self.held + chunk
+        self.held = ""
+        while len(self.pages[-1]) > self.page_limit:
+            await self._overflow()
+        if self.shown is None or time.monotonic() - self.last_edit >= self.edit_interval:
+            await self._flush()
+
+    async def finish(self, fallback: str = "❌ I couldn't generate a response. Please try rephrasing your question."):
+        if not self.pages[-1]:
+            self.pages[-1] = fallback
+        await self._flush(done=True)
+
+    async def stream(self, chunks: AsyncIterator[str]) -> str:
+        """Write every chunk, then finalize the last page. Returns the full answer text."""
+        if not self.messages:
+            await self.start()
+        async for chunk in chunks:
+            await self.write(chunk)
+        await self.finish()
+        return "".join(self.pages)
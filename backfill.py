@@ -0,0 +1,132 @@
+"""Startup history backfill for every guild, run in the background with bounded parallelism."""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Iterable, Optional
+
+logger = logging.getLogger('LupinBot.backfill')
+
+GUILD_CONCURRENCY = int(os.environ.get("BACKFILL_GUILD_CONCURRENCY", "4"))
+# Discord rate-limits message history per channel, so channels read in parallel use separate
+# buckets; this cap keeps the total well under the global request limit (discord.py waits
+# out any 429 itself)
+CHANNEL_CONCURRENCY = int(os.environ.get("BACKFILL_CHANNEL_CONCURRENCY", "8"))
+PROGRESS_INTERVAL = 30
+
+
+class Backfill:
+    """Runs the backfill for many guilds as one background task.
+
+    At most `guild_concurrency` guilds are in progress at once, and across all of them at most
+    `channel_concurrency` channels are read at a time. A guild is finished (its last-seen time
+    recorded) only once all of its channels are done; a failing channel is logged and doesn't
+    stop the others. Progress is logged every `progress_interval` seconds, and cancel() stops
+    the run, leaving unfinished channels to be picked up from their last checkpoint next time.
+    """
+
+    def __init__(self,
+                 channels_for: Callable[[object], Iterable],
+                 backfill_channel: Callable[[object, object], Awaitable[int]],
+                 finish_guild: Callable[[object, int], None],
+                 guild_concurrency: int = GUILD_CONCURRENCY,
+                 channel_concurrency: int = CHANNEL_CONCURRENCY,
+                 progress_interval: float = PROGRESS_INTERVAL):
+        self.channels_for = channels_for
+        self.backfill_channel = backfill_channel
+        self.finish_guild = finish_guild
+        self.guild_slots = asyncio.Semaphore(guild_concurrency)
+        self.channel_slots = asyncio.Semaphore(channel_concurrency)
+        self.progress_interval = progress_interval
+        self.task: Optional[asyncio.Task] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.guilds_total = 0
+        self.guilds_done = 0
+        self.guilds_failed = 0
+        self.channels_done = 0
+        self.channels_failed = 0
+        self.messages = 0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, guilds) -> asyncio.Task:
+        """Start backfilling `guilds` in the background (a no-op while a run is in progress)."""
+        if not self.running:
+            self.task = asyncio.create_task(self.run(list(guilds)), name='backfill')
+        return self.task
+
+    async def cancel(self):
+        if self.running:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self, guilds: list):
+        self.started_at, self.finished_at = time.monotonic(), None
+        self.guilds_total = len(guilds)
+        self.guilds_done = self.guilds_failed = self.channels_done = self.channels_failed = self.messages = 0
+        logger.info(f'Backfilling {len(guilds)} guild(s)')
+        reporter = asyncio.create_task(self._report())
+        try:
+            await asyncio.gather(*(self._guild(guild) for guild in guilds))
+        except asyncio.CancelledError:
+            logger.info(f'Backfill cancelled: {self.describe()}')
+            raise
+        finally:
+            reporter.cancel()
+            self.finished_at = time.monotonic()
+        logger.info(f'Backfill finished: {self.describe()}')
+
+    async def _guild(self, guild):
+        async with self.guild_slots:
+            try:
+                channels = list(self.channels_for(guild))
+                counts = await asyncio.gather(*(self._channel(guild, channel) for channel in channels))
+                self.finish_guild(guild, sum(counts))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.guilds_failed += 1
+                logger.error(f'Failed backfill for guild {guild.id}: {e}')
+            finally:
+                self.guilds_done += 1
+
+    async def _channel(self, guild, channel) -> int:
+        async with self.channel_slots:
+            try:
+                count = await self.backfill_channel(guild, channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.channels_failed += 1
+                logger.error(f'Backfill error in guild {guild.id} channel {channel.id}: {e}')
+                return 0
+        self.channels_done += 1
+        self.messages += count
+        return count
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            logger.info(f'Backfill progress: {self.describe()}')
+
+    def describe(self) -> str:
+        elapsed = (self.finished_at or time.monotonic()) - (self.started_at or time.monotonic())
+        return (f'{self.guilds_done}/{self.guilds_total} guilds, {self.channels_done} channels, '
+                f'{self.messages} messages, {self.guilds_failed + self.channels_failed} failed, {elapsed:.0f}s')
+
+    def snapshot(self) -> dict:
+        return {
+            'running': self.running,
+            'guilds_total': self.guilds_total,
+            'guilds_done': self.guilds_done,
+            'guilds_failed': self.guilds_failed,
+            'channels_done': self.channels_done,
+            'channels_failed': self.channels_failed,
+            'messages': self.messages,
+        }
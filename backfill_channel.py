@@ -5,7 +5,9 @@ import discord
 from discord.ext import commands
 import os
 import asyncio
+from contextlib import aclosing
 from database import Database
+from history import parallel_history
 from datetime import datetime
 import re
 import logging
@@ -94,17 +96,16 @@ async def backfill_channel(guild_id: int, channel_name: str = 'daily-code'):
                     
                     # Store only Lupin bot messages first, then process chronologically
                     messages = []
-                    async for message in channel.history(limit=None):  # Read all messages
-                        # Only process messages from Lupin bot that contain streak information
-                        if (message.author.bot and 
-                            message.author.name == 'Lupin' and 
-                            message.embeds and 
-                            any('streak' in embed.title.lower() or 'day' in embed.title.lower() 
-                                for embed in message.embeds if embed.title)):
-                            messages.append(message)
-                    
-                    # Sort messages by date (oldest first)
-                    messages.sort(key=lambda m: m.created_at)
+                    # Read all messages, oldest first, with several cursors over the channel's lifetime
+                    async with aclosing(parallel_history(channel)) as history:
+                        async for message in history:
+                            # Only process messages from Lupin bot that contain streak information
+                            if (message.author.bot and 
+                                message.author.name == 'Lupin' and 
+                                message.embeds and 
+                                any('streak' in embed.title.lower() or 'day' in embed.title.lower() 
+                                    for embed in message.embeds if embed.title)):
+                                messages.append(message)
                     
                     # Track user streaks chronologically
                     user_streaks = {}  # user_id -> {'current': int, 'longest': int, 'last_date': date, 'last_day': int}
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark for text code detection on the held-out part of data/code_corpus.jsonl.
+
+Compares the keyword check in Streaks.detect_code, the local naive Bayes model
+(inline and through the process pool the bot uses), and Gemini when
+GEMINI_API_KEY is set. The model evaluated here is retrained on the training
+split only, so none of the test examples were seen during training.
+
+Usage: python bench_code_classifier.py [--gemini-limit 20]
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import code_classifier
+import gemini
+from cogs.streaks import Streaks
+
+
+def report(name, verdicts, labels, latencies):
+    verdicts = np.asarray(verdicts, dtype=bool)
+    labels = np.asarray(labels[:len(verdicts)], dtype=bool)
+    accuracy = float(np.mean(verdicts == labels))
+    precision = float(np.sum(verdicts & labels) / max(1, np.sum(verdicts)))
+    recall = float(np.sum(verdicts & labels) / max(1, np.sum(labels)))
+    p50 = statistics.median(latencies) * 1000
+    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{name:<22} {accuracy:>7.1%} {precision:>9.1%} {recall:>7.1%} {p50:>9.3f}ms {p95:>9.3f}ms  (n={len(verdicts)})")
+
+
+def timed_each(fn, texts):
+    verdicts, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        verdicts.append(fn(text))
+        latencies.append(time.perf_counter() - start)
+    return verdicts, latencies
+
+
+async def timed_each_async(fn, texts):
+    verdicts, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        verdicts.append(await fn(text))
+        latencies.append(time.perf_counter() - start)
+    return verdicts, latencies
+
+
+async def gemini_is_code(text: str) -> bool:
+    response = await gemini.generate(
+        gemini.get_client(),
+        "gemini-2.5-flash",
+        [f"Message:\n{text}\n\nDoes this chat message contain programming code, terminal output or a stack trace?"],
+        gemini.types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=gemini.CodeDetectionResult,
+        ),
+        gemini.DETECTION_TIMEOUT,
+    )
+    result = gemini.CodeDetectionResult.model_validate_json(response.text)
+    return result.contains_code and result.confidence > 0.5
+
+
+async def main(gemini_limit):
+    texts, labels = code_classifier.load_corpus()
+    train_texts, train_labels, test_texts, test_labels = code_classifier.split_corpus(texts, labels)
+    model = code_classifier.NaiveBayesModel.fit(train_texts, train_labels)
+
+    cog = Streaks.__new__(Streaks)
+    cog.code_pattern = re.compile(r'```[\s\S]*?```|`[^`]+`')
+
+    print(f"Held-out examples: {len(test_texts)} ({sum(test_labels)} code)\n")
+    print(f"{'method':<22} {'accuracy':>7} {'precision':>9} {'recall':>7} {'p50':>11} {'p95':>11}")
+    print("-" * 76)
+
+    verdicts, latencies = timed_each(cog.detect_code, test_texts)
+    report("keywords", verdicts, test_labels, latencies)
+
+    verdicts, latencies = timed_each(lambda t: bool(model.predict_proba([t])[0] >= 0.5), test_texts)
+    report("naive bayes (inline)", verdicts, test_labels, latencies)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.npz')
+        model.save(path)
+        classifier = code_classifier.CodeClassifier(path)
+        await classifier.is_code("warm up the worker")
+        verdicts, latencies = await timed_each_async(classifier.is_code, test_texts)
+        classifier.shutdown()
+    report("naive bayes (pool)", verdicts, test_labels, latencies)
+
+    if gemini.get_client() is None:
+        print(f"{'gemini':<22} skipped (GEMINI_API_KEY not set)")
+    else:
+        sample = test_texts[:gemini_limit]
+        verdicts, latencies = await timed_each_async(gemini_is_code, sample)
+        report("gemini", verdicts, test_labels, latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gemini-limit', type=int, default=20, help='Held-out examples sent to Gemini (uses quota)')
+    args = parser.parse_args()
+    asyncio.run(main(args.gemini_limit))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Load test for the AI paths in gemini.py against the local stand-in in mock_gemini.py.
+
+Drives answer_question and detect_code_in_image through the real google-genai client
+at each requested concurrency and reports throughput, latency percentiles, local
+fallbacks and event-loop lag (how late a 10 ms timer fires while the load runs).
+The stand-in serves from its own thread so its work doesn't count as loop lag.
+
+By default the per-model token buckets are lifted so the pipeline itself is measured;
+pass --keep-limits to see the bot's real request pacing instead.
+
+Usage: python bench_gemini_load.py [--path qa image] [--concurrency 1 4 16 64] [--requests 200]
+                                   [--latency lognormal:0.4,0.5] [--error-rate 0.02] [--rpm 0]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+from datetime import date
+
+import gemini
+from heatmap import render_png
+from mock_gemini import MockGemini
+
+LAG_INTERVAL = 0.01
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def measure_lag(samples, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(loop.time() - start - LAG_INTERVAL)
+
+
+def fallback_count():
+    return sum(gemini.usage.fallbacks.values())
+
+
+async def run_level(path, concurrency, total, png):
+    if path == 'qa':
+        # Distinct questions so the answer cache doesn't serve them
+        call = lambda i: gemini.answer_question(f"load test question {concurrency}-{i}: what does a dict do?")
+    else:
+        call = lambda i: gemini.detect_code_in_image(png, 'image/png')
+    fallbacks_before = fallback_count()
+
+    latencies = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - start)
+
+    lag, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(measure_lag(lag, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    # Errors, timeouts and open circuits all end in a local fallback answer
+    fallbacks = fallback_count() - fallbacks_before
+    print(
+        f"{path:<6} {concurrency:>5} {total / elapsed:>8.1f}/s"
+        f" {statistics.median(latencies) * 1000:>8.0f} {percentile(latencies, 0.95) * 1000:>8.0f}"
+        f" {percentile(latencies, 0.99) * 1000:>8.0f} {max(latencies) * 1000:>8.0f}ms"
+        f" {fallbacks:>6}"
+        f" {percentile(lag, 0.99) * 1000:>9.1f} {max(lag, default=0) * 1000:>8.1f}ms"
+    )
+
+
+async def main(args):
+    # Injected errors would otherwise log one line per failed call
+    logging.getLogger('LupinBot').setLevel(logging.CRITICAL)
+    mock = MockGemini(latency=args.latency, error_rate=args.error_rate, rpm=args.rpm, seed=args.seed)
+    base_url = mock.start_in_thread()
+    os.environ['GEMINI_BASE_URL'] = base_url
+    os.environ.setdefault('GEMINI_API_KEY', 'mock')
+
+    if not args.keep_limits:
+        for model in gemini.MODEL_LIMITS:
+            gemini.MODEL_LIMITS[model] = (1_000_000, 1_000)
+    png = render_png([True, False] * 30, date(2024, 1, 31))
+    # Creating the client and its first connection is a one-off cost that would show up as lag
+    await gemini.answer_question("warm up")
+
+    print(f"Stand-in at {base_url}: latency {args.latency}, errors {args.error_rate:.0%}, "
+          f"rpm {args.rpm or 'unlimited'}, GEMINI_MAX_CONCURRENCY={gemini.MAX_CONCURRENCY}\n")
+    print(f"{'path':<6} {'conc':>5} {'thruput':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>10}"
+          f" {'failed':>6} {'lag p99':>9} {'lag max':>10}")
+    print("-" * 88)
+    try:
+        for path in args.path:
+            for concurrency in args.concurrency:
+                gemini._buckets.clear()
+                gemini._breakers.clear()
+                await run_level(path, concurrency, args.requests, png)
+    finally:
+        mock.stop_thread()
+    print(f"\nStand-in stats: {dict(mock.stats)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', nargs='+', choices=['qa', 'image'], default=['qa', 'image'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests', type=int, default=200, help='Calls per path and concurrency level')
+    parser.add_argument('--latency', default='lognormal:0.4,0.5')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep-limits', action='store_true', help="Keep the bot's per-model token buckets")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark for image code detection: the old one-image-at-a-time path against
+concurrent downloads plus batched Gemini classification.
+
+Everything runs against a local stand-in server, so no API key or quota is used:
+  GET  /attachments/<n>.png   serves a small PNG after a simulated CDN delay
+  POST /generate              answers like Gemini after a per-request round trip
+                              plus a per-image processing cost
+
+Usage: python bench_image_detection.py [--images 1 3 5 10] [--rounds 5]
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+
+import gemini
+import http_client
+from cache import AttachmentCache
+from cogs.streaks import Streaks
+from heatmap import render_png
+
+DOWNLOAD_DELAY = 0.08
+GEMINI_ROUND_TRIP = 0.6
+GEMINI_PER_IMAGE = 0.05
+
+
+async def handle_attachment(request):
+    await asyncio.sleep(DOWNLOAD_DELAY)
+    return web.Response(body=request.app['png'], content_type='image/png')
+
+
+async def handle_generate(request):
+    body = await request.json()
+    request.app['stats']['requests'] += 1
+    await asyncio.sleep(GEMINI_ROUND_TRIP + GEMINI_PER_IMAGE * body['images'])
+    # Worst case for the old path: no image contains code, so it never stops early
+    if body['batch']:
+        text = json.dumps({'verdicts': [
+            {'index': i, 'contains_code': False, 'confidence': 0.9} for i in range(1, body['images'] + 1)
+        ]})
+    else:
+        text = json.dumps({'contains_code': False, 'confidence': 0.9})
+    return web.json_response({'text': text})
+
+
+class StandInModels:
+    """Replaces client.aio.models, forwarding each request to the local stand-in server."""
+
+    def __init__(self, session, base_url):
+        self.session = session
+        self.base_url = base_url
+
+    async def generate_content(self, model, contents, config):
+        images = sum(1 for part in contents if not isinstance(part, str))
+        batch = config.response_schema is gemini.BatchCodeDetectionResult
+        async with self.session.post(f'{self.base_url}/generate', json={'images': images, 'batch': batch}) as resp:
+            return SimpleNamespace(text=(await resp.json())['text'])
+
+
+async def old_has_media_or_code(message) -> bool:
+    """The sequential path this change replaced: one session, download and Gemini call per image."""
+    for attachment in message.attachments:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(attachment.url) as resp:
+                if resp.status == 200:
+                    image_bytes = await resp.read()
+                    if await gemini.detect_code_in_image(image_bytes, attachment.content_type):
+                        return True
+    return False
+
+
+def fake_message(base_url, count):
+    attachments = [
+        SimpleNamespace(id=i, filename=f'shot{i}.png', content_type='image/png', url=f'{base_url}/attachments/{i}.png')
+        for i in range(count)
+    ]
+    return SimpleNamespace(id=count, content='#day 1', attachments=attachments, guild=None)
+
+
+async def timed(app, fn, message, rounds):
+    stats = app['stats']
+    stats['requests'] = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        # Each round is a fresh message as far as the attachment cache is concerned
+        http_client.attachment_cache = AttachmentCache()
+        await fn(message)
+    return (time.perf_counter() - start) / rounds, stats['requests'] / rounds
+
+
+async def main(image_counts, rounds):
+    app = web.Application()
+    app['png'] = render_png([True, False] * 30, date(2024, 1, 31))
+    app['stats'] = {'requests': 0}
+    app.router.add_get('/attachments/{name}', handle_attachment)
+    app.router.add_post('/generate', handle_generate)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f'http://127.0.0.1:{port}'
+
+    # Keep the limiter out of the measurement
+    gemini.MODEL_LIMITS['gemini-2.5-flash'] = (1_000_000, 1_000)
+    gemini._buckets.clear()
+    gemini._breakers.clear()
+
+    cog = Streaks.__new__(Streaks)
+    cog.code_pattern = re.compile(r'```[\s\S]*?```|`[^`]+`')
+    cog.classifier = None
+
+    async with aiohttp.ClientSession() as session:
+        gemini._client = SimpleNamespace(aio=SimpleNamespace(models=StandInModels(session, base_url)))
+        print(f"{'images':>6} | {'sequential':>16} | {'batched':>16} | speedup")
+        print("-" * 60)
+        for count in image_counts:
+            message = fake_message(base_url, count)
+            old_time, old_calls = await timed(app, old_has_media_or_code, message, rounds)
+            new_time, new_calls = await timed(app, cog.has_media_or_code, message, rounds)
+            print(
+                f"{count:>6} | {old_time:>7.3f}s {old_calls:>3.0f} req | {new_time:>7.3f}s {new_calls:>3.0f} req"
+                f" | {old_time / new_time:>5.1f}x"
+            )
+
+    await http_client.close_session()
+    await runner.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, nargs='+', default=[1, 3, 5, 10])
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.images, args.rounds))
@@ -1,8 +1,10 @@
 """Simple in-memory cache for API responses."""
 import asyncio
 import logging
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Optional, Tuple
+from typing import Any, Awaitable, Callable, Optional, Tuple
 
 logger = logging.getLogger('LupinBot.cache')
 
@@ -78,5 +80,152 @@ class CacheManager:
         """Get the number of items in the cache."""
         return len(self.cache)
 
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed time-to-live."""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (value, expires_at)
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value: Any):
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into a single execution.
+
+    The work runs as its own task, so one caller being cancelled does not cancel it
+    for the others still waiting on the result.
+    """
+
+    def __init__(self):
+        self.in_flight: dict[Any, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def lead(self, key) -> asyncio.Future:
+        """Claim `key` for work the caller performs itself (e.g. while streaming it elsewhere).
+
+        Other callers of do() with the same key wait on the returned future, which the
+        caller must resolve with set_result or set_exception.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key, task: asyncio.Future):
+        self.in_flight.pop(key, None)
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+class AttachmentCache:
+    """Downloaded attachment bytes and the verdicts derived from them, keyed by attachment id.
+
+    Entries expire `ttl` seconds after they were stored, and the least recently used are
+    dropped once the cached bytes exceed `max_bytes`. An entry records whether it holds the
+    whole file or just its first bytes, so a caller needing more than that fetches again.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # id -> {'data': bytes | None, 'complete': bool, 'verdicts': dict, 'expires': float}
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, key) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is not None and entry['expires'] < time.monotonic():
+            self._drop(key)
+            entry = None
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        self.size -= len(entry['data'] or b'')
+
+    def _slot(self, key) -> dict:
+        entry = self._entry(key)
+        if entry is None:
+            # Verdict-only entries hold no bytes, so also clear out expired ones here
+            now = time.monotonic()
+            while self.entries and next(iter(self.entries.values()))['expires'] < now:
+                self._drop(next(iter(self.entries)))
+            entry = self.entries[key] = {'data': None, 'complete': False, 'verdicts': {},
+                                         'expires': time.monotonic() + self.ttl}
+        return entry
+
+    def get_data(self, key) -> Tuple[Optional[bytes], bool]:
+        """Return (data, complete) for a cached download, or (None, False)."""
+        entry = self._entry(key)
+        if entry is None or entry['data'] is None:
+            self.misses += 1
+            return None, False
+        self.hits += 1
+        return entry['data'], entry['complete']
+
+    def set_data(self, key, data: bytes, complete: bool):
+        if len(data) > self.max_bytes:
+            return
+        entry = self._slot(key)
+        # Keep whichever copy holds more of the file
+        if entry['data'] is not None and (entry['complete'] or (not complete and len(entry['data']) >= len(data))):
+            return
+        self.size += len(data) - len(entry['data'] or b'')
+        entry['data'], entry['complete'] = data, complete
+        while self.size > self.max_bytes:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def get_verdict(self, key, kind: str) -> Optional[Any]:
+        entry = self._entry(key)
+        return entry['verdicts'].get(kind) if entry is not None else None
+
+    def set_verdict(self, key, kind: str, value: Any):
+        self._slot(key)['verdicts'][kind] = value
+
+    def snapshot(self) -> dict:
+        return {'entries': len(self.entries), 'bytes': self.size, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
 # Global cache instance
 cache = CacheManager(default_ttl=600)  # 10 minutes default
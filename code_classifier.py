@@ -0,0 +1,173 @@
+"""Offline chat-vs-code classifier: hashed character n-grams with multinomial naive Bayes.
+
+The model is trained from data/code_corpus.jsonl and shipped as data/code_classifier.npz.
+Retrain it with `python code_classifier.py` after editing the corpus.
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger('LupinBot.code_classifier')
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CORPUS_PATH = os.path.join(DATA_DIR, 'code_corpus.jsonl')
+MODEL_PATH = os.path.join(DATA_DIR, 'code_classifier.npz')
+
+NGRAM_SIZES = (1, 2, 3, 4)
+HASH_BITS = 16
+# Only the start of long messages and files is looked at
+MAX_CHARS = 4000
+# Bytes of an attachment read for classification
+ATTACHMENT_HEAD_BYTES = 4096
+
+
+def featurize(text: str, hash_bits: int = HASH_BITS) -> np.ndarray:
+    """Log-scaled counts of hashed byte n-grams (sizes NGRAM_SIZES) for one text."""
+    size = 1 << hash_bits
+    data = np.frombuffer(text[:MAX_CHARS].encode('utf-8', 'replace'), dtype=np.uint8).astype(np.uint32)
+    counts = np.zeros(size, dtype=np.float32)
+    for n in NGRAM_SIZES:
+        windows = len(data) - n + 1
+        if windows <= 0:
+            break
+        # FNV-1 style rolling hash, seeded with n so equal bytes in different sizes land apart
+        h = np.full(windows, n, dtype=np.uint32)
+        for k in range(n):
+            h = (h * np.uint32(16777619)) ^ data[k:k + windows]
+        buckets = (h * np.uint32(2654435761)) >> np.uint32(32 - hash_bits)
+        counts += np.bincount(buckets, minlength=size).astype(np.float32)
+    return np.log1p(counts)
+
+
+def attachment_text(filename: str, head: bytes) -> str:
+    """Text the model sees for an attachment: its name, then the start of its content."""
+    return f"{filename}\n{head[:ATTACHMENT_HEAD_BYTES].decode('utf-8', 'replace')}"
+
+
+class NaiveBayesModel:
+    """Binary multinomial naive Bayes stored as one log-odds weight per hash bucket plus a bias."""
+
+    def __init__(self, weights: np.ndarray, bias: float, hash_bits: int = HASH_BITS):
+        self.weights = weights.astype(np.float32)
+        self.bias = float(bias)
+        self.hash_bits = hash_bits
+
+    @classmethod
+    def fit(cls, texts: List[str], labels: List[bool], alpha: float = 0.1, hash_bits: int = HASH_BITS):
+        features = np.stack([featurize(t, hash_bits) for t in texts])
+        labels = np.asarray(labels, dtype=bool)
+        code = features[labels].sum(axis=0) + alpha
+        chat = features[~labels].sum(axis=0) + alpha
+        weights = np.log(code / code.sum()) - np.log(chat / chat.sum())
+        bias = np.log(labels.sum() / (~labels).sum())
+        return cls(weights, bias, hash_bits)
+
+    def predict_proba(self, texts: Iterable[str]) -> np.ndarray:
+        """Probability that each text is code."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros(0)
+        scores = np.stack([featurize(t, self.hash_bits) for t in texts]) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(scores, -50, 50)))
+
+    def save(self, path: str = MODEL_PATH):
+        np.savez_compressed(path, weights=self.weights.astype(np.float16), bias=self.bias, hash_bits=self.hash_bits)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH):
+        with np.load(path) as data:
+            return cls(data['weights'], float(data['bias']), int(data['hash_bits']))
+
+
+def load_corpus(path: str = CORPUS_PATH):
+    """Return (texts, labels) from the JSONL corpus, labels True for code."""
+    texts, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                texts.append(row['text'])
+                labels.append(row['label'] == 'code')
+    return texts, labels
+
+
+def split_corpus(texts, labels, every: int = 5):
+    """Deterministic split: every `every`-th example is held out for evaluation."""
+    train = [(t, l) for i, (t, l) in enumerate(zip(texts, labels)) if i % every]
+    test = [(t, l) for i, (t, l) in enumerate(zip(texts, labels)) if not i % every]
+    return [t for t, _ in train], [l for _, l in train], [t for t, _ in test], [l for _, l in test]
+
+
+# Per-process model used by pool workers
+_worker_model: Optional[NaiveBayesModel] = None
+
+
+def _init_worker(path: str):
+    global _worker_model
+    _worker_model = NaiveBayesModel.load(path)
+
+
+def _predict_in_worker(texts: List[str]) -> List[float]:
+    return _worker_model.predict_proba(texts).tolist()
+
+
+class CodeClassifier:
+    """Runs model inference in a process pool so it never blocks the event loop."""
+
+    def __init__(self, path: str = MODEL_PATH, workers: int = 1, threshold: float = 0.5):
+        self.path = path
+        self.workers = workers
+        self.threshold = threshold
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.path,)
+            )
+        return self.pool
+
+    async def predict(self, texts: List[str]) -> List[float]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ensure_pool(), _predict_in_worker, list(texts))
+
+    async def is_code(self, text: str) -> bool:
+        return (await self.predict([text]))[0] >= self.threshold
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+_classifier: Optional[CodeClassifier] = None
+
+
+def get_classifier() -> Optional[CodeClassifier]:
+    """Shared classifier, or None when the model file hasn't been built."""
+    global _classifier
+    if _classifier is None:
+        if not os.path.exists(MODEL_PATH):
+            logger.warning(f"Code classifier model not found at {MODEL_PATH}; run code_classifier.py to build it")
+            return None
+        workers = int(os.environ.get("CODE_CLASSIFIER_WORKERS", "1"))
+        _classifier = CodeClassifier(MODEL_PATH, workers=workers)
+    return _classifier
+
+
+if __name__ == '__main__':
+    texts, labels = load_corpus()
+    train_texts, train_labels, test_texts, test_labels = split_corpus(texts, labels)
+    held_out = NaiveBayesModel.fit(train_texts, train_labels)
+    predictions = held_out.predict_proba(test_texts) >= 0.5
+    accuracy = float(np.mean(predictions == np.asarray(test_labels)))
+    print(f"Held-out accuracy: {accuracy:.1%} on {len(test_texts)} examples")
+
+    model = NaiveBayesModel.fit(texts, labels)
+    model.save()
+    print(f"Trained on {len(texts)} examples, wrote {MODEL_PATH} ({os.path.getsize(MODEL_PATH) / 1024:.0f} KiB)")
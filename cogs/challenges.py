@@ -4,11 +4,14 @@ from discord import app_commands
 from database import Database
 import logging
 import random
+import asyncio
+from contextlib import aclosing
 from datetime import datetime, timedelta
 import pytz
 import re
 from typing import Optional
 import gemini
+from history import parallel_history
 
 logger = logging.getLogger('LupinBot.challenges')
 
@@ -17,10 +20,19 @@ DAYS = [
 ]
 DAY_TO_INDEX = {name: idx for idx, name in enumerate(DAYS)}  # Monday=0
 
+# Weekly challenges are generated this long before they are due
+PREGENERATE_LEAD = timedelta(hours=1)
+# How long after the due time a late post is still made
+POST_GRACE = timedelta(minutes=15)
+# Generation attempts per week, and the pause after each failed one
+MAX_GENERATION_ATTEMPTS = 5
+RETRY_BACKOFF = [60, 120, 300, 600]
+
 class Challenges(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = Database()
+        self.generation_tasks: dict[int, asyncio.Task] = {}
         self.weekly_challenge_loop.start()
         
         self.challenge_pool = [
@@ -48,6 +60,8 @@ class Challenges(commands.Cog):
     
     def cog_unload(self):
         self.weekly_challenge_loop.cancel()
+        for task in self.generation_tasks.values():
+            task.cancel()
 
     def _get_ist_now(self):
         return datetime.now(pytz.timezone('Asia/Kolkata'))
@@ -56,15 +70,6 @@ class Challenges(commands.Cog):
         # default Sunday (index 6), but we use Monday=0 convention
         conn = self.db.get_connection()
         cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS challenge_settings (
-                guild_id INTEGER PRIMARY KEY,
-                weekday TEXT DEFAULT 'Sunday',
-                time_ist TEXT DEFAULT '09:00',
-                output_channel_id INTEGER
-            )
-        """)
-        conn.commit()
         cur.execute("SELECT weekday FROM challenge_settings WHERE guild_id = ?", (guild_id,))
         row = cur.fetchone()
         conn.close()
@@ -118,43 +123,42 @@ class Challenges(commands.Cog):
         
         for channel in channels:
             try:
-                async for msg in channel.history(limit=1000, after=cutoff_utc, oldest_first=True):
-                    text = (msg.content or '').strip()
-                    # Keep it concise
-                    if text:
-                        if len(text) > 300:
-                            text = text[:300]
-                        snippets.append(text)
-                    # Pull small code sections from attachments' filenames
-                    for a in msg.attachments:
-                        if a.filename:
-                            snippets.append(f"file:{a.filename}")
-                    if len(snippets) >= 50:
-                        break
+                async with aclosing(parallel_history(channel, after=cutoff_utc, limit=1000)) as messages:
+                    async for msg in messages:
+                        text = (msg.content or '').strip()
+                        # Keep it concise
+                        if text:
+                            if len(text) > 300:
+                                text = text[:300]
+                            snippets.append(text)
+                        # Pull small code sections from attachments' filenames
+                        for a in msg.attachments:
+                            if a.filename:
+                                snippets.append(f"file:{a.filename}")
+                        if len(snippets) >= 50:
+                            break
             except Exception:
                 continue
         return snippets
 
-    async def _post_weekly_challenge_if_due(self, guild: discord.Guild):
-        ist_now = self._get_ist_now()
-        target_weekday = self._guild_weekday_target(guild.id)  # Monday=0
-        time_ist = self._guild_challenge_time_ist(guild.id)  # 'HH:MM' 24h stored
+    def _current_due_time(self, guild_id: int, ist_now: datetime) -> Optional[datetime]:
+        """Return the guild's weekly due time if ist_now is inside its generation or posting window."""
+        target_weekday = self._guild_weekday_target(guild_id)  # Monday=0
+        time_ist = self._guild_challenge_time_ist(guild_id)  # 'HH:MM' 24h stored
         try:
             hour, minute = map(int, time_ist.split(':'))
         except Exception:
             hour, minute = 9, 0
 
-        if ist_now.weekday() != target_weekday:
-            return
-        if not (ist_now.hour == hour and ist_now.minute == minute):
-            return
-
-        # Avoid duplicate within week using DB flag
-        week_key = ist_now.strftime('%G-W%V')
-        last_week = self.db.get_last_week_sent(guild.id)
-        if last_week == week_key:
-            return
+        # Check this week's slot and next week's, since the lead window can start the week before
+        week_start = (ist_now - timedelta(days=ist_now.weekday())).replace(hour=hour, minute=minute, second=0, microsecond=0)
+        for weeks_ahead in (0, 1):
+            due = week_start + timedelta(days=target_weekday, weeks=weeks_ahead)
+            if due - PREGENERATE_LEAD <= ist_now < due + POST_GRACE:
+                return due
+        return None
 
+    def _resolve_output_channel(self, guild: discord.Guild):
         output_channel_id = self._guild_challenge_channel(guild.id)
         if not output_channel_id:
             # fallback to reminder_channel if unset
@@ -163,27 +167,82 @@ class Challenges(commands.Cog):
                 _, _, _, reminder_channel_id = settings
                 output_channel_id = reminder_channel_id
         if not output_channel_id:
+            return None
+        return guild.get_channel(output_channel_id)
+
+    async def _pregenerate_challenge(self, guild: discord.Guild, channel, week_key: str, attempts_done: int):
+        """Generate and store the week's challenge, retrying with backoff until it succeeds or attempts run out."""
+        try:
+            snippets = await self._collect_last7_history_snippets(guild)
+        except Exception as e:
+            logger.error(f'Could not collect challenge history for {guild.name}: {e}')
+            snippets = []
+        for attempt in range(attempts_done, MAX_GENERATION_ATTEMPTS):
+            try:
+                text = await gemini.generate_challenge_from_history(
+                    snippets, guild.name, channel.name, fallback=False, guild_id=guild.id
+                )
+                self.db.record_challenge_attempt(guild.id, week_key, challenge_text=text)
+                logger.info(f'Pre-generated weekly challenge {week_key} for {guild.name} (attempt {attempt + 1})')
+                return
+            except Exception as e:
+                self.db.record_challenge_attempt(guild.id, week_key, error=str(e)[:200])
+                logger.warning(f'Weekly challenge generation attempt {attempt + 1} failed for {guild.name}: {e}')
+                if attempt + 1 < MAX_GENERATION_ATTEMPTS:
+                    await asyncio.sleep(RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF) - 1)])
+        logger.error(f'Giving up on generating weekly challenge {week_key} for {guild.name}')
+
+    async def _post_weekly_challenge_if_due(self, guild: discord.Guild):
+        ist_now = self._get_ist_now()
+        due = self._current_due_time(guild.id, ist_now)
+        if due is None:
             return
 
-        channel = guild.get_channel(output_channel_id)
+        # Avoid duplicate within week using DB flag
+        week_key = due.strftime('%G-W%V')
+        last_week = self.db.get_last_week_sent(guild.id)
+        if last_week == week_key:
+            return
+
+        channel = self._resolve_output_channel(guild)
         if not channel:
             return
 
-        # Build challenge from last 7 days
-        try:
-            snippets = await self._collect_last7_history_snippets(guild)
-            challenge_text = gemini.generate_challenge_from_history(snippets, guild.name, channel.name)
-        except Exception:
+        pending = self.db.get_pending_challenge(guild.id, week_key)
+        challenge_text, attempts = (pending[0], pending[1]) if pending else (None, 0)
+        task = self.generation_tasks.get(guild.id)
+        generating = task is not None and not task.done()
+
+        # Start (or resume after a restart) generation in the background; posting never waits on Gemini
+        if not challenge_text and not generating and attempts < MAX_GENERATION_ATTEMPTS:
+            self.generation_tasks[guild.id] = asyncio.create_task(
+                self._pregenerate_challenge(guild, channel, week_key, attempts)
+            )
+            generating = True
+
+        if ist_now < due:
+            return
+        if not challenge_text and generating and ist_now < due + POST_GRACE - timedelta(minutes=1):
+            # Generation started late (e.g. the bot was offline); give it until the end of the grace period
+            return
+
+        from_history = bool(challenge_text)
+        if not challenge_text:
+            if generating:
+                self.generation_tasks[guild.id].cancel()
             challenge_text = random.choice(self.challenge_pool)
+            logger.warning(f'Posting pool challenge for {guild.name}; pre-generation did not succeed')
 
         embed = discord.Embed(
             title="💻 Weekly Coding Challenge",
             description=challenge_text,
             color=discord.Color.purple()
         )
-        embed.set_footer(text="This challenge was generated based on recent activity in #daily-code (IST timezone)")
+        if from_history:
+            embed.set_footer(text="This challenge was generated based on recent activity in #daily-code (IST timezone)")
         await channel.send(embed=embed)
         self.db.set_last_week_sent(guild.id, week_key)
+        self.db.mark_challenge_posted(guild.id, week_key, challenge_text)
         logger.info(f'Sent weekly challenge to {guild.name}')
 
     @tasks.loop(minutes=1)
@@ -226,10 +285,14 @@ class Challenges(commands.Cog):
 
     @app_commands.command(name="challenge", description="Get a random coding challenge (inspired by last 7 days)")
     async def challenge(self, interaction: discord.Interaction):
+        # Generation can take longer than the 3 second interaction deadline
+        await interaction.response.defer()
         # Prefer Gemini-based challenge using history
         try:
             snippets = await self._collect_last7_history_snippets(interaction.guild)
-            challenge_text = gemini.generate_challenge_from_history(snippets, interaction.guild.name, interaction.channel.name)
+            challenge_text = await gemini.generate_challenge_from_history(
+                snippets, interaction.guild.name, interaction.channel.name, guild_id=interaction.guild_id
+            )
         except Exception:
             challenge_text = random.choice(self.challenge_pool)
         
@@ -239,7 +302,7 @@ class Challenges(commands.Cog):
             color=discord.Color.purple()
         )
         embed.set_footer(text="Inspired by recent #daily-code activity (IST timezone)")
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
 
     @app_commands.command(name="setchallengechannel", description="Admin: Set the default output channel for weekly challenges")
     async def setchallengechannel(self, interaction: discord.Interaction, channel: discord.TextChannel):
@@ -5,6 +5,7 @@ import aiohttp
 import asyncio
 import random
 import logging
+import http_client
 from cache import cache
 
 logger = logging.getLogger('LupinBot.fun')
@@ -12,16 +13,6 @@ logger = logging.getLogger('LupinBot.fun')
 class Fun(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.session = None
-    
-    async def cog_load(self):
-        """Initialize HTTP session when cog loads."""
-        self.session = aiohttp.ClientSession()
-    
-    async def cog_unload(self):
-        """Close HTTP session when cog unloads."""
-        if self.session:
-            await self.session.close()
     
     async def fetch_json(self, url: str, cache_key: str = None):
         """Fetch JSON from URL with caching."""
@@ -29,12 +20,12 @@ class Fun(commands.Cog):
         if cache_key:
             cached = await cache.get(cache_key)
             if cached:
-                logger.info(f"Cache hit for {cache_key}")
+                logger.debug(f"Cache hit for {cache_key}")
                 return cached
         
         # Fetch from API
         try:
-            async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            async with http_client.get_session().get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
                 if response.status == 200:
                     data = await response.json()
                     # Cache the result
@@ -1,15 +1,22 @@
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
-import re
 from datetime import datetime, timedelta
 from database import Database
 import logging
-import aiohttp
 import asyncio
 import gemini
+import http_client
+import heatmap
+import io
+import os
+import code_classifier
+import image_review
+import dispatcher
+from dispatcher import MessageFeatures, MonitoredChannels
 from collections import deque
-import pytz
+from typing import Optional
+from reminders import ReminderFanout
 
 logger = logging.getLogger('LupinBot.streaks')
 
@@ -17,12 +24,37 @@ class Streaks(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = Database()
-        self.code_pattern = re.compile(r'```[\s\S]*?```|`[^`]+`')
+        self.code_pattern = dispatcher.CODE_BLOCK_PATTERN
         self.user_message_cache = {}  # Cache for messages
+        self.reminder_fanout = ReminderFanout(bot)
+        # 'shadow' runs the local classifier next to the keyword check and only logs disagreements;
+        # 'on' lets it decide for plain text and unknown attachments; 'off' disables it
+        self.classifier_mode = os.environ.get("CODE_CLASSIFIER_MODE", "shadow").lower()
+        self.classifier = code_classifier.get_classifier() if self.classifier_mode != 'off' else None
+        self.classifier_disagreements = 0
         self.reminder_task.start()
+        self.rollover_task.start()
+
+        # Only messages that could count towards a streak reach on_streak_message, and of
+        # those only ones in a daily-code channel or with a #DAY tag get analysed
+        self.monitored_channels = MonitoredChannels(self.db)
+        # Gemini re-checks images the backfill guessed at
+        self.image_review = image_review.ImageReviewQueue(self.db)
+        kinds = {dispatcher.DAY, dispatcher.CODE_BLOCK, dispatcher.CODE_HINT, dispatcher.CODE_FILE,
+                 dispatcher.IMAGE, dispatcher.FILE, dispatcher.MONITORED}
+        if self.classifier_mode == 'on':
+            # The classifier may call any text code, keywords or not
+            kinds.add(dispatcher.TEXT)
+        bot.message_dispatcher.monitored = self.monitored_channels
+        bot.message_dispatcher.subscribe('streaks', kinds, self.on_streak_message, accept=self.wants_message)
 
     def cog_unload(self):
+        self.bot.message_dispatcher.unsubscribe('streaks')
+        self.image_review.stop()
         self.reminder_task.cancel()
+        if self.classifier:
+            self.classifier.shutdown()
+        self.rollover_task.cancel()
 
     def get_achievement_badge(self, streak: int) -> str:
         if streak >= 365:
@@ -42,70 +74,107 @@ class Streaks(commands.Cog):
             return False
         if self.code_pattern.search(content):
             return True
-        # Enhanced code keywords
-        code_keywords = [
-            'def ', 'class ', 'import ', 'function ', 'const ', 'let ', 'var ',
-            'public ', 'private ', 'void ', 'int ', 'string ', 'return ',
-            'if ', 'else ', 'for ', 'while ', 'try ', 'catch ', '#include',
-            'console.log', 'print(', 'System.out', 'printf', 'cout',
-            'function(', '=>', 'async', 'await', 'promise',
-            'main(', 'public static void', 'namespace', 'using ',
-            'require(', 'module.exports', 'export ', 'import ',
-            'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE',
-            'html', 'css', 'javascript', 'python', 'java', 'cpp', 'c++',
-            'react', 'vue', 'angular', 'node', 'express', 'django',
-            'sql', 'mongodb', 'mysql', 'postgresql',
-            'git', 'commit', 'push', 'pull', 'branch',
-            'api', 'endpoint', 'request', 'response', 'json',
-            'array', 'list', 'dictionary', 'hashmap', 'tree',
-            'binary', 'search', 'sort', 'recursion', 'dynamic'
-        ]
-        return any(keyword in content.lower() for keyword in code_keywords)
-
-    async def has_media_or_code(self, message) -> bool:
-        """Enhanced detection for code content including files and images."""
-        if self.detect_code(message.content):
+        return dispatcher.has_code_keywords(content)
+
+    async def _classify(self, text: str, keyword_verdict: bool, what: str) -> bool:
+        """Apply the local classifier according to CODE_CLASSIFIER_MODE, falling back to keyword_verdict."""
+        if self.classifier is None:
+            return keyword_verdict
+        try:
+            model_verdict = await self.classifier.is_code(text)
+        except Exception as e:
+            logger.error(f'Code classifier failed, using keyword check: {e}')
+            return keyword_verdict
+        if self.classifier_mode == 'on':
+            return model_verdict
+        if model_verdict != keyword_verdict:
+            self.classifier_disagreements += 1
+            logger.info(f'Classifier disagrees on {what}: model={model_verdict} keywords={keyword_verdict}')
+        return keyword_verdict
+
+    async def _text_has_code(self, content: str) -> bool:
+        if not content:
+            return False
+        # Fenced or inline code is definitive
+        if self.code_pattern.search(content):
+            return True
+        return await self._classify(content, self.detect_code(content), 'message text')
+
+    async def has_media_or_code(self, message, features: Optional[MessageFeatures] = None,
+                                deferred: Optional[list] = None) -> bool:
+        """Enhanced detection for code content including files and images.
+
+        With `deferred` (backfilling older messages), images without a cached verdict aren't
+        sent to Gemini: they're judged by image_review.looks_like_code, and the ones counted as
+        code are appended to `deferred` for a later review.
+        """
+        if features is None:
+            features = MessageFeatures.from_message(message)
+        if features.has_code_block:
+            return True
+        if await self._text_has_code(message.content):
             return True
         
-        if message.attachments:
-            for attachment in message.attachments:
-                if attachment.filename:
-                    code_extensions = [
-                        '.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', '.php',
-                        '.rb', '.go', '.rs', '.swift', '.kt', '.scala', '.r',
-                        '.html', '.css', '.scss', '.sass', '.less', '.xml',
-                        '.json', '.yaml', '.yml', '.toml', '.ini', '.cfg',
-                        '.sql', '.sh', '.bash', '.ps1', '.bat', '.cmd',
-                        '.md', '.txt', '.log', '.conf', '.config'
-                    ]
-                    
-                    if any(attachment.filename.lower().endswith(ext) for ext in code_extensions):
-                        logger.info(f'Code file detected: {attachment.filename}')
-                        return True
-                
-                if attachment.content_type and attachment.content_type.startswith('image/'):
-                    try:
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(attachment.url) as resp:
-                                if resp.status == 200:
-                                    image_bytes = await resp.read()
-                                    mime_type = attachment.content_type
-                                    has_code = await asyncio.to_thread(
-                                        gemini.detect_code_in_image, 
-                                        image_bytes, 
-                                        mime_type
-                                    )
-                                    if has_code:
-                                        logger.info(f'Image contains code (verified by Gemini): {attachment.filename}')
-                                        return True
-                                    else:
-                                        logger.info(f'Image does not contain code (verified by Gemini): {attachment.filename}')
-                    except Exception as e:
-                        logger.error(f'Error analyzing image with Gemini: {e}')
-                        logger.info(f'Assuming image contains code due to Gemini error: {attachment.filename}')
-                        return True
+        if features.code_attachments:
+            logger.info(f'Code file detected: {features.code_attachments[0].filename}')
+            return True
+        image_attachments = list(features.image_attachments)
+        other_attachments = list(features.other_attachments)
+
+        # Verdicts from an earlier look at the same attachment (e.g. the previous-message check) are reused
+        verdicts = http_client.attachment_cache
+        if any(verdicts.get_verdict(a.id, 'code') for a in image_attachments + other_attachments):
+            return True
+
+        # Files with extensions the list doesn't know (.jsx, .lua, Dockerfile, ...) go to the classifier
+        other_attachments = [a for a in other_attachments if verdicts.get_verdict(a.id, 'code') is None]
+        if other_attachments and self.classifier is not None:
+            heads = await http_client.fetch_attachments(other_attachments, code_classifier.ATTACHMENT_HEAD_BYTES)
+            for attachment, head in zip(other_attachments, heads):
+                if isinstance(head, Exception):
+                    logger.error(f'Error downloading {attachment.filename} for classification: {head}')
+                    continue
+                if not head or b'\x00' in head:
+                    continue  # not served, empty or binary (archives, PDFs, ...)
+                text = code_classifier.attachment_text(attachment.filename, head)
+                is_code = await self._classify(text, False, f'attachment {attachment.filename}')
+                verdicts.set_verdict(attachment.id, 'code', is_code)
+                if is_code:
+                    logger.info(f'Code file detected by classifier: {attachment.filename}')
+                    return True
+
+        image_attachments = [a for a in image_attachments if verdicts.get_verdict(a.id, 'code') is None]
+        if not image_attachments:
             return False
-        return False
+        if deferred is not None:
+            guessed = [a for a in image_attachments if image_review.looks_like_code(a)]
+            deferred.extend(guessed)
+            return bool(guessed)
+
+        # Download every image concurrently, then classify them together in batched requests
+        downloads = await http_client.fetch_attachments(image_attachments, http_client.IMAGE_BYTES, truncate=False)
+        errors = [d for d in downloads if isinstance(d, Exception)]
+        if errors:
+            logger.error(f'Error downloading images for code detection: {errors[0]}')
+            logger.info(f'Assuming images contain code due to download error in message {message.id}')
+            return True
+
+        served = [(a, data) for a, data in zip(image_attachments, downloads) if data is not None]
+        if not served:
+            return False
+        results = await gemini.classify_code_images(
+            [(data, a.content_type) for a, data in served], any_positive=True,
+            guild_id=message.guild.id if message.guild else None
+        )
+        # Images after the first batch with code may not have been classified
+        for (attachment, _), is_code in zip(served, results):
+            verdicts.set_verdict(attachment.id, 'code', is_code)
+        has_code = any(results)
+        logger.info(
+            f'{len(served)} image(s) in message {message.id} '
+            f'{"contain" if has_code else "do not contain"} code (verified by Gemini)'
+        )
+        return has_code
 
     def calculate_days_since_last_log(self, last_log_date: str) -> int:
         if not last_log_date:
@@ -119,14 +188,38 @@ class Streaks(commands.Cog):
             logger.error(f'Error calculating days since last log: {e}')
             return 999
 
-    def _is_daily_code_channel(self, channel: discord.abc.GuildChannel) -> bool:
-        try:
-            configured_id = self.db.get_daily_code_channel(channel.guild.id)
-            if configured_id and channel.id == configured_id:
-                return True
-        except Exception:
-            pass
-        return 'daily-code' in channel.name.lower()
+    @staticmethod
+    def wants_message(features: MessageFeatures) -> bool:
+        """Streaks are only tracked in guilds, from daily-code channels or explicitly #DAY-tagged messages."""
+        if features.message.guild is None:
+            return False
+        return features.in_monitored_channel or features.day_number is not None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        for guild in self.bot.guilds:
+            self.monitored_channels.refresh(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self.monitored_channels.refresh(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.monitored_channels.forget(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        self.monitored_channels.refresh(channel.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if before.name != after.name:
+            self.monitored_channels.refresh(after.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.monitored_channels.refresh(channel.guild)
 
     async def process_streak_message(self, message, day_number):
         user_id = message.author.id
@@ -149,7 +242,8 @@ class Streaks(commands.Cog):
             days_since = self.calculate_days_since_last_log(last_log_date)
             expected_day = last_day_number + 1
 
-            if days_since >= 3:
+            # Streaks already expired by the daily rollover just start again below
+            if days_since >= 3 and current_streak > 0:
                 self.db.reset_streak(user_id, guild_id)
                 await message.add_reaction('🔄')
                 
@@ -220,17 +314,17 @@ class Streaks(commands.Cog):
             embed.set_footer(text="Keep coding every day to build your streak!")
             await message.channel.send(embed=embed)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot or message.reference:
+    async def on_streak_message(self, features: MessageFeatures):
+        """Dispatched for guild messages in a daily-code channel or with a #DAY tag that may log a streak."""
+        if features.is_reply:
             return
 
+        message = features.message
         user_id = message.author.id
         cache_key = (user_id, message.channel.id)
         
-        day_match = re.search(r'#\s*day[\s-]*(\d+)', message.content, re.IGNORECASE)
-        day_number = int(day_match.group(1)) if day_match else None
-        has_code = await self.has_media_or_code(message)
+        day_number = features.day_number
+        has_code = await self.has_media_or_code(message, features)
 
         if day_number is not None and not has_code:
             # Look for code in recent messages
@@ -255,9 +349,8 @@ class Streaks(commands.Cog):
                 for prev_message_id in self.user_message_cache[cache_key]:
                     try:
                         prev_message = await message.channel.fetch_message(prev_message_id)
-                        prev_day_match = re.search(r'#\s*day[\s-]*(\d+)', prev_message.content, re.IGNORECASE)
-                        if prev_day_match:
-                            prev_day_number = int(prev_day_match.group(1))
+                        prev_day_number = dispatcher.parse_day_number(prev_message.content)
+                        if prev_day_number is not None:
                             await self.process_streak_message(message, prev_day_number)
                             self.user_message_cache[cache_key].clear()
                             return
@@ -272,60 +365,96 @@ class Streaks(commands.Cog):
             await self.process_streak_message(message, day_number)
         
         # Daily code channel logic (process code without explicit day only in daily-code channel)
-        elif self._is_daily_code_channel(message.channel) and has_code:
+        elif features.in_monitored_channel and has_code:
              await self.process_streak_message(message, None)
 
     @tasks.loop(minutes=1)
     async def reminder_task(self):
-        """Checks every minute if it's time to send reminders based on IST."""
-        now_ist = datetime.now(pytz.timezone('Asia/Kolkata'))
-        today_str_utc = datetime.utcnow().strftime("%Y-%m-%d")
-        current_time_ist = now_ist.strftime("%H:%M")
+        """Checks every minute for due guild and per-user reminders and fans them out."""
+        now_utc = datetime.utcnow()
+        today_str_utc = now_utc.strftime("%Y-%m-%d")
+        # Guild reminder_time and user custom_reminder_time are both stored as UTC HH:MM
+        current_time_utc = now_utc.strftime("%H:%M")
 
-        guilds = self.db.get_all_reminder_guilds()
-        
         # Log if no guilds have reminders configured (only log once per hour to avoid spam)
-        if not guilds and now_ist.minute == 0:
+        if now_utc.minute == 0 and not self.db.get_all_reminder_guilds():
             logger.warning("No guilds have both reminder_time and reminder_channel_id configured")
-        
-        for guild_id, reminder_time_utc, reminder_channel_id in guilds:
-            # reminder_time in DB is stored as UTC HH:MM; convert to IST HH:MM for comparison
-            try:
-                # Build a datetime today with UTC time
-                hour_utc, minute_utc = map(int, (reminder_time_utc or '18:00').split(':'))
-                now_utc = datetime.utcnow().replace(second=0, microsecond=0)
-                target_utc = now_utc.replace(hour=hour_utc, minute=minute_utc)
-                target_ist = target_utc.replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Asia/Kolkata'))
-                target_ist_str = target_ist.strftime('%H:%M')
-            except Exception as e:
-                logger.error(f"Error converting reminder time for guild {guild_id}: {e}")
-                target_ist_str = reminder_time_utc or '18:00'
-
-            if current_time_ist == target_ist_str:
-                users_to_remind = self.db.get_users_to_remind(guild_id, today_str_utc)
-                if users_to_remind:
-                    channel = self.bot.get_channel(reminder_channel_id)
-                    if channel:
-                        try:
-                            mentions = [f'<@{user_id}>' for user_id in users_to_remind]
-                            embed = discord.Embed(
-                                title="🔥 Daily Coding Reminder!",
-                                description=f"Time to continue your streak! Don't forget to post your progress today. (Time shown in IST)",
-                                color=discord.Color.orange()
-                            )
-                            await channel.send(" ".join(mentions), embed=embed)
-                            logger.info(f"Sent reminder to {len(users_to_remind)} users in guild {guild_id} at {current_time_ist} IST")
-                        except Exception as e:
-                            logger.error(f"Failed to send reminder in guild {guild_id}: {e}")
-                    else:
-                        logger.warning(f"Reminder channel {reminder_channel_id} not found for guild {guild_id}")
-                else:
-                    logger.debug(f"No users to remind in guild {guild_id} at {current_time_ist} IST")
+
+        recipients = self.db.get_due_reminder_recipients(today_str_utc, current_time_utc)
+        if not recipients:
+            return
+
+        report = await self.reminder_fanout.run(recipients)
+        logger.info(
+            f"Reminder run at {current_time_utc} UTC: {report['delivered']} delivered, "
+            f"{report['failed']} failed, {report['skipped']} skipped"
+        )
 
     @reminder_task.before_loop
     async def before_reminder_task(self):
         await self.bot.wait_until_ready()
+
+    @tasks.loop(minutes=15)
+    async def rollover_task(self):
+        """Runs the daily streak rollover once per UTC date (later runs on the same date are no-ops)."""
+        today_str_utc = datetime.utcnow().strftime("%Y-%m-%d")
+        try:
+            result = await asyncio.to_thread(self.db.run_daily_rollover, today_str_utc)
+        except Exception as e:
+            logger.error(f"Daily rollover for {today_str_utc} failed: {e}")
+            return
+        if result is not None:
+            logger.info(
+                f"Daily rollover for {today_str_utc}: {result['frozen']} frozen, "
+                f"{result['expired']} expired, {result['awarded']} freezes awarded"
+            )
+
+    @rollover_task.before_loop
+    async def before_rollover_task(self):
+        await self.bot.wait_until_ready()
     
+    async def resolve_user_names(self, guild: Optional[discord.Guild], user_ids: list[int]) -> dict[int, str]:
+        """Resolve display names from the member cache, then the users table, then concurrent REST fetches.
+
+        Names fetched over REST are written back to the users table for next time.
+        """
+        names: dict[int, str] = {}
+        missing: list[int] = []
+        for user_id in user_ids:
+            member = guild.get_member(user_id) if guild else None
+            if member:
+                names[user_id] = member.name
+            else:
+                missing.append(user_id)
+
+        if missing:
+            for user_id, (username, display_name, _) in self.db.get_users(missing).items():
+                if username or display_name:
+                    names[user_id] = username or display_name
+            missing = [user_id for user_id in missing if user_id not in names]
+
+        if missing:
+            results = await asyncio.gather(
+                *(self.bot.fetch_user(user_id) for user_id in missing),
+                return_exceptions=True
+            )
+            fetched_rows = []
+            for user_id, result in zip(missing, results):
+                if isinstance(result, Exception):
+                    logger.warning(f'Could not fetch user {user_id} for leaderboard: {result}')
+                    names[user_id] = f'User {user_id}'
+                    continue
+                names[user_id] = result.name
+                fetched_rows.append((
+                    user_id,
+                    result.name,
+                    result.display_name,
+                    str(result.display_avatar.url) if result.display_avatar else None
+                ))
+            self.db.upsert_users(fetched_rows)
+
+        return names
+
     @app_commands.command(name="leaderboard", description="Show the top coding streaks in this server")
     async def leaderboard(self, interaction: discord.Interaction):
         guild_id = interaction.guild_id
@@ -334,6 +463,9 @@ class Streaks(commands.Cog):
         if not leaderboard_data:
             await interaction.response.send_message("No streaks recorded yet! Start coding and post #DAY-1 to begin your journey!", ephemeral=True)
             return
+
+        # Acknowledge before any name lookups that may hit the REST API
+        await interaction.response.defer()
         
         embed = discord.Embed(
             title="🏆 Top Coding Streaks",
@@ -342,22 +474,19 @@ class Streaks(commands.Cog):
         )
         
         medals = ["🥇", "🥈", "🥉"]
+        names = await self.resolve_user_names(interaction.guild, [row[0] for row in leaderboard_data])
         
         for idx, (user_id, current_streak, longest_streak, last_log_date) in enumerate(leaderboard_data[:10]):
-            try:
-                user = await self.bot.fetch_user(user_id)
-                medal = medals[idx] if idx < 3 else f"{idx + 1}."
-                badge = self.get_achievement_badge(current_streak)
-                embed.add_field(
-                    name=f"{medal} {user.name}",
-                    value=f"🔥 Current: {current_streak} days\n💎 Best: {longest_streak} days\n{badge}",
-                    inline=False
-                )
-            except:
-                continue
+            medal = medals[idx] if idx < 3 else f"{idx + 1}."
+            badge = self.get_achievement_badge(current_streak)
+            embed.add_field(
+                name=f"{medal} {names[user_id]}",
+                value=f"🔥 Current: {current_streak} days\n💎 Best: {longest_streak} days\n{badge}",
+                inline=False
+            )
         
         embed.set_footer(text="Keep coding to climb the leaderboard!")
-        await interaction.response.send_message(embed=embed)
+        await interaction.followup.send(embed=embed)
     
     @app_commands.command(name="restore", description="Restore a user's streak (Admin only)")
     @app_commands.describe(user="The user whose streak to restore", day_number="The day number to restore to")
@@ -383,6 +512,7 @@ class Streaks(commands.Cog):
                 longest_streak = day_number
             
             self.db.update_streak(user_id, guild_id, day_number, longest_streak, day_number)
+            self.db.clear_freeze_awards_above(user_id, guild_id, day_number)
             
             embed = discord.Embed(
                 title="✅ Streak Restored",
@@ -427,112 +557,87 @@ class Streaks(commands.Cog):
         
         await interaction.response.send_message(embed=embed)
 
-    @app_commands.command(name="streaks_history", description="View your recent streak history (last 30 days)")
-    async def streaks_history(self, interaction: discord.Interaction):
-        await interaction.response.defer()
+    @app_commands.command(name="streaks_history", description="View your streak history with weekly or monthly rollups")
+    @app_commands.describe(days="How far back to look", rollup="Group logs by week or month (default: week for 30 days, month otherwise)")
+    @app_commands.choices(
+        days=[app_commands.Choice(name=f"Last {d} days", value=d) for d in (30, 90, 365)],
+        rollup=[app_commands.Choice(name="Week", value="week"), app_commands.Choice(name="Month", value="month")]
+    )
+    async def streaks_history(self, interaction: discord.Interaction,
+                              days: Optional[app_commands.Choice[int]] = None,
+                              rollup: Optional[app_commands.Choice[str]] = None):
         user = interaction.user
-        guild = interaction.guild
-        history = {}
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-
-        for channel in guild.text_channels:
-            try:
-                async for message in channel.history(limit=None, after=thirty_days_ago):
-                    if message.author == self.bot.user and message.embeds:
-                        for embed in message.embeds:
-                            if embed.title and (embed.title.startswith("🔥 Streak Updated!") or embed.title.startswith("🎉 Streak Started!")):
-                                if embed.description and user.mention in embed.description:
-                                    day_match = re.search(r"Day (\d+)", embed.footer.text)
-                                    if day_match:
-                                        day_number = int(day_match.group(1))
-                                        history[message.created_at.date()] = day_number
-            except discord.Forbidden:
-                continue
+        range_days = days.value if days else 30
+        rollup_by = rollup.value if rollup else ('week' if range_days <= 30 else 'month')
+        start_date = (datetime.utcnow() - timedelta(days=range_days)).strftime("%Y-%m-%d")
+        history = self.db.get_logs_since(user.id, interaction.guild_id, start_date)
 
         if not history:
-            await interaction.followup.send("You haven't logged any streaks yet! Post some code to begin!", ephemeral=True)
+            await interaction.response.send_message("You haven't logged any streaks yet! Post some code to begin!", ephemeral=True)
             return
 
-        weeks_data = {}
-        for log_date, day_number in history.items():
-            week_start = log_date - timedelta(days=log_date.weekday())
-            week_key = week_start.strftime("%Y-%m-%d")
-            if week_key not in weeks_data:
-                weeks_data[week_key] = []
-            weeks_data[week_key].append((log_date.strftime("%Y-%m-%d"), day_number))
+        buckets = {}
+        for log_date_str, day_number in history:
+            log_date = datetime.strptime(log_date_str, "%Y-%m-%d").date()
+            if rollup_by == 'week':
+                bucket_start = log_date - timedelta(days=log_date.weekday())
+            else:
+                bucket_start = log_date.replace(day=1)
+            bucket = buckets.setdefault(bucket_start, [0, 0])
+            bucket[0] += 1
+            bucket[1] = max(bucket[1], day_number or 0)
 
         embed = discord.Embed(
             title=f"📅 {user.name}'s Streak History",
-            description=f"Last 30 days of your coding journey",
+            description=f"Last {range_days} days of your coding journey",
             color=discord.Color.blue()
         )
         embed.set_thumbnail(url=user.display_avatar.url)
 
-        for week_key in sorted(weeks_data.keys(), reverse=True)[:5]:
-            week_data = weeks_data[week_key]
-            week_start = datetime.strptime(week_key, "%Y-%m-%d")
-            week_str = week_start.strftime("%b %d")
-            days_counted = len(week_data)
-            max_day = max(day_num for _, day_num in week_data)
+        # Embeds hold at most 25 fields; show the most recent buckets
+        for bucket_start in sorted(buckets, reverse=True)[:25]:
+            days_counted, max_day = buckets[bucket_start]
+            if rollup_by == 'week':
+                name = f"Week of {bucket_start.strftime('%b %d')}"
+            else:
+                name = bucket_start.strftime('%B %Y')
             embed.add_field(
-                name=f"Week of {week_str}",
+                name=name,
                 value=f"📆 {days_counted} days logged\n🔥 Up to Day {max_day}",
-                inline=False
+                inline=rollup_by == 'month'
             )
 
         embed.set_footer(text=f"Total: {len(history)} days logged")
-        await interaction.followup.send(embed=embed)
-        logger.info(f'{user} viewed streak history')
+        await interaction.response.send_message(embed=embed)
+        logger.info(f'{user} viewed streak history ({range_days} days, by {rollup_by})')
     
-    @app_commands.command(name="streak_calendar", description="View your streak calendar (Duolingo-style)")
-    async def streak_calendar(self, interaction: discord.Interaction):
+    @app_commands.command(name="streak_calendar", description="View your coding activity heatmap (GitHub-style)")
+    @app_commands.describe(days="Number of days to show (default 365)")
+    async def streak_calendar(self, interaction: discord.Interaction, days: app_commands.Range[int, 7, 1095] = 365):
         await interaction.response.defer()
         
         user_id = interaction.user.id
         guild_id = interaction.guild_id
         
-        history = self.db.get_streak_history(user_id, guild_id, limit=30)
-        today = datetime.utcnow().date()
+        image = heatmap.get_heatmap(self.db, user_id, guild_id, days=days, fmt='png')
+        file = discord.File(io.BytesIO(image), filename="heatmap.png")
         
         embed = discord.Embed(
             title=f"📅 {interaction.user.name}'s Streak Calendar",
-            description="Your coding activity over the last 30 days",
+            description=f"Your coding activity over the last {days} days",
             color=discord.Color.blue()
         )
         embed.set_thumbnail(url=interaction.user.display_avatar.url)
+        embed.set_image(url="attachment://heatmap.png")
+        embed.add_field(name="Legend", value="🟩 Logged | ⬜ Missed", inline=False)
         
-        logged_dates = {datetime.strptime(log_date, "%Y-%m-%d").date() for log_date, _ in history}
-        
-        calendar_lines = []
-        for i in range(0, 30, 7):
-            week_line = ""
-            for j in range(7):
-                day_offset = i + j
-                if day_offset >= 30:
-                    break
-                
-                date = today - timedelta(days=30 - day_offset - 1)
-                if date in logged_dates:
-                    week_line += "✅"
-                elif date > today:
-                    week_line += "⬜"
-                else:
-                    week_line += "⚫"
-                
-                if j < 6:
-                    week_line += " "
-            calendar_lines.append(week_line)
-        
-        calendar_text = "\n".join(calendar_lines)
-        embed.add_field(name="Calendar (Last 30 Days)", value=f"```\n{calendar_text}\n```", inline=False)
-        embed.add_field(name="Legend", value="✅ Logged | ⚫ Missed | ⬜ Future", inline=False)
-        
-        if history:
-            current_streak, longest_streak, last_log_date, last_day_number = self.db.get_streak(user_id, guild_id) or (0, 0, None, 0)
+        streak_data = self.db.get_streak(user_id, guild_id)
+        if streak_data:
+            current_streak, longest_streak, last_log_date, last_day_number = streak_data
             embed.add_field(name="🔥 Current Streak", value=f"{current_streak} days", inline=True)
             embed.add_field(name="💎 Best Streak", value=f"{longest_streak} days", inline=True)
         
-        await interaction.followup.send(embed=embed)
+        await interaction.followup.send(embed=embed, file=file)
         logger.info(f'{interaction.user} viewed streak calendar')
     
     @app_commands.command(name="use_freeze", description="Use a streak freeze to protect your streak (like Duolingo)")
@@ -6,6 +6,9 @@ import logging
 import re
 from datetime import datetime, timedelta
 import pytz
+from typing import Optional
+import asyncio
+import usage
 
 logger = logging.getLogger('LupinBot.utilities')
 
@@ -50,9 +53,11 @@ class Utilities(commands.Cog):
             "setreminder": "Server Configuration",
             "setreminderchannel": "Server Configuration",
             "checkreminder": "Server Configuration",
+            "myreminder": "Streak Tracking",
             "setweeklychallenge": "Challenges",
             "setchallengechannel": "Challenges",
             "setdailycodechannel": "Server Configuration",
+            "aibudget": "Server Configuration",
             "sync_commands": "Server Configuration",
             "challenge": "Challenges"
         }
@@ -418,8 +423,104 @@ class Utilities(commands.Cog):
                 ephemeral=True)
             return
         self.db.set_daily_code_channel(interaction.guild_id, channel.id)
+        streaks = self.bot.get_cog('Streaks')
+        if streaks:
+            streaks.monitored_channels.refresh(interaction.guild)
         await interaction.response.send_message(f"✅ Daily-code activity channel set to {channel.mention}")
 
+    @app_commands.command(name="aibudget", description="Show today's AI usage, or set the daily AI call budget (Admin only)")
+    @app_commands.guild_only()
+    @app_commands.describe(daily_calls="New daily limit on AI calls for this server (0 = unlimited)")
+    async def aibudget(self, interaction: discord.Interaction,
+                       daily_calls: Optional[app_commands.Range[int, 0, 100000]] = None):
+        if daily_calls is not None:
+            if not interaction.user.guild_permissions.administrator:
+                await interaction.response.send_message(
+                    "❌ You need administrator permissions to use this command.",
+                    ephemeral=True)
+                return
+            usage.tracker.set_budget(interaction.guild_id, daily_calls)
+            logger.info(f'{interaction.user} set AI budget for guild {interaction.guild_id} to {daily_calls}')
+
+        # Write buffered counts so the per-purpose breakdown is current
+        await asyncio.to_thread(usage.tracker.flush)
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        rows = self.db.get_gemini_usage(interaction.guild_id, today)
+        budget = usage.tracker.budget_for(interaction.guild_id)
+        used = usage.tracker.usage_today(interaction.guild_id)
+
+        embed = discord.Embed(
+            title="🤖 AI Usage Today",
+            description=f"**{used}** calls used of **{budget if budget else 'unlimited'}** (resets at 00:00 UTC)",
+            color=discord.Color.orange() if usage.tracker.over_budget(interaction.guild_id) else discord.Color.blue())
+        for purpose, calls, errors, fallbacks, prompt_tokens, output_tokens in rows:
+            embed.add_field(
+                name=purpose.replace('_', ' ').title(),
+                value=f"{calls} calls, {errors} errors, {fallbacks} local fallbacks\n"
+                      f"{prompt_tokens + output_tokens:,} tokens",
+                inline=False)
+        if usage.tracker.over_budget(interaction.guild_id):
+            embed.set_footer(text="Over budget: images are accepted without AI checks and questions are paused until tomorrow")
+        await interaction.response.send_message(embed=embed, ephemeral=daily_calls is None)
+
+    @app_commands.command(name="myreminder", description="Set your personal DM reminder time (IST) and channel mention preference")
+    @app_commands.guild_only()
+    @app_commands.describe(
+        dm_time="Time in HH:MM AM/PM format (IST) to get a DM reminder, or 'off' to disable",
+        mentions="Whether to be mentioned in the server's daily reminder")
+    async def myreminder(self, interaction: discord.Interaction,
+                         dm_time: Optional[str] = None,
+                         mentions: Optional[bool] = None):
+        user_id = interaction.user.id
+        guild_id = interaction.guild_id
+        embed = discord.Embed(title="⏰ Reminder Preferences", color=discord.Color.green())
+
+        if dm_time is not None:
+            if dm_time.strip().lower() == 'off':
+                self.db.set_user_setting(user_id, guild_id, 'custom_reminder_time', None)
+                embed.add_field(name="📬 DM Reminder", value="Disabled", inline=False)
+            elif not re.match(r'^(0[1-9]|1[0-2]):([0-5]\d) (AM|PM)$', dm_time, re.IGNORECASE):
+                await interaction.response.send_message(
+                    "❌ Invalid time format. Please use HH:MM AM/PM (e.g., 09:30 PM) or 'off'.",
+                    ephemeral=True)
+                return
+            else:
+                # Stored as UTC HH:MM, same as the server reminder time
+                ist = pytz.timezone('Asia/Kolkata')
+                time_obj = datetime.strptime(dm_time.upper(), '%I:%M %p').time()
+                dt_ist = datetime.now(ist).replace(hour=time_obj.hour, minute=time_obj.minute, second=0, microsecond=0)
+                time_24h_utc = dt_ist.astimezone(pytz.utc).strftime('%H:%M')
+                self.db.set_user_setting(user_id, guild_id, 'custom_reminder_time', time_24h_utc)
+                embed.add_field(
+                    name="📬 DM Reminder",
+                    value=f"Daily at **{dm_time.upper()} IST** (replaces the channel mention)",
+                    inline=False)
+
+        if mentions is not None:
+            self.db.set_user_setting(user_id, guild_id, 'opt_out_mentions', 0 if mentions else 1)
+            embed.add_field(
+                name="📢 Channel Mentions",
+                value="Enabled" if mentions else "Disabled",
+                inline=False)
+
+        if dm_time is None and mentions is None:
+            custom_time = self.db.get_user_setting(user_id, guild_id, 'custom_reminder_time')
+            opt_out = self.db.get_user_setting(user_id, guild_id, 'opt_out_mentions')
+            embed.color = discord.Color.blue()
+            dm_value = "Disabled"
+            if custom_time:
+                hour_utc, minute_utc = map(int, custom_time.split(':'))
+                dt_utc = datetime.utcnow().replace(hour=hour_utc, minute=minute_utc, second=0, microsecond=0, tzinfo=pytz.utc)
+                dm_value = f"Daily at {dt_utc.astimezone(pytz.timezone('Asia/Kolkata')).strftime('%I:%M %p')} IST"
+            embed.add_field(name="📬 DM Reminder", value=dm_value, inline=False)
+            embed.add_field(
+                name="📢 Channel Mentions",
+                value="Disabled" if opt_out else "Enabled",
+                inline=False)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        logger.info(f'{interaction.user} updated reminder preferences')
+
     @app_commands.command(name="checkreminder", description="Check current reminder configuration")
     async def checkreminder(self, interaction: discord.Interaction):
         """Check the current reminder configuration for the server."""
@@ -0,0 +1,180 @@
+"""Per-thread memory for @Lupin Q&A: bounded turn history, LRU eviction and context cache bookkeeping."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
+
+import discord
+from google.genai import types
+
+# Rough token estimate used for budgeting; Gemini bills images at a flat rate
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+# Bot reply ids remembered so a reply to an old answer continues its conversation
+MAX_LINKS = 2000
+
+
+def without_images(content: types.Content) -> types.Content:
+    """`content` with inline images replaced by a short note, so remembered turns don't hold image bytes."""
+    if not any(part.inline_data is not None for part in content.parts or []):
+        return content
+    parts = [
+        types.Part.from_text(text=f'[{part.inline_data.mime_type or "image"} attached earlier, not kept]')
+        if part.inline_data is not None else part
+        for part in content.parts
+    ]
+    return types.Content(role=content.role, parts=parts)
+
+
+def estimate_tokens(content: types.Content) -> int:
+    tokens = 0
+    for part in content.parts or []:
+        if part.text:
+            tokens += len(part.text) // CHARS_PER_TOKEN + 1
+        elif part.inline_data is not None:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+class Conversation:
+    """Alternating user/model turns of one thread, oldest first.
+
+    `cache_name` is a Gemini cached-content resource holding the first `cached_turns` turns
+    (plus the system instruction); requests then only send the turns after it. The lock keeps
+    one question per thread in flight so every answer sees the one before it.
+    """
+
+    def __init__(self, key: int):
+        self.key = key
+        self.turns: List[types.Content] = []
+        self.tokens: List[int] = []
+        self.cache_name: Optional[str] = None
+        self.cached_turns = 0
+        self.cache_expires = 0.0
+        self.cache_retry_at = 0.0
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens)
+
+    @property
+    def uncached_tokens(self) -> int:
+        return sum(self.tokens[self.cached_turns:])
+
+    def cache_valid(self) -> bool:
+        return self.cache_name is not None and time.monotonic() < self.cache_expires
+
+    def uncached_turns(self) -> List[types.Content]:
+        return self.turns[self.cached_turns:] if self.cache_valid() else list(self.turns)
+
+    def set_cache(self, name: str, turns: int, ttl: float) -> Optional[str]:
+        """Point at a new cache covering the first `turns` turns; returns the replaced cache name."""
+        old, self.cache_name = self.cache_name, name
+        self.cached_turns = turns
+        # Stop using the cache a little before Gemini expires it
+        self.cache_expires = time.monotonic() + ttl * 0.9
+        return old
+
+    def drop_cache(self) -> Optional[str]:
+        name, self.cache_name = self.cache_name, None
+        self.cached_turns = 0
+        return name
+
+    def add_exchange(self, question: types.Content, answer: str):
+        self.turns += [without_images(question), types.ModelContent(parts=[types.Part.from_text(text=answer)])]
+        self.tokens += [estimate_tokens(t) for t in self.turns[-2:]]
+        self.last_used = time.monotonic()
+
+    def trim(self, token_budget: int) -> Optional[str]:
+        """Drop the oldest exchanges until the history fits `token_budget`, keeping the latest one.
+
+        Returns the name of a cache that no longer matches the history, if any.
+        """
+        dropped = 0
+        while self.total_tokens > token_budget and len(self.turns) > 2:
+            del self.turns[:2], self.tokens[:2]
+            dropped += 2
+        if dropped and self.cache_name is not None:
+            return self.drop_cache()
+        return None
+
+
+class ConversationStore:
+    """LRU map of conversation key to Conversation, bounded by count and idle time.
+
+    A conversation is keyed by its Discord thread, or, outside threads, by the question that
+    started it; replying to one of the bot's answers continues that conversation. Evicted or
+    invalidated caches are handed to `on_cache_released` so they can be deleted.
+    """
+
+    def __init__(self, max_conversations: int = 200, token_budget: int = 16000, idle_ttl: float = 3600,
+                 on_cache_released: Callable[[str], None] = None):
+        self.max_conversations = max_conversations
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl
+        self.on_cache_released = on_cache_released
+        self.conversations: OrderedDict[int, Conversation] = OrderedDict()
+        self.links: OrderedDict[int, int] = OrderedDict()
+        self.evictions = 0
+
+    def release(self, name: Optional[str]):
+        """Hand a cache that is no longer used to on_cache_released."""
+        if name and self.on_cache_released is not None:
+            self.on_cache_released(name)
+
+    def key_for(self, message) -> int:
+        if isinstance(message.channel, discord.Thread):
+            return message.channel.id
+        reference = getattr(message, 'reference', None)
+        if reference is not None and reference.message_id in self.links:
+            return self.links[reference.message_id]
+        return message.id
+
+    def get(self, key: int) -> Conversation:
+        self._expire_idle()
+        conversation = self.conversations.get(key)
+        if conversation is None:
+            conversation = self.conversations[key] = Conversation(key)
+            while len(self.conversations) > self.max_conversations:
+                self._evict(next(iter(self.conversations)))
+        self.conversations.move_to_end(key)
+        conversation.last_used = time.monotonic()
+        return conversation
+
+    def for_message(self, message) -> Conversation:
+        return self.get(self.key_for(message))
+
+    def link(self, message_ids: Iterable[int], conversation: Conversation):
+        """Remember that these messages belong to `conversation`."""
+        for message_id in message_ids:
+            self.links[message_id] = conversation.key
+            self.links.move_to_end(message_id)
+        while len(self.links) > MAX_LINKS:
+            self.links.popitem(last=False)
+
+    def remember(self, conversation: Conversation, question: types.Content, answer: str):
+        conversation.add_exchange(question, answer)
+        self.release(conversation.trim(self.token_budget))
+
+    def _evict(self, key: int):
+        conversation = self.conversations.pop(key)
+        self.evictions += 1
+        self.release(conversation.drop_cache())
+
+    def _expire_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        while self.conversations:
+            key, conversation = next(iter(self.conversations.items()))
+            if conversation.last_used >= cutoff or conversation.lock.locked():
+                break
+            self._evict(key)
+
+    def snapshot(self) -> dict:
+        return {
+            'conversations': len(self.conversations),
+            'cached': sum(1 for c in self.conversations.values() if c.cache_valid()),
+            'tokens': sum(c.total_tokens for c in self.conversations.values()),
+            'evictions': self.evictions,
+        }
@@ -1,7 +1,8 @@
 """Web Dashboard for LupinBot"""
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 from flask_cors import CORS
 from database import Database
+import heatmap
 import logging
 import os
 from datetime import datetime
@@ -63,6 +64,26 @@ def ping():
         'status': 'alive'
     })
 
+@app.route('/api/metrics')
+def metrics():
+    """Gemini rate limiter, circuit breaker, answer/attachment cache, usage, message dispatch, startup, backfill and image review state (meaningful when running inside the bot process)."""
+    try:
+        import gemini
+        import http_client
+        return jsonify({'success': True, 'data': {
+            'gemini': gemini.get_status(),
+            'answers': gemini.get_answer_stats(),
+            'usage': gemini.usage.snapshot(),
+            'attachments': http_client.attachment_cache.snapshot(),
+            'dispatch': bot.message_dispatcher.snapshot() if bot else None,
+            'startup': bot.startup.snapshot() if bot else None,
+            'backfill': bot.backfill.snapshot() if bot else None,
+            'image_review': bot.get_cog('Streaks').image_review.snapshot() if bot and bot.get_cog('Streaks') else None,
+        }})
+    except Exception as e:
+        logger.error(f'Error getting metrics: {e}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/server_stats/<int:guild_id>')
 def server_stats(guild_id):
     """Get server statistics."""
@@ -163,6 +184,29 @@ def user_stats(user_id, guild_id):
         logger.error(f'Error getting user stats: {e}')
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/heatmap/<int:user_id>/<int:guild_id>')
+def heatmap_image(user_id, guild_id):
+    """Activity heatmap, rendered by the same cached renderer as /streak_calendar."""
+    try:
+        days = int(request.args.get('days', 365))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'days must be an integer'}), 400
+    if not 7 <= days <= 1095:
+        return jsonify({'success': False, 'error': 'days must be between 7 and 1095'}), 400
+    fmt = 'png' if request.args.get('format') == 'png' else 'svg'
+    try:
+        version = tuple(db.get_log_version(user_id, guild_id))
+        etag = f'{version[0]}-{version[1]}-{days}-{fmt}-{datetime.utcnow().date().isoformat()}'
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"'})
+        image = heatmap.get_heatmap(db, user_id, guild_id, days=days, fmt=fmt, version=version)
+        mimetype = 'image/png' if fmt == 'png' else 'image/svg+xml'
+        # Browsers revalidate every time; the ETag makes unchanged heatmaps a cheap 304
+        return Response(image, mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'ETag': f'"{etag}"'})
+    except Exception as e:
+        logger.error(f'Error rendering heatmap: {e}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/recent_activity/<int:guild_id>')
 def recent_activity(guild_id):
     """Get recent activity."""
@@ -104,6 +104,92 @@ class Database:
             )
         """)
         
+        # Freeze milestones already awarded for the current streak (1 = 7 days, 2 = 14 days, ...)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS freeze_awards (
+                user_id INTEGER,
+                guild_id INTEGER,
+                milestone INTEGER,
+                awarded_on TEXT,
+                PRIMARY KEY (user_id, guild_id, milestone)
+            )
+        """)
+        
+        # One row per completed daily rollover, keeps the job idempotent per date
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rollover_runs (
+                run_date TEXT PRIMARY KEY,
+                frozen INTEGER DEFAULT 0,
+                expired INTEGER DEFAULT 0,
+                awarded INTEGER DEFAULT 0,
+                finished_at TEXT
+            )
+        """)
+        
+        # Weekly challenge schedule per guild (times are IST)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS challenge_settings (
+                guild_id INTEGER PRIMARY KEY,
+                weekday TEXT DEFAULT 'Sunday',
+                time_ist TEXT DEFAULT '09:00',
+                output_channel_id INTEGER
+            )
+        """)
+        
+        # Weekly challenges generated ahead of their posting time, one row per guild and ISO week
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pending_challenges (
+                guild_id INTEGER,
+                week_key TEXT,
+                challenge_text TEXT,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                generated_at TEXT,
+                posted_at TEXT,
+                PRIMARY KEY (guild_id, week_key)
+            )
+        """)
+        
+        # Daily Gemini usage ledger; guild 0 is usage outside any guild, model '-' holds local fallbacks
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gemini_usage (
+                usage_date TEXT,
+                guild_id INTEGER,
+                model TEXT,
+                purpose TEXT,
+                calls INTEGER DEFAULT 0,
+                errors INTEGER DEFAULT 0,
+                fallbacks INTEGER DEFAULT 0,
+                prompt_tokens INTEGER DEFAULT 0,
+                output_tokens INTEGER DEFAULT 0,
+                latency_ms INTEGER DEFAULT 0,
+                PRIMARY KEY (usage_date, guild_id, model, purpose)
+            )
+        """)
+        
+        # Per-guild daily Gemini call budgets (0 = unlimited)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS gemini_budgets (
+                guild_id INTEGER PRIMARY KEY,
+                daily_calls INTEGER DEFAULT 0
+            )
+        """)
+        
+        # Process-wide bot state (e.g. the hash of the last synced command tree)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bot_settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        
+        # Indexes for guild-scoped scans (leaderboards, reminder fan-out)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_streaks_guild ON streaks (guild_id, current_streak)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_server_settings_reminder ON server_settings (reminder_time)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_settings_reminder ON user_settings (custom_reminder_time)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_streaks_active ON streaks (last_log_date) WHERE current_streak > 0")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_freeze_awards_date ON freeze_awards (awarded_on)")
+        
         conn.commit()
         conn.close()
     
@@ -167,6 +253,7 @@ class Database:
                 last_log_date = excluded.last_log_date,
                 last_day_number = 0
         """, (user_id, guild_id, today))
+        cursor.execute("DELETE FROM freeze_awards WHERE user_id = ? AND guild_id = ?", (user_id, guild_id))
         
         conn.commit()
         conn.close()
@@ -230,6 +317,19 @@ class Database:
         conn.commit()
         conn.close()
     
+    def remove_daily_log(self, user_id: int, guild_id: int, date: str, day_number: int) -> bool:
+        """Delete a user's log for `date` if it still has `day_number`; return whether one was removed."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM daily_logs
+            WHERE user_id = ? AND guild_id = ? AND log_date = ? AND day_number = ?
+        ''', (user_id, guild_id, date, day_number))
+        removed = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return removed
+    
     def get_server_settings(self, guild_id: int) -> Optional[Tuple]:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -290,6 +390,38 @@ class Database:
         conn.close()
         return results
     
+    def get_logs_since(self, user_id: int, guild_id: int, start_date: str) -> List[Tuple]:
+        """Get a user's logs on or after start_date (YYYY-MM-DD), oldest first.
+
+        Served by the (user_id, guild_id, log_date) primary key as a range scan.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT log_date, day_number
+            FROM daily_logs
+            WHERE user_id = ? AND guild_id = ? AND log_date >= ?
+            ORDER BY log_date
+        """, (user_id, guild_id, start_date))
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    
+    def get_log_version(self, user_id: int, guild_id: int) -> Tuple:
+        """Cheap version stamp of a user's logs: (latest log_date, number of logs).
+
+        Changes whenever a day is added or logs are cleared, so caches keyed on it never go stale,
+        even across processes.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT MAX(log_date), COUNT(*) FROM daily_logs WHERE user_id = ? AND guild_id = ?
+        """, (user_id, guild_id))
+        result = cursor.fetchone()
+        conn.close()
+        return result
+    
     def get_server_stats(self, guild_id: int) -> Tuple:
         """Get server-wide statistics."""
         conn = self.get_connection()
@@ -351,6 +483,40 @@ class Database:
         conn.close()
         return results
     
+    def get_due_reminder_recipients(self, today_str: str, time_utc: str) -> List[Tuple]:
+        """Get every reminder recipient due at time_utc (HH:MM) across all guilds in one query.
+
+        Returns rows of (guild_id, channel_id, user_id, delivery, opt_out) where delivery is
+        'channel' for the guild-wide reminder or 'dm' for users with a matching custom_reminder_time.
+        Users with a custom reminder time are only reminded by DM, never in the channel.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT ss.guild_id, ss.reminder_channel_id, s.user_id, 'channel', COALESCE(us.opt_out_mentions, 0)
+            FROM server_settings ss
+            JOIN streaks s ON s.guild_id = ss.guild_id AND s.current_streak > 0
+            LEFT JOIN user_settings us ON us.user_id = s.user_id AND us.guild_id = s.guild_id
+            WHERE ss.reminder_time = ? AND ss.reminder_channel_id IS NOT NULL
+              AND us.custom_reminder_time IS NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM daily_logs d
+                  WHERE d.user_id = s.user_id AND d.guild_id = s.guild_id AND d.log_date = ?
+              )
+            UNION ALL
+            SELECT us.guild_id, NULL, us.user_id, 'dm', COALESCE(us.opt_out_mentions, 0)
+            FROM user_settings us
+            JOIN streaks s ON s.user_id = us.user_id AND s.guild_id = us.guild_id AND s.current_streak > 0
+            WHERE us.custom_reminder_time = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM daily_logs d
+                  WHERE d.user_id = us.user_id AND d.guild_id = us.guild_id AND d.log_date = ?
+              )
+        """, (time_utc, today_str, time_utc, today_str))
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    
     def get_streak_freeze(self, user_id: int, guild_id: int) -> int:
         """Get user's freeze count (like Duolingo streak freeze)."""
         conn = self.get_connection()
@@ -406,6 +572,131 @@ class Database:
         conn.commit()
         conn.close()
 
+    def run_daily_rollover(self, run_date: str) -> Optional[dict]:
+        """Apply grace rules, automatic freezes, freeze awards and expiry for all guilds at once.
+
+        Streaks survive two days without a log. Beyond that, one freeze is consumed per extra
+        missed day if the user has enough of them; otherwise the streak is reset. Every 7-day
+        milestone of the current streak earns one freeze. Runs as a single transaction and only
+        once per run_date (YYYY-MM-DD); returns None if that date was already rolled over.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("INSERT OR IGNORE INTO rollover_runs (run_date) VALUES (?)", (run_date,))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return None
+
+            # Active streaks past the grace period, with the freezes needed to cover the gap
+            cursor.execute("DROP TABLE IF EXISTS temp.rollover_candidates")
+            cursor.execute("""
+                CREATE TEMP TABLE rollover_candidates (
+                    user_id INTEGER,
+                    guild_id INTEGER,
+                    needed INTEGER,
+                    available INTEGER,
+                    PRIMARY KEY (user_id, guild_id)
+                )
+            """)
+            cursor.execute("""
+                INSERT INTO rollover_candidates (user_id, guild_id, needed, available)
+                SELECT s.user_id, s.guild_id,
+                       CAST(julianday(?) - julianday(s.last_log_date) AS INTEGER) - 2,
+                       COALESCE(f.freeze_count, 1)
+                FROM streaks s
+                LEFT JOIN streak_freezes f ON f.user_id = s.user_id AND f.guild_id = s.guild_id
+                WHERE s.current_streak > 0 AND s.last_log_date <= date(?, '-3 days')
+            """, (run_date, run_date))
+
+            # Automatic freezes: spend them and move the last log date back inside the grace window
+            cursor.execute("""
+                INSERT INTO streak_freezes (user_id, guild_id, freeze_count, last_freeze_date)
+                SELECT user_id, guild_id, available - needed, ?
+                FROM rollover_candidates WHERE needed <= available
+                ON CONFLICT(user_id, guild_id) DO UPDATE SET
+                    freeze_count = excluded.freeze_count,
+                    last_freeze_date = excluded.last_freeze_date
+            """, (run_date,))
+            frozen = cursor.rowcount
+            cursor.execute("""
+                UPDATE streaks SET last_log_date = date(?, '-2 days')
+                WHERE (user_id, guild_id) IN (
+                    SELECT user_id, guild_id FROM rollover_candidates WHERE needed <= available
+                )
+            """, (run_date,))
+
+            # Expire streaks the freezes could not cover; last_log_date keeps the real last post
+            cursor.execute("""
+                UPDATE streaks SET current_streak = 0, last_day_number = 0
+                WHERE (user_id, guild_id) IN (
+                    SELECT user_id, guild_id FROM rollover_candidates WHERE needed > available
+                )
+            """)
+            expired = cursor.rowcount
+            cursor.execute("""
+                DELETE FROM freeze_awards
+                WHERE (user_id, guild_id) IN (
+                    SELECT user_id, guild_id FROM rollover_candidates WHERE needed > available
+                )
+            """)
+
+            # Earn one freeze for every 7-day milestone of the current streak not yet awarded.
+            # Awards are contiguous from 1, so only milestones above the highest awarded are new.
+            changes_before = conn.total_changes
+            cursor.execute("""
+                WITH RECURSIVE milestones(m) AS (
+                    SELECT 1
+                    UNION ALL
+                    SELECT m + 1 FROM milestones
+                    WHERE m < (SELECT MAX(current_streak) / 7 FROM streaks)
+                ),
+                awarded AS (
+                    SELECT user_id, guild_id, MAX(milestone) AS top
+                    FROM freeze_awards GROUP BY user_id, guild_id
+                )
+                INSERT OR IGNORE INTO freeze_awards (user_id, guild_id, milestone, awarded_on)
+                SELECT s.user_id, s.guild_id, milestones.m, ?
+                FROM streaks s
+                LEFT JOIN awarded a ON a.user_id = s.user_id AND a.guild_id = s.guild_id
+                JOIN milestones ON milestones.m > COALESCE(a.top, 0) AND milestones.m <= s.current_streak / 7
+                WHERE s.current_streak >= 7
+            """, (run_date,))
+            # rowcount is not reported for statements starting with WITH
+            awarded = conn.total_changes - changes_before
+            # Users without a freeze row implicitly hold one freeze
+            cursor.execute("""
+                INSERT INTO streak_freezes (user_id, guild_id, freeze_count)
+                SELECT user_id, guild_id, 1 + COUNT(*) FROM freeze_awards
+                WHERE awarded_on = ? GROUP BY user_id, guild_id
+                ON CONFLICT(user_id, guild_id) DO UPDATE SET
+                    freeze_count = freeze_count + excluded.freeze_count - 1
+            """, (run_date,))
+
+            cursor.execute("""
+                UPDATE rollover_runs SET frozen = ?, expired = ?, awarded = ?, finished_at = ?
+                WHERE run_date = ?
+            """, (frozen, expired, awarded, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), run_date))
+            cursor.execute("DROP TABLE IF EXISTS temp.rollover_candidates")
+            conn.commit()
+            return {'frozen': frozen, 'expired': expired, 'awarded': awarded}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def clear_freeze_awards_above(self, user_id: int, guild_id: int, streak: int):
+        """Forget freeze milestones above a lowered streak so they can be earned again."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM freeze_awards WHERE user_id = ? AND guild_id = ? AND milestone > ?
+        """, (user_id, guild_id, streak // 7))
+        conn.commit()
+        conn.close()
+
     def clear_user_logs(self, user_id: int, guild_id: int):
         """Delete all of a user's daily logs."""
         conn = self.get_connection()
@@ -436,6 +727,42 @@ class Database:
         conn.commit()
         conn.close()
 
+    def upsert_users(self, rows: List[Tuple]):
+        """Bulk upsert of (user_id, username, display_name, avatar_url) rows in one transaction."""
+        if not rows:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO users (user_id, username, display_name, avatar_url, last_updated)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                display_name = excluded.display_name,
+                avatar_url = excluded.avatar_url,
+                last_updated = CURRENT_TIMESTAMP
+            """,
+            rows
+        )
+        conn.commit()
+        conn.close()
+
+    def get_users(self, user_ids: List[int]) -> dict:
+        """Look up cached user info, returning {user_id: (username, display_name, avatar_url)}."""
+        if not user_ids:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ",".join("?" for _ in user_ids)
+        cursor.execute(
+            f"SELECT user_id, username, display_name, avatar_url FROM users WHERE user_id IN ({placeholders})",
+            list(user_ids)
+        )
+        results = {row[0]: row[1:] for row in cursor.fetchall()}
+        conn.close()
+        return results
+
     # Bot meta helpers
     def get_last_seen(self, guild_id: int) -> Optional[str]:
         conn = self.get_connection()
@@ -459,6 +786,111 @@ class Database:
         conn.commit()
         conn.close()
 
+    def get_pending_challenge(self, guild_id: int, week_key: str) -> Optional[Tuple]:
+        """Return (challenge_text, attempts, posted_at) for a guild's week, or None if nothing was tried yet."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT challenge_text, attempts, posted_at FROM pending_challenges
+            WHERE guild_id = ? AND week_key = ?
+        """, (guild_id, week_key))
+        row = cursor.fetchone()
+        conn.close()
+        return row
+
+    def record_challenge_attempt(self, guild_id: int, week_key: str, challenge_text: Optional[str] = None,
+                                 error: Optional[str] = None):
+        """Count one generation attempt, storing the text on success or the error on failure."""
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO pending_challenges (guild_id, week_key, challenge_text, attempts, last_error, generated_at)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT(guild_id, week_key) DO UPDATE SET
+                attempts = attempts + 1,
+                challenge_text = COALESCE(excluded.challenge_text, challenge_text),
+                last_error = excluded.last_error,
+                generated_at = COALESCE(excluded.generated_at, generated_at)
+        """, (guild_id, week_key, challenge_text, error, now if challenge_text else None))
+        conn.commit()
+        conn.close()
+
+    def mark_challenge_posted(self, guild_id: int, week_key: str, challenge_text: str):
+        """Record what was posted for the week, including pool fallbacks that never had a pending row."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO pending_challenges (guild_id, week_key, challenge_text, posted_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(guild_id, week_key) DO UPDATE SET
+                challenge_text = excluded.challenge_text,
+                posted_at = excluded.posted_at
+        """, (guild_id, week_key, challenge_text, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+        conn.close()
+
+    def add_gemini_usage(self, rows: List[Tuple]):
+        """Add (usage_date, guild_id, model, purpose, calls, errors, fallbacks, prompt_tokens,
+        output_tokens, latency_ms) deltas to the daily ledger."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO gemini_usage (usage_date, guild_id, model, purpose, calls, errors, fallbacks,
+                                      prompt_tokens, output_tokens, latency_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(usage_date, guild_id, model, purpose) DO UPDATE SET
+                calls = calls + excluded.calls,
+                errors = errors + excluded.errors,
+                fallbacks = fallbacks + excluded.fallbacks,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                output_tokens = output_tokens + excluded.output_tokens,
+                latency_ms = latency_ms + excluded.latency_ms
+        """, rows)
+        conn.commit()
+        conn.close()
+
+    def get_gemini_calls_by_guild(self, usage_date: str) -> List[Tuple[int, int]]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT guild_id, SUM(calls) FROM gemini_usage WHERE usage_date = ? GROUP BY guild_id
+        """, (usage_date,))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def get_gemini_usage(self, guild_id: int, usage_date: str) -> List[Tuple]:
+        """Return (purpose, calls, errors, fallbacks, prompt_tokens, output_tokens) for a guild's day."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT purpose, SUM(calls), SUM(errors), SUM(fallbacks), SUM(prompt_tokens), SUM(output_tokens)
+            FROM gemini_usage WHERE guild_id = ? AND usage_date = ?
+            GROUP BY purpose ORDER BY purpose
+        """, (guild_id, usage_date))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def get_gemini_budgets(self) -> List[Tuple[int, int]]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT guild_id, daily_calls FROM gemini_budgets")
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def set_gemini_budget(self, guild_id: int, daily_calls: int):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO gemini_budgets (guild_id, daily_calls) VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET daily_calls = excluded.daily_calls
+        """, (guild_id, daily_calls))
+        conn.commit()
+        conn.close()
+
     def get_last_week_sent(self, guild_id: int) -> Optional[str]:
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -481,6 +913,27 @@ class Database:
         conn.commit()
         conn.close()
 
+    def get_bot_setting(self, key: str) -> Optional[str]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM bot_settings WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def set_bot_setting(self, key: str, value: str):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO bot_settings (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """,
+            (key, value)
+        )
+        conn.commit()
+        conn.close()
+
     # Channel state helpers
     def get_last_processed(self, guild_id: int, channel_id: int) -> Optional[int]:
         conn = self.get_connection()
@@ -504,6 +957,42 @@ class Database:
         conn.commit()
         conn.close()
 
+    def save_backfill_batch(self, guild_id: int, channel_id: int, last_processed_id: int,
+                            users: List[Tuple], logs: List[Tuple]):
+        """Write backfilled (user_id, username, display_name, avatar_url) rows and historical
+        (user_id, log_date, day_number) logs together with the channel's checkpoint in one transaction."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO users (user_id, username, display_name, avatar_url, last_updated)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                display_name = excluded.display_name,
+                avatar_url = excluded.avatar_url,
+                last_updated = CURRENT_TIMESTAMP
+            """,
+            users
+        )
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO daily_logs (user_id, guild_id, log_date, day_number)
+            VALUES (?, ?, ?, ?)
+            """,
+            [(user_id, guild_id, log_date, day_number) for user_id, log_date, day_number in logs]
+        )
+        cursor.execute(
+            """
+            INSERT INTO bot_channel_state (guild_id, channel_id, last_processed_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(guild_id, channel_id) DO UPDATE SET last_processed_id = excluded.last_processed_id
+            """,
+            (guild_id, channel_id, last_processed_id)
+        )
+        conn.commit()
+        conn.close()
+
     # Daily code channel settings
     def set_daily_code_channel(self, guild_id: int, channel_id: int):
         conn = self.get_connection()
@@ -0,0 +1,244 @@
+"""Parses each gateway message once and routes it to the handlers interested in its features."""
+import asyncio
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import discord
+
+logger = logging.getLogger('LupinBot.dispatcher')
+
+DAY_PATTERN = re.compile(r'#\s*day[\s-]*(\d+)', re.IGNORECASE)
+CODE_BLOCK_PATTERN = re.compile(r'```[\s\S]*?```|`[^`]+`')
+
+CODE_EXTENSIONS = (
+    '.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', '.php',
+    '.rb', '.go', '.rs', '.swift', '.kt', '.scala', '.r',
+    '.html', '.css', '.scss', '.sass', '.less', '.xml',
+    '.json', '.yaml', '.yml', '.toml', '.ini', '.cfg',
+    '.sql', '.sh', '.bash', '.ps1', '.bat', '.cmd',
+    '.md', '.txt', '.log', '.conf', '.config'
+)
+
+CODE_KEYWORDS = (
+    'def ', 'class ', 'import ', 'function ', 'const ', 'let ', 'var ',
+    'public ', 'private ', 'void ', 'int ', 'string ', 'return ',
+    'if ', 'else ', 'for ', 'while ', 'try ', 'catch ', '#include',
+    'console.log', 'print(', 'System.out', 'printf', 'cout',
+    'function(', '=>', 'async', 'await', 'promise',
+    'main(', 'public static void', 'namespace', 'using ',
+    'require(', 'module.exports', 'export ', 'import ',
+    'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE',
+    'html', 'css', 'javascript', 'python', 'java', 'cpp', 'c++',
+    'react', 'vue', 'angular', 'node', 'express', 'django',
+    'sql', 'mongodb', 'mysql', 'postgresql',
+    'git', 'commit', 'push', 'pull', 'branch',
+    'api', 'endpoint', 'request', 'response', 'json',
+    'array', 'list', 'dictionary', 'hashmap', 'tree',
+    'binary', 'search', 'sort', 'recursion', 'dynamic'
+)
+
+# Feature kinds handlers subscribe to
+TEXT = 'text'
+DAY = 'day'
+CODE_BLOCK = 'code_block'
+CODE_HINT = 'code_hint'
+CODE_FILE = 'code_file'
+IMAGE = 'image'
+FILE = 'file'
+MENTION = 'mention'
+MONITORED = 'monitored'
+
+
+def parse_day_number(content: Optional[str]) -> Optional[int]:
+    match = DAY_PATTERN.search(content or '')
+    return int(match.group(1)) if match else None
+
+
+def has_code_keywords(content: str) -> bool:
+    """The loose keyword check streak detection has always used for plain text."""
+    lowered = content.lower()
+    return any(keyword in lowered for keyword in CODE_KEYWORDS)
+
+
+def is_code_file(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(CODE_EXTENSIONS)
+
+
+class MonitoredChannels:
+    """Per-guild sets of the channel ids streak detection watches.
+
+    A channel is monitored when it is the guild's configured daily-code channel or its name
+    contains 'daily-code' (threads follow their parent). The sets are rebuilt from the guild's
+    channel list when the bot starts or joins and when channels change, so checking a message
+    is a set lookup instead of a database query.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.guilds: dict[int, frozenset] = {}
+
+    def refresh(self, guild: discord.Guild) -> frozenset:
+        try:
+            configured_id = self.db.get_daily_code_channel(guild.id)
+        except Exception as e:
+            logger.error(f'Could not load daily-code channel for guild {guild.id}: {e}')
+            configured_id = None
+        channels = frozenset(
+            channel.id for channel in guild.text_channels
+            if channel.id == configured_id or 'daily-code' in channel.name.lower()
+        )
+        self.guilds[guild.id] = channels
+        return channels
+
+    def forget(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+
+    def is_monitored(self, channel) -> bool:
+        guild = getattr(channel, 'guild', None)
+        if guild is None:
+            return False
+        channels = self.guilds.get(guild.id)
+        if channels is None:
+            channels = self.refresh(guild)
+        return channel.id in channels or getattr(channel, 'parent_id', None) in channels
+
+    def snapshot(self) -> dict:
+        return {'guilds': len(self.guilds), 'channels': sum(len(c) for c in self.guilds.values())}
+
+
+@dataclass(frozen=True)
+class MessageFeatures:
+    """Everything the listeners need to know about a message, computed once."""
+
+    message: discord.Message
+    day_number: Optional[int]
+    has_code_block: bool
+    code_hint: bool
+    code_attachments: tuple
+    image_attachments: tuple
+    other_attachments: tuple
+    mentions_bot: bool
+    in_monitored_channel: bool
+    is_reply: bool
+    kinds: frozenset
+
+    @classmethod
+    def from_message(cls, message, bot_user=None, is_monitored: Callable = None) -> 'MessageFeatures':
+        content = message.content or ''
+        code_files, images, others = [], [], []
+        for attachment in message.attachments:
+            content_type = attachment.content_type or ''
+            if is_code_file(attachment.filename):
+                code_files.append(attachment)
+            elif content_type.startswith('image/'):
+                images.append(attachment)
+            elif not content_type.startswith(('video/', 'audio/')):
+                others.append(attachment)
+
+        day_number = parse_day_number(content)
+        has_code_block = bool(CODE_BLOCK_PATTERN.search(content)) if '`' in content else False
+        code_hint = bool(content) and not has_code_block and has_code_keywords(content)
+        mentions_bot = (bot_user is not None and bot_user.mentioned_in(message)
+                        and not message.mention_everyone)
+        monitored = (message.guild is not None and is_monitored is not None
+                     and is_monitored(message.channel))
+
+        kinds = frozenset(kind for kind, present in (
+            (DAY, day_number is not None),
+            (CODE_BLOCK, has_code_block),
+            (TEXT, bool(content)),
+            (CODE_HINT, code_hint),
+            (CODE_FILE, bool(code_files)),
+            (IMAGE, bool(images)),
+            (FILE, bool(others)),
+            (MENTION, mentions_bot),
+            (MONITORED, monitored),
+        ) if present)
+        return cls(
+            message=message,
+            day_number=day_number,
+            has_code_block=has_code_block,
+            code_hint=code_hint,
+            code_attachments=tuple(code_files),
+            image_attachments=tuple(images),
+            other_attachments=tuple(others),
+            mentions_bot=mentions_bot,
+            in_monitored_channel=monitored,
+            is_reply=getattr(message, 'reference', None) is not None,
+            kinds=kinds,
+        )
+
+
+Handler = Callable[[MessageFeatures], Awaitable[None]]
+Filter = Callable[[MessageFeatures], bool]
+
+
+class MessageDispatcher:
+    """Extracts MessageFeatures once per message and runs each subscriber whose kinds it has.
+
+    Handlers run as separate tasks, like discord.py's own listeners, so a slow one (a
+    streamed answer) doesn't hold up the others. Messages no subscriber wants are
+    counted and dropped after parsing.
+
+    A subscriber can also pass `accept`, checked after the kinds match. Messages it turns
+    away are counted as `<name>_skipped`, along with the images and other attachments the
+    handler would have had to analyse.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.subscribers: dict[str, tuple[frozenset, Handler, Optional[Filter]]] = {}
+        # Channels whose messages count as monitored (set by the Streaks cog)
+        self.monitored: Optional[MonitoredChannels] = None
+        self.tasks: set[asyncio.Task] = set()
+        self.stats = Counter()
+
+    def subscribe(self, name: str, kinds, handler: Handler, accept: Optional[Filter] = None):
+        self.subscribers[name] = (frozenset(kinds), handler, accept)
+
+    def unsubscribe(self, name: str):
+        self.subscribers.pop(name, None)
+
+    def extract(self, message) -> MessageFeatures:
+        is_monitored = self.monitored.is_monitored if self.monitored is not None else None
+        return MessageFeatures.from_message(message, self.bot.user, is_monitored)
+
+    def dispatch(self, message) -> MessageFeatures:
+        features = self.extract(message)
+        interested = []
+        for name, (kinds, handler, accept) in self.subscribers.items():
+            if not kinds & features.kinds:
+                continue
+            if accept is not None and not accept(features):
+                self.stats[f'{name}_skipped'] += 1
+                self.stats[f'{name}_skipped_images'] += len(features.image_attachments)
+                self.stats[f'{name}_skipped_attachments'] += (
+                    len(features.code_attachments) + len(features.other_attachments)
+                )
+                continue
+            interested.append((name, handler))
+        if not interested:
+            self.stats['ignored'] += 1
+            return features
+        self.stats['dispatched'] += 1
+        for name, handler in interested:
+            self.stats[name] += 1
+            task = asyncio.create_task(handler(features), name=f'dispatch:{name}')
+            self.tasks.add(task)
+            task.add_done_callback(lambda t, name=name: self._done(name, t))
+        return features
+
+    def snapshot(self) -> dict:
+        return {
+            'stats': dict(self.stats),
+            'in_flight': len(self.tasks),
+            'monitored': self.monitored.snapshot() if self.monitored is not None else None,
+        }
+
+    def _done(self, name: str, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f'Message handler {name} failed: {task.exception()}', exc_info=task.exception())
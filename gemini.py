@@ -1,11 +1,20 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import re
+import time
 
 from google import genai
 from google.genai import types
 from pydantic import BaseModel
 
+from cache import SingleFlight, TTLCache
+from conversations import Conversation, ConversationStore
+from ratelimit import CircuitBreaker, CircuitOpenError, RateLimitExceeded, TokenBucket
+from usage import tracker as usage
+
 
 logger = logging.getLogger('LupinBot.gemini')
 
@@ -20,23 +29,194 @@ def get_client():
         if not api_key:
             logger.warning("GEMINI_API_KEY not found in environment variables")
             return None
+        # GEMINI_BASE_URL points the client somewhere else, e.g. at mock_gemini.py
+        base_url = os.environ.get("GEMINI_BASE_URL")
         try:
-            _client = genai.Client(api_key=api_key)
+            _client = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(base_url=base_url) if base_url else None,
+            )
         except Exception as e:
             logger.error(f"Failed to create Gemini client: {e}")
             return None
     return _client
 
+# Shared limit on in-flight Gemini requests across every cog and listener
+MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+# Per-purpose timeouts in seconds
+DETECTION_TIMEOUT = 20
+ANSWER_TIMEOUT = 60
+CHALLENGE_TIMEOUT = 90
+
+
+# Requests per minute and burst per model, overridable as e.g. GEMINI_RPM_GEMINI_2_5_FLASH
+MODEL_LIMITS = {
+    "gemini-2.5-flash": (60, 10),
+    "gemini-2.5-pro": (10, 2),
+}
+# Longest we queue for a token before using the local fallback instead
+MAX_TOKEN_WAIT = 10
+
+_buckets: dict[str, TokenBucket] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def _env_key(model: str) -> str:
+    return "GEMINI_RPM_" + model.upper().replace("-", "_").replace(".", "_")
+
+
+def _limits_for(model: str) -> tuple[TokenBucket, CircuitBreaker]:
+    if model not in _buckets:
+        rpm, burst = MODEL_LIMITS.get(model, (30, 5))
+        rpm = int(os.environ.get(_env_key(model), rpm))
+        _buckets[model] = TokenBucket(rate=rpm / 60, capacity=burst)
+        _breakers[model] = CircuitBreaker(model)
+    return _buckets[model], _breakers[model]
+
+
+def has_headroom(model: str, fraction: float = 0.5) -> bool:
+    """True when the model's bucket is at least `fraction` full and its circuit is closed,
+    so background work can use it without delaying live requests."""
+    bucket, breaker = _limits_for(model)
+    return bucket.snapshot()['tokens'] >= bucket.capacity * fraction and breaker.state == breaker.CLOSED
+
+
+def get_status() -> dict:
+    """Token bucket and circuit breaker state per model, for the metrics endpoint."""
+    return {
+        model: {'bucket': _buckets[model].snapshot(), 'breaker': _breakers[model].snapshot()}
+        for model in _buckets
+    }
+
+
+def _outcome(error: BaseException) -> str:
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, RateLimitExceeded):
+        return "rate_limited"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+async def generate(client, model: str, contents, config, timeout: float,
+                   purpose: str = "other", guild_id: int = None):
+    """Run one Gemini request on the SDK's async client.
+
+    Rejects immediately with CircuitOpenError while the model's breaker is open, waits for a
+    token from the model's bucket, then for a slot in the shared semaphore, then enforces the
+    timeout. Cancelling the calling task cancels the in-flight request. Every call is recorded
+    in the usage tracker under `purpose` and `guild_id`.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    response = None
+    outcome = "ok"
+    bucket, breaker = _limits_for(model)
+    try:
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"circuit for {model} is open")
+        # Local throttling says nothing about Gemini's health, so it isn't a breaker failure
+        try:
+            await bucket.acquire(max_wait=min(timeout, MAX_TOKEN_WAIT))
+        except BaseException:
+            breaker.release()
+            raise
+        try:
+            async with _semaphore:
+                response = await asyncio.wait_for(
+                    client.aio.models.generate_content(model=model, contents=contents, config=config),
+                    timeout=timeout,
+                )
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return response
+    except BaseException as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        usage.record(model, purpose, guild_id, outcome, loop.time() - start, response)
+
+
+async def generate_stream(client, model: str, contents, config, timeout: float,
+                          purpose: str = "other", guild_id: int = None):
+    """Streaming counterpart of generate, yielding response chunks as they arrive.
+
+    The semaphore slot is held until the stream ends, and `timeout` bounds the whole stream.
+    Token counts come from the last chunk that carries usage metadata.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    last_usage = None
+    outcome = "ok"
+    bucket, breaker = _limits_for(model)
+    try:
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"circuit for {model} is open")
+        # Local throttling says nothing about Gemini's health, so it isn't a breaker failure
+        try:
+            await bucket.acquire(max_wait=min(timeout, MAX_TOKEN_WAIT))
+        except BaseException:
+            breaker.release()
+            raise
+        try:
+            async with _semaphore:
+                deadline = loop.time() + timeout
+                stream = await asyncio.wait_for(
+                    client.aio.models.generate_content_stream(model=model, contents=contents, config=config),
+                    timeout=timeout,
+                )
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    if getattr(chunk, "usage_metadata", None) is not None:
+                        last_usage = chunk
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+    except BaseException as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        usage.record(model, purpose, guild_id, outcome, loop.time() - start, last_usage)
+
+
 class CodeDetectionResult(BaseModel):
     contains_code: bool
     confidence: float
 
 
-def detect_code_in_image(image_bytes: bytes, mime_type: str = "image/png") -> bool:
+def _local_image_verdicts(images: list[tuple[bytes, str]]) -> list[bool]:
+    """Verdicts from the image headers alone, used once a guild is over its daily budget."""
+    from image_review import image_looks_like_code
+    return [image_looks_like_code(data, mime_type) for data, mime_type in images]
+
+
+async def detect_code_in_image(image_bytes: bytes, mime_type: str = "image/png", guild_id: int = None) -> bool:
+    if usage.over_budget(guild_id):
+        usage.record_fallback("image_detection", guild_id, "budget")
+        return _local_image_verdicts([(image_bytes, mime_type)])[0]
     try:
         client = get_client()
         if client is None:
             logger.warning("Gemini client not available, accepting image as fallback")
+            usage.record_fallback("image_detection", guild_id, "no_client")
             return True
         
         system_prompt = (
@@ -46,24 +226,28 @@ def detect_code_in_image(image_bytes: bytes, mime_type: str = "image/png") -> bo
             "Respond with JSON in this format: "
             "{'contains_code': boolean, 'confidence': number between 0 and 1}")
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
+        response = await generate(
+            client,
+            "gemini-2.5-flash",
+            [
                 types.Part.from_bytes(
                     data=image_bytes,
                     mime_type=mime_type,
                 ),
                 "Does this image contain programming code, code snippets, terminal output, or code-related content?"
             ],
-            config=types.GenerateContentConfig(
+            types.GenerateContentConfig(
                 system_instruction=system_prompt,
                 response_mime_type="application/json",
                 response_schema=CodeDetectionResult,
             ),
+            DETECTION_TIMEOUT,
+            purpose="image_detection",
+            guild_id=guild_id,
         )
 
         raw_json = response.text
-        logger.info(f"Gemini code detection response: {raw_json}")
+        logger.debug(f"Gemini code detection response: {raw_json}")
 
         if raw_json:
             data = json.loads(raw_json)
@@ -71,20 +255,127 @@ def detect_code_in_image(image_bytes: bytes, mime_type: str = "image/png") -> bo
             return result.contains_code and result.confidence > 0.5
         else:
             logger.warning("Empty response from Gemini, accepting image as fallback")
+            usage.record_fallback("image_detection", guild_id, "empty")
             return True
 
+    except CircuitOpenError:
+        logger.debug("Gemini circuit open, accepting image as fallback")
+        usage.record_fallback("image_detection", guild_id, "circuit_open")
+        return True
     except Exception as e:
         logger.error(f"Failed to analyze image with Gemini (quota/error), accepting image as fallback: {e}")
+        usage.record_fallback("image_detection", guild_id, "error")
         return True
 
 
-def generate_challenge_from_history(history_samples: list[str], guild_name: str, channel_name: str) -> str:
+# Images sent per batch classification request, overridable via GEMINI_BATCH_IMAGES
+BATCH_IMAGES = int(os.environ.get("GEMINI_BATCH_IMAGES", "5"))
+IMAGE_MODEL = "gemini-2.5-flash"
+
+
+class ImageVerdict(BaseModel):
+    index: int
+    contains_code: bool
+    confidence: float
+
+
+class BatchCodeDetectionResult(BaseModel):
+    verdicts: list[ImageVerdict]
+
+
+async def _classify_batch(client, batch: list[tuple[bytes, str]], guild_id: int = None) -> list[bool]:
+    """Classify up to BATCH_IMAGES images in one structured request; unanswered images count as code."""
+    system_prompt = (
+        "You are a programming code detection expert. "
+        "You will receive several numbered images. For each one, determine if it contains any "
+        "programming code, code snippets, terminal output, IDE screenshots, or code-related content. "
+        "Return exactly one verdict per image, using the image number as its index.")
+
+    contents = []
+    for number, (image_bytes, mime_type) in enumerate(batch, start=1):
+        contents.append(f"Image {number}:")
+        contents.append(types.Part.from_bytes(data=image_bytes, mime_type=mime_type))
+    contents.append("Which of these images contain programming code or code-related content?")
+
+    response = await generate(
+        client,
+        IMAGE_MODEL,
+        contents,
+        types.GenerateContentConfig(
+            system_instruction=system_prompt,
+            response_mime_type="application/json",
+            response_schema=BatchCodeDetectionResult,
+        ),
+        DETECTION_TIMEOUT,
+        purpose="image_detection",
+        guild_id=guild_id,
+    )
+    logger.debug(f"Gemini batch code detection response: {response.text}")
+
+    verdicts = [True] * len(batch)
+    if not response.text:
+        logger.warning("Empty batch response from Gemini, accepting images as fallback")
+        usage.record_fallback("image_detection", guild_id, "empty")
+        return verdicts
+    result = BatchCodeDetectionResult(**json.loads(response.text))
+    for verdict in result.verdicts:
+        if 1 <= verdict.index <= len(batch):
+            verdicts[verdict.index - 1] = verdict.contains_code and verdict.confidence > 0.5
+    return verdicts
+
+
+async def classify_code_images(images: list[tuple[bytes, str]], any_positive: bool = False,
+                               guild_id: int = None) -> list[bool]:
+    """Return a code verdict per (image_bytes, mime_type), sending BATCH_IMAGES images per request.
+
+    With any_positive, batches after the first one containing code are not sent and the
+    returned list is cut short after that batch. Images are accepted when Gemini is
+    unavailable or fails, matching detect_code_in_image; once the guild is over its daily
+    budget they are judged locally from their headers instead.
+    """
+    if usage.over_budget(guild_id):
+        usage.record_fallback("image_detection", guild_id, "budget")
+        return _local_image_verdicts(images)
+    client = get_client()
+    if client is None:
+        logger.warning("Gemini client not available, accepting images as fallback")
+        usage.record_fallback("image_detection", guild_id, "no_client")
+        return [True] * len(images)
+
+    verdicts: list[bool] = []
+    for start in range(0, len(images), BATCH_IMAGES):
+        batch = images[start:start + BATCH_IMAGES]
+        try:
+            verdicts.extend(await _classify_batch(client, batch, guild_id))
+        except CircuitOpenError:
+            logger.debug("Gemini circuit open, accepting images as fallback")
+            usage.record_fallback("image_detection", guild_id, "circuit_open")
+            verdicts.extend([True] * len(batch))
+        except Exception as e:
+            logger.error(f"Failed to batch-analyze images with Gemini, accepting images as fallback: {e}")
+            usage.record_fallback("image_detection", guild_id, "error")
+            verdicts.extend([True] * len(batch))
+        if any_positive and any(verdicts):
+            break
+    return verdicts
+
+
+async def any_image_has_code(images: list[tuple[bytes, str]], guild_id: int = None) -> bool:
+    """True if any image contains code, stopping after the first batch with a positive."""
+    return any(await classify_code_images(images, any_positive=True, guild_id=guild_id))
+
+
+async def generate_challenge_from_history(history_samples: list[str], guild_name: str, channel_name: str,
+                                          fallback: bool = True, guild_id: int = None) -> str:
     """Generate a weekly coding challenge based on last 7 days' history using Gemini.
-    Falls back to a generic challenge when API unavailable.
+    Falls back to a generic challenge when API unavailable; with fallback=False the
+    failure is raised instead, so callers can retry.
     """
     try:
         client = get_client()
         if client is None:
+            if not fallback:
+                raise RuntimeError("Gemini client not available")
             # Fallback simple challenge
             return (
                 "Build a small project inspired by your recent work: implement a CLI tool that parses input, "
@@ -104,97 +395,354 @@ def generate_challenge_from_history(history_samples: list[str], guild_name: str,
             "Now produce one compelling weekly challenge based on recurring themes or skills from the context."
         )
 
-        resp = client.models.generate_content(
-            model="gemini-2.5-pro",
-            contents=[user_prompt],
-            config=types.GenerateContentConfig(
+        resp = await generate(
+            client,
+            "gemini-2.5-pro",
+            [user_prompt],
+            types.GenerateContentConfig(
                 system_instruction=system_instruction,
                 temperature=0.8,
             ),
+            CHALLENGE_TIMEOUT,
+            purpose="challenge",
+            guild_id=guild_id,
         )
         text = (resp.text or "").strip()
         if not text:
+            if not fallback:
+                raise RuntimeError("Gemini returned an empty challenge")
             return "Design and implement a small application covering I/O, data structures, and error handling, with unit tests."
         # Trim overly long outputs
         return text[:1000]
     except Exception as e:
+        if not fallback:
+            raise
         logger.error(f"Gemini challenge generation failed: {e}")
+        usage.record_fallback("challenge", guild_id, "error")
         return (
             "Create a small app inspired by your recent work: ingest data, perform meaningful transformations, and expose a simple interface."
         )
 
 
-async def answer_question(question: str, attachments: list = None, image_data: list = None) -> str:
+# Answers to repeated questions are reused for a while; identical in-flight questions share one call
+ANSWER_CACHE_TTL = int(os.environ.get("GEMINI_ANSWER_CACHE_TTL", "600"))
+_answer_cache = TTLCache(max_entries=256, ttl=ANSWER_CACHE_TTL)
+_answer_flights = SingleFlight()
+
+
+def _question_key(question: str, attachments: list = None, image_data: list = None) -> str:
+    """Key a question by its normalized text plus hashes of the attached file and image contents."""
+    normalized = re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+    digest = hashlib.sha256(normalized.encode("utf-8"))
+    for att in attachments or []:
+        digest.update(b"\0file\0" + hashlib.sha256(att.get('content', '').encode("utf-8")).digest())
+    for img in image_data or []:
+        digest.update(b"\0image\0" + hashlib.sha256(img['data']).digest())
+    return digest.hexdigest()
+
+
+def get_answer_stats() -> dict:
+    """Answer cache and request coalescing counters, for the metrics endpoint."""
+    return {**_answer_cache.snapshot(), 'coalesced': _answer_flights.coalesced,
+            'in_flight': len(_answer_flights.in_flight), 'conversations': _conversations.snapshot()}
+
+
+async def answer_question(question: str, attachments: list = None, image_data: list = None,
+                          guild_id: int = None) -> str:
     """
     Answer a user's question using Gemini AI.
     Supports text questions, code files, and images.
+
+    Repeated questions are served from a short-lived cache, and identical questions that
+    arrive while one is already being answered wait for that answer instead of calling Gemini.
+    The answer is not length-limited; callers split it to fit Discord.
     
     Args:
         question: The user's question text
         attachments: List of attachment data (filename, content, mime_type)
         image_data: List of image data (bytes, mime_type)
+        guild_id: Guild the question was asked in, for usage accounting and budgets
     
     Returns:
         AI-generated answer as string
     """
+    key = _question_key(question, attachments, image_data)
+    cached = _answer_cache.get(key)
+    if cached is not None:
+        return cached
+    if usage.over_budget(guild_id) and key not in _answer_flights.in_flight:
+        usage.record_fallback("qa", guild_id, "budget")
+        return OVER_BUDGET_ANSWER
+
     try:
-        client = get_client()
-        if client is None:
-            return "❌ I'm sorry, but I can't access my AI capabilities right now. Please make sure the GEMINI_API_KEY is configured."
-        
-        system_instruction = (
-            "You are Lupin, a friendly and knowledgeable AI assistant specializing in programming and coding. "
-            "You help developers by answering questions, explaining code, debugging issues, and providing guidance. "
-            "Be concise, clear, and helpful. Use code blocks when showing code examples. "
-            "If analyzing images or files, describe what you see and provide relevant insights. "
-            "Keep responses under 1500 characters when possible."
-        )
-        
-        # Build the content list for Gemini
-        content_parts = []
-        
-        # Add text files/code files first
-        if attachments:
-            for att in attachments:
-                filename = att.get('filename', 'file')
-                content = att.get('content', '')
-                content_parts.append(f"📎 **Attached file: {filename}**\n```\n{content[:3000]}\n```")
-        
-        # Add images
-        if image_data:
-            for img in image_data:
-                content_parts.append(
-                    types.Part.from_bytes(
-                        data=img['data'],
-                        mime_type=img['mime_type']
-                    )
+        answer = await _answer_flights.do(key, lambda: _generate_answer(question, attachments, image_data, guild_id))
+    except Exception as e:
+        usage.record_fallback("qa", guild_id, _outcome(e))
+        return _answer_error(e)
+
+    if answer is None:
+        return NO_CLIENT_ANSWER
+    if not answer:
+        return EMPTY_ANSWER
+    _answer_cache.set(key, answer)
+    return answer
+
+
+async def stream_answer(question: str, attachments: list = None, image_data: list = None, guild_id: int = None,
+                        conversation: Conversation = None):
+    """
+    Stream an answer as text chunks while Gemini generates it.
+
+    Cached answers and questions already being answered elsewhere are yielded as a single
+    chunk; otherwise this call leads the request, so identical questions asked meanwhile
+    wait for its finished answer. Failures are yielded as an error message.
+
+    With a `conversation`, earlier turns of the thread are sent along and the finished
+    exchange is added to it. Follow-ups skip the answer cache, since the same words can
+    mean something else later in a thread.
+    """
+    if conversation is None:
+        async for chunk in _stream_answer(question, attachments, image_data, guild_id, None):
+            yield chunk
+        return
+    async with conversation.lock:
+        async for chunk in _stream_answer(question, attachments, image_data, guild_id, conversation):
+            yield chunk
+
+
+async def _stream_answer(question: str, attachments: list, image_data: list, guild_id: int,
+                         conversation: Conversation = None):
+    follow_up = conversation is not None and bool(conversation.turns)
+    key = None if follow_up else _question_key(question, attachments, image_data)
+    if key is not None:
+        cached = _answer_cache.get(key)
+        if cached is not None:
+            _remember(conversation, question, attachments, image_data, cached)
+            yield cached
+            return
+        if key in _answer_flights.in_flight:
+            answer = await answer_question(question, attachments, image_data, guild_id)
+            if not answer.startswith("❌"):
+                _remember(conversation, question, attachments, image_data, answer)
+            yield answer
+            return
+    if usage.over_budget(guild_id):
+        usage.record_fallback("qa", guild_id, "budget")
+        yield OVER_BUDGET_ANSWER
+        return
+
+    client = get_client()
+    if client is None:
+        yield NO_CLIENT_ANSWER
+        return
+
+    flight = _answer_flights.lead(key) if key is not None else None
+    parts = []
+    try:
+        if follow_up:
+            await _prepare_context_cache(client, conversation, guild_id)
+        contents, config = _answer_request(question, attachments, image_data, conversation)
+        async for chunk in generate_stream(client, ANSWER_MODEL, contents, config, ANSWER_TIMEOUT,
+                                           purpose="qa", guild_id=guild_id):
+            text = chunk.text or ""
+            if not parts:
+                text = text.lstrip()
+            if text:
+                parts.append(text)
+                yield text
+    except (asyncio.CancelledError, GeneratorExit):
+        if flight is not None:
+            flight.set_exception(RuntimeError("answer was abandoned"))
+        raise
+    except Exception as e:
+        if flight is not None:
+            flight.set_exception(e)
+        usage.record_fallback("qa", guild_id, _outcome(e))
+        if parts:
+            logger.error(f"Gemini answer stream failed midway: {e}")
+            yield "\n\n⚠️ *The rest of this answer could not be generated.*"
+        else:
+            yield _answer_error(e)
+        return
+
+    answer = "".join(parts).strip()
+    if flight is not None:
+        flight.set_result(answer)
+    if answer:
+        if key is not None:
+            _answer_cache.set(key, answer)
+        _remember(conversation, question, attachments, image_data, answer)
+    else:
+        yield EMPTY_ANSWER
+
+
+NO_CLIENT_ANSWER = "❌ I'm sorry, but I can't access my AI capabilities right now. Please make sure the GEMINI_API_KEY is configured."
+EMPTY_ANSWER = "❌ I couldn't generate a response. Please try rephrasing your question."
+OVER_BUDGET_ANSWER = "❌ This server has used up today's AI budget. Please try again tomorrow!"
+
+
+def _answer_error(e: Exception) -> str:
+    if isinstance(e, CircuitOpenError):
+        return "❌ My AI service is having trouble right now. Please try again in a minute!"
+    logger.error(f"Failed to answer question with Gemini: {e}")
+    return f"❌ I encountered an error while processing your question: {str(e)[:100]}"
+
+
+ANSWER_MODEL = "gemini-2.5-flash"
+ANSWER_INSTRUCTION = (
+    "You are Lupin, a friendly and knowledgeable AI assistant specializing in programming and coding. "
+    "You help developers by answering questions, explaining code, debugging issues, and providing guidance. "
+    "Be concise, clear, and helpful. Use code blocks when showing code examples. "
+    "If analyzing images or files, describe what you see and provide relevant insights. "
+    "Keep responses under 1500 characters when possible."
+)
+# Characters of each attached file sent along with a question
+MAX_ATTACHMENT_CHARS = int(os.environ.get("GEMINI_MAX_ATTACHMENT_CHARS", "20000"))
+
+
+def _question_content(question: str, attachments: list = None, image_data: list = None) -> types.UserContent:
+    """The user turn for a question: attached files first, then images, then the question text."""
+    content_parts = []
+    
+    # Add text files/code files first
+    if attachments:
+        for att in attachments:
+            filename = att.get('filename', 'file')
+            content = att.get('content', '')
+            content_parts.append(types.Part.from_text(
+                text=f"📎 **Attached file: {filename}**\n```\n{content[:MAX_ATTACHMENT_CHARS]}\n```"
+            ))
+    
+    # Add images
+    if image_data:
+        for img in image_data:
+            content_parts.append(
+                types.Part.from_bytes(
+                    data=img['data'],
+                    mime_type=img['mime_type']
                 )
-        
-        # Add the user's question
-        content_parts.append(question)
-        
-        # Generate response
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=content_parts,
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                temperature=0.7,
-                max_output_tokens=2000,
-            ),
+            )
+    
+    # Add the user's question
+    content_parts.append(types.Part.from_text(text=question))
+    return types.UserContent(parts=content_parts)
+
+
+def _answer_request(question: str, attachments: list = None, image_data: list = None,
+                    conversation: Conversation = None):
+    """Build the Gemini contents and config for a question, after any earlier turns of its thread.
+
+    When the conversation has a live context cache, the cached turns and the system
+    instruction are referenced by name instead of being sent again.
+    """
+    history = conversation.uncached_turns() if conversation is not None else []
+    contents = history + [_question_content(question, attachments, image_data)]
+    if conversation is not None and conversation.cache_valid():
+        config = types.GenerateContentConfig(
+            cached_content=conversation.cache_name,
+            temperature=0.7,
+            max_output_tokens=2000,
         )
-        
-        answer = (response.text or "").strip()
-        
-        if not answer:
-            return "❌ I couldn't generate a response. Please try rephrasing your question."
-        
-        # Trim if too long for Discord (2000 char limit)
-        if len(answer) > 1900:
-            answer = answer[:1897] + "..."
-        
-        return answer
-        
+    else:
+        config = types.GenerateContentConfig(
+            system_instruction=ANSWER_INSTRUCTION,
+            temperature=0.7,
+            max_output_tokens=2000,
+        )
+    return contents, config
+
+
+def _remember(conversation: Conversation, question: str, attachments: list, image_data: list, answer: str):
+    if conversation is not None:
+        _conversations.remember(conversation, _question_content(question, attachments, image_data), answer)
+
+
+async def _generate_answer(question: str, attachments: list = None, image_data: list = None, guild_id: int = None):
+    """Call Gemini for one answer; returns None when no client is configured."""
+    client = get_client()
+    if client is None:
+        return None
+    contents, config = _answer_request(question, attachments, image_data)
+    response = await generate(client, ANSWER_MODEL, contents, config, ANSWER_TIMEOUT,
+                              purpose="qa", guild_id=guild_id)
+    return (response.text or "").strip()
+
+
+# Thread history worth moving into a context cache. Gemini refuses caches under about
+# a thousand tokens, and our counts are estimates, so stay well clear of that.
+CONTEXT_CACHE_MIN_TOKENS = int(os.environ.get("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "2048"))
+CONTEXT_CACHE_TTL = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", "900"))
+
+
+async def _delete_context_cache(client, name: str):
+    try:
+        await client.aio.caches.delete(name=name)
+    except Exception as e:
+        logger.warning(f"Could not delete context cache {name}: {e}")
+
+
+def _release_context_cache(name: str):
+    """Delete a cache nothing refers to any more; Gemini expires it anyway if we can't."""
+    if _client is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    loop.create_task(_delete_context_cache(_client, name))
+
+
+_conversations = ConversationStore(
+    max_conversations=int(os.environ.get("QA_MAX_CONVERSATIONS", "200")),
+    token_budget=int(os.environ.get("QA_MEMORY_TOKENS", "16000")),
+    on_cache_released=_release_context_cache,
+)
+
+
+def conversation_for(message) -> Conversation:
+    """The conversation a question belongs to: its thread, or the answer it replies to."""
+    return _conversations.for_message(message)
+
+
+def link_messages(conversation: Conversation, messages: list):
+    """Let replies to any of these messages continue `conversation`."""
+    _conversations.link((m.id for m in messages), conversation)
+
+
+async def _prepare_context_cache(client, conversation: Conversation, guild_id: int = None):
+    """Move a long thread history into a Gemini context cache so follow-ups don't resend it.
+
+    The cache is (re)built when the turns it doesn't cover reach CONTEXT_CACHE_MIN_TOKENS,
+    which is usually the first follow-up about a large attached file. Failures only cost the
+    saving: the request goes out with the full history and caching is paused for a while.
+    """
+    if conversation.cache_name is not None and not conversation.cache_valid():
+        _conversations.release(conversation.drop_cache())
+    if conversation.uncached_tokens < CONTEXT_CACHE_MIN_TOKENS or time.monotonic() < conversation.cache_retry_at:
+        return
+
+    turns = len(conversation.turns)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    outcome = "ok"
+    try:
+        async with _semaphore:
+            cache = await asyncio.wait_for(
+                client.aio.caches.create(
+                    model=ANSWER_MODEL,
+                    config=types.CreateCachedContentConfig(
+                        contents=conversation.turns[:turns],
+                        system_instruction=ANSWER_INSTRUCTION,
+                        ttl=f"{CONTEXT_CACHE_TTL}s",
+                    ),
+                ),
+                timeout=DETECTION_TIMEOUT,
+            )
     except Exception as e:
-        logger.error(f"Failed to answer question with Gemini: {e}")
-        return f"❌ I encountered an error while processing your question: {str(e)[:100]}"
+        outcome = _outcome(e)
+        conversation.cache_retry_at = time.monotonic() + CONTEXT_CACHE_TTL
+        logger.warning(f"Could not cache conversation {conversation.key}: {e}")
+        return
+    finally:
+        usage.record(ANSWER_MODEL, "qa_cache", guild_id, outcome, loop.time() - start)
+    _conversations.release(conversation.set_cache(cache.name, turns, CONTEXT_CACHE_TTL))
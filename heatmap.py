@@ -0,0 +1,176 @@
+"""GitHub-style activity heatmap rendering (SVG and PNG) with a version-stamped render cache."""
+import logging
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+logger = logging.getLogger('LupinBot.heatmap')
+
+CELL = 11
+GAP = 3
+PAD = 4
+TOP = 16  # room for month labels in the SVG
+
+COLOR_EMPTY = (235, 237, 240)
+COLOR_LOGGED = (33, 110, 57)
+COLOR_BACKGROUND = (255, 255, 255)
+
+
+def build_day_vector(logged_dates, end: date, days: int) -> list[bool]:
+    """Return one flag per day for the `days` days ending on `end` (inclusive), oldest first."""
+    start = end - timedelta(days=days - 1)
+    logged = set()
+    for value in logged_dates:
+        d = datetime.strptime(value, "%Y-%m-%d").date() if isinstance(value, str) else value
+        if start <= d <= end:
+            logged.add((d - start).days)
+    return [i in logged for i in range(days)]
+
+
+def _grid(vector: list[bool], end: date):
+    """Lay the day vector out as week columns x weekday rows (Sunday first), like GitHub."""
+    start = end - timedelta(days=len(vector) - 1)
+    lead = (start.weekday() + 1) % 7  # days before `start` in its Sunday-first week
+    weeks = (lead + len(vector) + 6) // 7
+    cells = [[None] * weeks for _ in range(7)]
+    for i, logged in enumerate(vector):
+        slot = lead + i
+        cells[slot % 7][slot // 7] = logged
+    return start, lead, weeks, cells
+
+
+def render_svg(vector: list[bool], end: date) -> bytes:
+    start, lead, weeks, cells = _grid(vector, end)
+    width = PAD * 2 + weeks * (CELL + GAP)
+    height = TOP + PAD + 7 * (CELL + GAP)
+
+    def rgb(color):
+        return f"rgb({color[0]},{color[1]},{color[2]})"
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="sans-serif" font-size="9">',
+        f'<rect width="{width}" height="{height}" fill="{rgb(COLOR_BACKGROUND)}"/>',
+    ]
+
+    # Month labels above the first column that contains the 1st of a month
+    last_month = None
+    for week in range(weeks):
+        first_day = start + timedelta(days=week * 7 - lead)
+        month = max(first_day, start).month
+        if month != last_month:
+            last_month = month
+            x = PAD + week * (CELL + GAP)
+            parts.append(f'<text x="{x}" y="{TOP - 5}" fill="#767676">{max(first_day, start).strftime("%b")}</text>')
+
+    for row in range(7):
+        for week in range(weeks):
+            logged = cells[row][week]
+            if logged is None:
+                continue
+            x = PAD + week * (CELL + GAP)
+            y = TOP + row * (CELL + GAP)
+            color = COLOR_LOGGED if logged else COLOR_EMPTY
+            day = start + timedelta(days=week * 7 + row - lead)
+            parts.append(
+                f'<rect x="{x}" y="{y}" width="{CELL}" height="{CELL}" rx="2" fill="{rgb(color)}">'
+                f'<title>{day.isoformat()}{" ✓" if logged else ""}</title></rect>'
+            )
+    parts.append('</svg>')
+    return "".join(parts).encode('utf-8')
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def render_png(vector: list[bool], end: date) -> bytes:
+    """Encode the heatmap as an RGB PNG using only the standard library."""
+    _, _, weeks, cells = _grid(vector, end)
+    width = PAD * 2 + weeks * (CELL + GAP) - GAP
+    height = PAD * 2 + 7 * (CELL + GAP) - GAP
+    background = bytes(COLOR_BACKGROUND)
+    pad_row = b'\x00' + background * width
+
+    raw = bytearray(pad_row * PAD)
+    for row in range(7):
+        # Each weekday row is the same scanline repeated CELL times
+        line = bytearray(background * PAD)
+        for week in range(weeks):
+            logged = cells[row][week]
+            color = COLOR_BACKGROUND if logged is None else (COLOR_LOGGED if logged else COLOR_EMPTY)
+            line += bytes(color) * CELL
+            if week < weeks - 1:
+                line += background * GAP
+        line += background * PAD
+        raw += (b'\x00' + line) * CELL
+        if row < 6:
+            raw += pad_row * GAP
+    raw += pad_row * PAD
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + _png_chunk(b'IHDR', header)
+        + _png_chunk(b'IDAT', zlib.compress(bytes(raw), 9))
+        + _png_chunk(b'IEND', b'')
+    )
+
+
+class HeatmapCache:
+    """Thread-safe LRU cache of rendered heatmaps, shared by the bot and the dashboard thread.
+
+    Keys include the user's log version stamp, so new logs are picked up without invalidation.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[bytes]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value: bytes):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+heatmap_cache = HeatmapCache()
+
+
+def get_heatmap(db, user_id: int, guild_id: int, days: int = 365, fmt: str = 'png',
+                end: Optional[date] = None, version: Optional[tuple] = None) -> bytes:
+    """Return a rendered heatmap, computing the day vector with a single range query on a cache miss.
+
+    `version` is Database.get_log_version for the user; it is looked up when not supplied.
+    """
+    end = end or datetime.utcnow().date()
+    if version is None:
+        version = tuple(db.get_log_version(user_id, guild_id))
+    key = (user_id, guild_id, end.isoformat(), days, fmt, version)
+    cached = heatmap_cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = end - timedelta(days=days - 1)
+    logs = db.get_logs_since(user_id, guild_id, start.strftime("%Y-%m-%d"))
+    vector = build_day_vector((log_date for log_date, _ in logs), end, days)
+    image = render_svg(vector, end) if fmt == 'svg' else render_png(vector, end)
+    heatmap_cache.set(key, image)
+    return image
@@ -0,0 +1,101 @@
+"""Channel history over a time window, read with several concurrent cursors."""
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Union
+
+import discord
+
+logger = logging.getLogger('LupinBot.history')
+
+# Cursors per window; they share the channel's rate-limit bucket, which discord.py honours,
+# but each page is mostly round-trip latency, so a few in flight fetch several times faster
+HISTORY_PARTS = int(os.environ.get("HISTORY_PARTS", "4"))
+# Messages a cursor may read ahead of the merge (10 pages)
+HISTORY_BUFFER = int(os.environ.get("HISTORY_BUFFER", "1000"))
+# Shorter windows aren't worth splitting
+MIN_RANGE = timedelta(hours=6)
+
+_DONE = object()
+
+Bound = Union[datetime, discord.abc.Snowflake, None]
+
+
+def _snowflake(value: Union[datetime, discord.abc.Snowflake], high: bool) -> int:
+    if isinstance(value, datetime):
+        return discord.utils.time_snowflake(value, high=high)
+    return value.id
+
+
+def split_range(after_id: int, before_id: int, parts: int) -> list[tuple[int, int]]:
+    """Split the ids strictly between after_id and before_id into up to `parts` contiguous ranges.
+
+    Snowflakes start with a millisecond timestamp, so equal id spans are equal time spans.
+    Each range is returned as the (after, before) pair to pass to channel.history, both
+    exclusive; ranges after the first start one below their boundary so a message whose id
+    is exactly the boundary is read once.
+    """
+    span = before_id - after_id
+    min_span = int(MIN_RANGE.total_seconds() * 1000) << 22
+    parts = max(1, min(parts, span // min_span))
+    bounds = [after_id + span * i // parts for i in range(parts + 1)]
+    return [(bounds[i] - (1 if i else 0), bounds[i + 1]) for i in range(parts)]
+
+
+async def _read(channel, after_id: int, before_id: int, queue: asyncio.Queue):
+    try:
+        async for message in channel.history(limit=None, after=discord.Object(id=after_id),
+                                             before=discord.Object(id=before_id), oldest_first=True):
+            await queue.put(message)
+    except Exception as e:
+        await queue.put(e)
+        return
+    await queue.put(_DONE)
+
+
+async def parallel_history(channel, after: Bound = None, before: Bound = None, limit: Optional[int] = None,
+                           parts: int = HISTORY_PARTS, buffer: int = HISTORY_BUFFER) -> AsyncIterator[discord.Message]:
+    """Yield the channel's messages between `after` and `before` oldest first, like
+    channel.history(after=..., before=..., oldest_first=True).
+
+    The window (by default from the channel's creation until now) is split into snowflake
+    ranges, each read by its own cursor into a bounded buffer, and the cursors' output is
+    combined with a k-way merge on message id. A cursor's error is raised from here. Use
+    contextlib.aclosing when breaking out early so the remaining cursors are stopped promptly.
+    """
+    after_id = _snowflake(after, high=True) if after is not None else channel.id
+    before_id = _snowflake(before if before is not None else discord.utils.utcnow(), high=False)
+    if before_id <= after_id + 1:
+        return
+
+    ranges = split_range(after_id, before_id, parts)
+    queues = [asyncio.Queue(maxsize=buffer) for _ in ranges]
+    tasks = [asyncio.create_task(_read(channel, lo, hi, queue), name=f'history:{channel.id}:{n}')
+             for n, ((lo, hi), queue) in enumerate(zip(ranges, queues))]
+    heap: list = []
+
+    async def pull(n: int):
+        item = await queues[n].get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        heapq.heappush(heap, (item.id, n, item))
+
+    try:
+        for n in range(len(queues)):
+            await pull(n)
+        count = 0
+        while heap:
+            _, n, message = heapq.heappop(heap)
+            yield message
+            count += 1
+            if limit is not None and count >= limit:
+                return
+            await pull(n)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
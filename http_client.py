@@ -0,0 +1,127 @@
+"""Bot-wide aiohttp session and streaming, size-capped downloads."""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import aiohttp
+
+from cache import AttachmentCache, SingleFlight
+
+logger = logging.getLogger('LupinBot.http')
+
+# Connection pool shared by every cog; Discord's CDN is the main host
+CONNECTION_LIMIT = int(os.environ.get("HTTP_CONNECTION_LIMIT", "64"))
+CONNECTION_LIMIT_PER_HOST = int(os.environ.get("HTTP_CONNECTION_LIMIT_PER_HOST", "16"))
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=10)
+CHUNK_SIZE = 64 * 1024
+
+# Per-purpose download caps in bytes
+TEXT_PREVIEW_BYTES = 4096
+# Enough for gemini.MAX_ATTACHMENT_CHARS characters of UTF-8
+QA_FILE_BYTES = 80 * 1024
+IMAGE_BYTES = 10 * 1024 * 1024
+
+_session: Optional[aiohttp.ClientSession] = None
+
+# Downloads and verdicts per attachment id, shared by every listener that sees the message
+attachment_cache = AttachmentCache(
+    max_bytes=int(os.environ.get("ATTACHMENT_CACHE_BYTES", str(32 * 1024 * 1024))),
+    ttl=int(os.environ.get("ATTACHMENT_CACHE_TTL", "300")),
+)
+_attachment_flights = SingleFlight()
+
+
+class DownloadTooLarge(Exception):
+    """The resource is bigger than the caller's cap and a truncated copy is useless (e.g. an image)."""
+
+
+def get_session() -> aiohttp.ClientSession:
+    """The shared session, created on first use inside the running event loop."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def fetch(url: str, max_bytes: int, truncate: bool = True, size: Optional[int] = None) -> Optional[bytes]:
+    """Stream `url` into memory, reading at most `max_bytes`.
+
+    With `truncate`, the first `max_bytes` are returned and the rest of the transfer is
+    abandoned. Without it, DownloadTooLarge is raised as soon as the size is known to be
+    over the cap: from `size` (e.g. a Discord attachment's size) before connecting, from
+    Content-Length before reading, or while streaming. Returns None for non-200 responses.
+    """
+    if not truncate and size is not None and size > max_bytes:
+        raise DownloadTooLarge(f"{size} bytes exceeds the {max_bytes} byte cap")
+    async with get_session().get(url) as resp:
+        if resp.status != 200:
+            return None
+        if not truncate and resp.content_length is not None and resp.content_length > max_bytes:
+            resp.close()
+            raise DownloadTooLarge(f"{resp.content_length} bytes exceeds the {max_bytes} byte cap")
+        data = bytearray()
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            data += chunk
+            if len(data) > max_bytes and not truncate:
+                resp.close()
+                raise DownloadTooLarge(f"more than {max_bytes} bytes")
+            if len(data) >= max_bytes and truncate:
+                if not resp.content.at_eof():
+                    # Drop the connection instead of draining the rest of a large body
+                    resp.close()
+                break
+        return bytes(data[:max_bytes])
+
+
+async def fetch_attachment(attachment, max_bytes: int, truncate: bool = True) -> Optional[bytes]:
+    """fetch() for a Discord attachment, reusing an earlier download of it when that covers the request.
+
+    Listeners handling the same message (Q&A, streak detection) share downloads through
+    attachment_cache, and concurrent requests for the same attachment and cap share one transfer.
+    """
+    key = getattr(attachment, 'id', None)
+    size = getattr(attachment, 'size', None)
+    if key is None:
+        return await fetch(attachment.url, max_bytes, truncate, size)
+
+    data, complete = attachment_cache.get_data(key)
+    if data is not None:
+        if not truncate and len(data) > max_bytes:
+            raise DownloadTooLarge(f"more than {max_bytes} bytes")
+        if complete or (truncate and len(data) >= max_bytes):
+            return data[:max_bytes]
+
+    async def download():
+        data = await fetch(attachment.url, max_bytes, truncate, size)
+        if data is not None:
+            complete = not truncate or len(data) < max_bytes or (size is not None and len(data) >= size)
+            attachment_cache.set_data(key, data, complete)
+        return data
+
+    return await _attachment_flights.do((key, max_bytes, truncate), download)
+
+
+async def fetch_attachments(attachments, max_bytes: int, truncate: bool = True) -> list:
+    """Fetch several attachments concurrently.
+
+    Returns one entry per attachment in order: bytes, None (not served) or the exception raised.
+    """
+    return await asyncio.gather(
+        *(fetch_attachment(a, max_bytes, truncate) for a in attachments), return_exceptions=True
+    )
@@ -0,0 +1,131 @@
+"""Background Gemini review of backfilled images whose verdict was guessed locally."""
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Optional
+
+import gemini
+import http_client
+
+logger = logging.getLogger('LupinBot.image_review')
+
+REVIEW_QUEUE_SIZE = int(os.environ.get("IMAGE_REVIEW_QUEUE_SIZE", "5000"))
+# Reviews only run while the image model's bucket is at least this full
+REVIEW_HEADROOM = 0.5
+REVIEW_IDLE_WAIT = 5
+# Smaller images are emoji, stickers and reaction images rather than code screenshots
+MIN_CODE_IMAGE_SIDE = 120
+
+
+def _plausible(content_type: Optional[str], width: Optional[int], height: Optional[int]) -> bool:
+    if (content_type or '').startswith('image/gif'):
+        return False
+    if width and height and min(width, height) < MIN_CODE_IMAGE_SIDE:
+        return False
+    return True
+
+
+def looks_like_code(attachment) -> bool:
+    """Local guess for an image posted in a daily-code channel: code unless it's animated or tiny."""
+    return _plausible(attachment.content_type, getattr(attachment, 'width', None), getattr(attachment, 'height', None))
+
+
+def image_size(data: bytes) -> tuple[Optional[int], Optional[int]]:
+    """Width and height read from a PNG, GIF or JPEG header, or (None, None)."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+    if data[:4] == b'GIF8' and len(data) >= 10:
+        return int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:10], 'little')
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(data) and data[i] == 0xFF:
+            marker, length = data[i + 1], int.from_bytes(data[i + 2:i + 4], 'big')
+            # Start-of-frame markers carry the dimensions (C4, C8 and CC are other tables)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                return int.from_bytes(data[i + 7:i + 9], 'big'), int.from_bytes(data[i + 5:i + 7], 'big')
+            i += 2 + length
+    return None, None
+
+
+def image_looks_like_code(data: bytes, mime_type: str) -> bool:
+    """looks_like_code for downloaded image bytes, e.g. when Gemini is out of budget."""
+    if data[:4] == b'GIF8':
+        return False
+    return _plausible(mime_type, *image_size(data))
+
+
+class ImageReviewQueue:
+    """Checks guessed images with Gemini after the backfill has moved on, one log at a time.
+
+    Each item is a historical daily_logs entry that was written because its images were
+    guessed to contain code. The review runs only while Gemini has spare capacity, so live
+    messages and Q&A go first, and the log is removed if Gemini finds no code. Failed
+    downloads and Gemini fallbacks leave the log in place.
+    """
+
+    def __init__(self, db, max_pending: int = REVIEW_QUEUE_SIZE):
+        self.db = db
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.task: Optional[asyncio.Task] = None
+        self.stats = Counter()
+
+    def submit(self, guild_id: int, user_id: int, log_date: str, day_number: int, attachments: list) -> bool:
+        try:
+            self.queue.put_nowait((guild_id, user_id, log_date, day_number, list(attachments)))
+        except asyncio.QueueFull:
+            # The guess stands
+            self.stats['dropped'] += 1
+            return False
+        self.stats['queued'] += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(), name='image-review')
+        return True
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            while not gemini.has_headroom(gemini.IMAGE_MODEL, REVIEW_HEADROOM):
+                await asyncio.sleep(REVIEW_IDLE_WAIT)
+            try:
+                await self.review(*item)
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f'Image review failed for user {item[1]} on {item[2]}: {e}')
+
+    async def review(self, guild_id: int, user_id: int, log_date: str, day_number: int, attachments: list):
+        verdicts = http_client.attachment_cache
+        known = [verdicts.get_verdict(a.id, 'code') for a in attachments]
+        if any(known):
+            self.stats['confirmed'] += 1
+            return
+        pending = [a for a, verdict in zip(attachments, known) if verdict is None]
+        downloads = await http_client.fetch_attachments(pending, http_client.IMAGE_BYTES, truncate=False)
+        if any(isinstance(d, Exception) for d in downloads):
+            self.stats['unverified'] += 1
+            return
+        served = [(a, data) for a, data in zip(pending, downloads) if data is not None]
+        if served:
+            results = await gemini.classify_code_images(
+                [(data, a.content_type) for a, data in served], any_positive=True, guild_id=guild_id
+            )
+            for (attachment, _), is_code in zip(served, results):
+                verdicts.set_verdict(attachment.id, 'code', is_code)
+            if any(results):
+                self.stats['confirmed'] += 1
+                return
+        elif pending:
+            # Nothing could be downloaded to check
+            self.stats['unverified'] += 1
+            return
+
+        if self.db.remove_daily_log(user_id, guild_id, log_date, day_number):
+            self.stats['revoked'] += 1
+            logger.info(f'Removed backfilled log for user {user_id} on {log_date}: no code in its images')
+
+    def snapshot(self) -> dict:
+        return {'pending': self.queue.qsize(), **self.stats}
@@ -0,0 +1,123 @@
+"""Logging for the bot process: records are queued on the event loop and written by a background thread."""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+LOG_FILE = os.environ.get("LOG_FILE", "bot.log")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+# "text" or "json" (one object per line)
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# Each log call site may emit this many INFO/DEBUG records per window; the rest are counted and dropped
+LOG_SAMPLE_BURST = int(os.environ.get("LOG_SAMPLE_BURST", "20"))
+LOG_SAMPLE_WINDOW = int(os.environ.get("LOG_SAMPLE_WINDOW", "60"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for log shippers."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Rate-limits INFO and DEBUG records per call site; warnings and errors always pass.
+
+    Messages are f-strings, so records are grouped by where they were logged rather than by
+    text. At most `burst` records per call site pass in each `window` seconds, and the first
+    one let through afterwards notes how many were dropped.
+    """
+
+    def __init__(self, burst: int = LOG_SAMPLE_BURST, window: float = LOG_SAMPLE_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sites: dict[tuple, list] = {}
+        # Records come from the event loop and from worker threads (dashboard, executors)
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self.sites[key] = site = [now, 0, 0]
+            else:
+                suppressed = 0
+            if site[1] >= self.burst:
+                site[2] += 1
+                return False
+            site[1] += 1
+        if suppressed:
+            record.msg = f'{record.getMessage()} ({suppressed} similar messages suppressed)'
+            record.args = None
+        return True
+
+
+def setup_logging(level: int = logging.INFO, log_file: str = LOG_FILE,
+                  json_format: Optional[bool] = None) -> QueueListener:
+    """Route all logging through a queue drained by a QueueListener thread.
+
+    Loggers only enqueue records, so disk and console writes never block the event loop.
+    The file rotates at LOG_MAX_BYTES keeping LOG_BACKUP_COUNT old files. The listener is
+    stopped (flushing what's queued) at interpreter exit.
+    """
+    global _listener
+    stop_logging()
+    if json_format is None:
+        json_format = LOG_FORMAT == 'json'
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+
+    file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding='utf-8')
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(records, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def stop_logging():
+    """Write out queued records and close the log file."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -3,12 +3,19 @@ from discord.ext import commands
 import os
 from dotenv import load_dotenv
 from database import Database
+from dispatcher import MENTION, MessageDispatcher, parse_day_number
+from backfill import Backfill
+from startup import Startup, sync_commands
+from history import parallel_history
+import http_client
+import usage
+from log_config import setup_logging
 import logging
 import sys
 import threading
 from threading import Thread
 import asyncio
-import re
+from contextlib import aclosing
 from datetime import datetime, timezone, timedelta
 
 # Replit detection
@@ -18,14 +25,8 @@ if IS_REPLIT:
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Log records are queued here and written to bot.log/stdout by a background thread
+setup_logging()
 logger = logging.getLogger('LupinBot')
 
 intents = discord.Intents.default()
@@ -34,8 +35,13 @@ intents.members = True
 intents.guilds = True
 
 bot = commands.Bot(command_prefix='!', intents=intents)
+# Parses each message once and hands it to the features that want it (Q&A, streaks)
+bot.message_dispatcher = MessageDispatcher(bot)
 db = Database()
 
+# Gemini usage counters persist to the daily ledger and per-guild budgets load from it
+usage.tracker.attach(db)
+
 # Setup dashboard integration and keep-alive server for Replit
 def setup_dashboard_integration():
     """Setup dashboard integration with bot instance and optionally start server on Replit."""
@@ -119,312 +125,365 @@ def _iter_daily_code_channels(guild: discord.Guild):
         if 'daily-code' in ch.name.lower():
             yield ch
 
-async def backfill_guild_history(guild: discord.Guild):
-    """On startup: populate users from daily-code history and process missed messages since last seen/processed."""
-    # Determine window
+# Messages processed between backfill checkpoints (one transaction each)
+BACKFILL_CHECKPOINT_EVERY = int(os.environ.get("BACKFILL_CHECKPOINT_EVERY", "100"))
+
+def _last_seen(guild: discord.Guild) -> datetime:
+    """Start of the window to backfill for channels without a checkpoint: last seen, else the last 7 days."""
     last_seen_str = db.get_last_seen(guild.id)
-    last_seen_dt = None
     if last_seen_str:
         try:
-            last_seen_dt = datetime.strptime(last_seen_str, "%Y-%m-%d %H:%M:%S")
+            return datetime.strptime(last_seen_str, "%Y-%m-%d %H:%M:%S")
         except Exception:
-            last_seen_dt = None
-    # Fallback window if no state: last 7 days
-    fallback_after = datetime.utcnow() - timedelta(days=7)
+            pass
+    return datetime.utcnow() - timedelta(days=7)
+
+async def backfill_channel(guild: discord.Guild, channel: discord.TextChannel, since: datetime = None) -> int:
+    """Populate users from a daily-code channel's history and process messages missed since its checkpoint.
+
+    With `since` (a reconnect catch-up), messages older than it are skipped even if the
+    checkpoint is older: those arrived live and were handled then.
 
+    Messages are processed as they stream in. User info and historical logs are buffered and
+    written in one transaction with the channel's checkpoint every BACKFILL_CHECKPOINT_EVERY
+    messages, so an interrupted backfill resumes from the last checkpoint. Today's messages
+    update streaks right away; replaying them after a resume is harmless since a user can
+    only log once a day.
+
+    Older messages are classified without waiting on Gemini: images with no cached verdict
+    are guessed locally, and logs that relied on such a guess are queued for the Streaks
+    cog's background image review, which removes them if Gemini finds no code.
+    """
     streaks_cog = bot.get_cog('Streaks')
-    if not streaks_cog:
-        logger.warning('Streaks cog not loaded; skipping backfill')
-        return
+    processed = 0
+    last_processed_id = db.get_last_processed(guild.id, channel.id)
+    after = discord.Object(id=last_processed_id) if last_processed_id else _last_seen(guild)
+    if since is not None:
+        after = discord.Object(id=max(last_processed_id or 0, discord.utils.time_snowflake(since)))
 
-    processed_any = False
+    # Process messages oldest->newest
+    pending_day: dict[int, tuple[int, discord.Message]] = {}
+    pending_code: dict[int, discord.Message] = {}
+    last_id = last_processed_id
+    users: dict[int, tuple] = {}
+    logs: list[tuple] = []
+    # message id -> images guessed to contain code, and logs to review once written
+    guessed: dict[int, list] = {}
+    reviews: list[tuple] = []
 
-    for channel in _iter_daily_code_channels(guild):
-        try:
-            last_processed_id = db.get_last_processed(guild.id, channel.id)
-            messages = []
-            if last_processed_id:
-                after_obj = discord.Object(id=last_processed_id)
-                async for msg in channel.history(limit=None, after=after_obj, oldest_first=True):
-                    messages.append(msg)
-            else:
-                # Use last_seen_dt if available; else fallback window
-                after_dt = last_seen_dt if last_seen_dt else fallback_after
-                async for msg in channel.history(limit=None, after=after_dt, oldest_first=True):
-                    messages.append(msg)
-
-            # Process messages oldest->newest
-            pending_day: dict[int, tuple[int, discord.Message]] = {}
-            pending_code: dict[int, discord.Message] = {}
-            last_id = last_processed_id
-
-            for msg in messages:
-                # Track user info in DB for dashboard
-                try:
-                    db.upsert_user(
-                        msg.author.id,
-                        getattr(msg.author, 'name', None),
-                        getattr(msg.author, 'display_name', None),
-                        str(msg.author.display_avatar.url) if msg.author and msg.author.display_avatar else None
-                    )
-                except Exception:
-                    pass
-
-                # Extract data
-                day_match = re.search(r'#\s*day[\s-]*(\d+)', msg.content or '', re.IGNORECASE)
-                day_num = int(day_match.group(1)) if day_match else None
-                has_code = await streaks_cog.has_media_or_code(msg)
-                msg_date = msg.created_at.date()
-                today_date = datetime.utcnow().date()
-
-                if day_num is not None and has_code:
-                    # Process normally if today
+    def log_historical(code_msg: discord.Message, log_date: str, day_number: int):
+        logs.append((code_msg.author.id, log_date, day_number))
+        if code_msg.id in guessed:
+            reviews.append((guild.id, code_msg.author.id, log_date, day_number, guessed.pop(code_msg.id)))
+
+    def checkpoint():
+        db.save_backfill_batch(guild.id, channel.id, last_id, list(users.values()), logs)
+        for review in reviews:
+            streaks_cog.image_review.submit(*review)
+        users.clear()
+        logs.clear()
+        reviews.clear()
+
+    # Read with several cursors at once; messages still arrive oldest first
+    async with aclosing(parallel_history(channel, after=after)) as messages:
+        async for msg in messages:
+            # Track user info in DB for dashboard
+            try:
+                users[msg.author.id] = (
+                    msg.author.id,
+                    getattr(msg.author, 'name', None),
+                    getattr(msg.author, 'display_name', None),
+                    str(msg.author.display_avatar.url) if msg.author and msg.author.display_avatar else None
+                )
+            except Exception:
+                pass
+
+            # Extract data
+            day_num = parse_day_number(msg.content)
+            msg_date = msg.created_at.date()
+            today_date = datetime.utcnow().date()
+            deferred = [] if msg_date != today_date else None
+            has_code = await streaks_cog.has_media_or_code(msg, deferred=deferred)
+            if deferred:
+                guessed[msg.id] = deferred
+
+            if day_num is not None and has_code:
+                # Process normally if today
+                if msg_date == today_date:
+                    await streaks_cog.process_streak_message(msg, day_num)
+                else:
+                    # Record historical log without changing streak counts
+                    log_historical(msg, msg_date.strftime('%Y-%m-%d'), day_num)
+            elif day_num is not None and not has_code:
+                # Remember day for user
+                pending_day[msg.author.id] = (day_num, msg)
+                # If we already saw code for this user, pair
+                if msg.author.id in pending_code:
+                    code_msg = pending_code.pop(msg.author.id)
                     if msg_date == today_date:
-                        await streaks_cog.process_streak_message(msg, day_num)
+                        await streaks_cog.process_streak_message(code_msg, day_num)
                     else:
-                        # Record historical log without changing streak counts
-                        db.log_specific_day(msg.author.id, guild.id, msg_date.strftime('%Y-%m-%d'), day_num)
-                elif day_num is not None and not has_code:
-                    # Remember day for user
-                    pending_day[msg.author.id] = (day_num, msg)
-                    # If we already saw code for this user, pair
-                    if msg.author.id in pending_code:
-                        code_msg = pending_code.pop(msg.author.id)
-                        if msg_date == today_date:
-                            await streaks_cog.process_streak_message(code_msg, day_num)
-                        else:
-                            db.log_specific_day(code_msg.author.id, guild.id, code_msg.created_at.strftime('%Y-%m-%d'), day_num)
-                        pending_day.pop(msg.author.id, None)
-                elif has_code and day_num is None:
-                    # Remember code
-                    pending_code[msg.author.id] = msg
-                    if msg.author.id in pending_day:
-                        dn, day_msg = pending_day.pop(msg.author.id)
-                        if msg_date == today_date:
-                            await streaks_cog.process_streak_message(msg, dn)
-                        else:
-                            db.log_specific_day(msg.author.id, guild.id, msg_date.strftime('%Y-%m-%d'), dn)
-                        pending_code.pop(msg.author.id, None)
-                # update last id
-                last_id = msg.id
-                processed_any = True
-
-            if last_id:
-                db.set_last_processed(guild.id, channel.id, last_id)
-        except Exception as e:
-            logger.error(f'Backfill error in guild {guild.id} channel {channel.id}: {e}')
-            continue
+                        log_historical(code_msg, code_msg.created_at.strftime('%Y-%m-%d'), day_num)
+                    pending_day.pop(msg.author.id, None)
+            elif has_code and day_num is None:
+                # Remember code
+                pending_code[msg.author.id] = msg
+                if msg.author.id in pending_day:
+                    dn, day_msg = pending_day.pop(msg.author.id)
+                    if msg_date == today_date:
+                        await streaks_cog.process_streak_message(msg, dn)
+                    else:
+                        log_historical(msg, msg_date.strftime('%Y-%m-%d'), dn)
+                    pending_code.pop(msg.author.id, None)
+            # update last id
+            last_id = msg.id
+            processed += 1
+            if processed % BACKFILL_CHECKPOINT_EVERY == 0:
+                checkpoint()
 
-    # Update last seen
+    if processed % BACKFILL_CHECKPOINT_EVERY:
+        checkpoint()
+    return processed
+
+def finish_guild_backfill(guild: discord.Guild, processed: int):
     now_str = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
     db.set_last_seen(guild.id, now_str)
-    if processed_any:
-        logger.info(f'Backfill completed for guild {guild.name}')
+    if processed:
+        logger.info(f'Backfill completed for guild {guild.name} ({processed} messages)')
     else:
         logger.info(f'No new messages to backfill for guild {guild.name}')
 
+# Catches up on missed daily-code messages in the background after connecting
+backfill = Backfill(_iter_daily_code_channels, backfill_channel, finish_guild_backfill)
+bot.backfill = backfill
+
+# on_ready fires again whenever the gateway session can't be resumed; startup steps run once
+startup = Startup()
+bot.startup = startup
+# After such a reconnect, only the messages sent since the disconnect are read
+catch_up = Backfill(
+    _iter_daily_code_channels,
+    lambda guild, channel: backfill_channel(guild, channel, since=startup.catch_up_since),
+    finish_guild_backfill,
+)
+
+def start_backfill():
+    # Backfill every guild in the background; live messages are handled meanwhile
+    if bot.get_cog('Streaks'):
+        backfill.start(bot.guilds)
+    else:
+        logger.warning('Streaks cog not loaded; skipping backfill')
+
+def start_catch_up():
+    since = startup.take_gap()
+    if since is None or not bot.get_cog('Streaks'):
+        return
+    if backfill.running or catch_up.running:
+        # The run in progress reads up to the present, so it covers the gap too
+        logger.info('Backfill already running; no separate catch-up needed')
+        return
+    logger.info(f'Catching up on messages since {since:%Y-%m-%d %H:%M:%S} UTC')
+    catch_up.start(bot.guilds)
+
 @bot.event
 async def on_ready():
     logger.info(f'{bot.user} has connected to Discord!')
     logger.info(f'Bot is in {len(bot.guilds)} guilds')
-    
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f'Synced {len(synced)} slash commands')
-    except Exception as e:
-        logger.error(f'Failed to sync commands: {e}')
-    
-    # Setup dashboard integration and start dashboard (if Replit)
-    setup_dashboard_integration()
 
-    # Backfill for each guild
-    for guild in bot.guilds:
-        try:
-            await backfill_guild_history(guild)
-        except Exception as e:
-            logger.error(f'Failed backfill for guild {guild.id}: {e}')
-    
-    logger.info('Lupin Bot is ready!')
+    # Steps that failed on an earlier ready (e.g. the command sync) are retried here
+    reconnect = await startup.run([
+        ('commands', lambda: sync_commands(bot.tree, db)),
+        # Setup dashboard integration and start dashboard (if Replit)
+        ('dashboard', setup_dashboard_integration),
+        ('backfill', start_backfill),
+    ], catch_up=start_catch_up)
+    logger.info('Reconnected with a new gateway session' if reconnect else 'Lupin Bot is ready!')
+
+@bot.event
+async def on_disconnect():
+    startup.mark_disconnected()
+
+@bot.event
+async def on_resumed():
+    # A resumed session replays the events that were missed
+    startup.mark_resumed()
+    logger.info('Gateway session resumed')
 
 @bot.event
 async def on_guild_join(guild):
     logger.info(f'Joined new guild: {guild.name} (ID: {guild.id})')
 
-@bot.event
-async def on_message(message):
-    if message.author.bot:
-        return
+async def answer_mention(features):
+    """Answer a question addressed to the bot, or introduce the bot when it's mentioned on its own."""
+    message = features.message
+    # Extract the message content without the bot mention
+    content = message.content
+    for mention in message.mentions:
+        if mention.id == bot.user.id:
+            content = content.replace(f'<@{mention.id}>', '').replace(f'<@!{mention.id}>', '')
+    content = content.strip()
     
-    if bot.user.mentioned_in(message) and not message.mention_everyone:
-        # Extract the message content without the bot mention
-        content = message.content
-        for mention in message.mentions:
-            if mention.id == bot.user.id:
-                content = content.replace(f'<@{mention.id}>', '').replace(f'<@!{mention.id}>', '')
-        content = content.strip()
-        
-        # If there's additional content (a question/request), use AI to respond
-        if content:
-            try:
-                # Show typing indicator
-                async with message.channel.typing():
-                    import gemini
-                    import aiohttp
-                    
-                    # Process attachments
-                    attachments_data = []
-                    image_data = []
-                    
-                    for attachment in message.attachments:
-                        # Check if it's a code file
-                        code_extensions = [
-                            '.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', '.php',
-                            '.rb', '.go', '.rs', '.swift', '.kt', '.scala', '.r',
-                            '.html', '.css', '.scss', '.sass', '.less', '.xml',
-                            '.json', '.yaml', '.yml', '.toml', '.ini', '.cfg',
-                            '.sql', '.sh', '.bash', '.ps1', '.bat', '.cmd',
-                            '.md', '.txt', '.log', '.conf', '.config'
-                        ]
-                        
-                        if any(attachment.filename.lower().endswith(ext) for ext in code_extensions):
-                            # Download and read text file
-                            try:
-                                async with aiohttp.ClientSession() as session:
-                                    async with session.get(attachment.url) as resp:
-                                        if resp.status == 200:
-                                            file_content = await resp.text()
-                                            attachments_data.append({
-                                                'filename': attachment.filename,
-                                                'content': file_content,
-                                                'mime_type': attachment.content_type or 'text/plain'
-                                            })
-                            except Exception as e:
-                                logger.error(f"Failed to download attachment {attachment.filename}: {e}")
-                        
-                        # Check if it's an image
-                        elif attachment.content_type and attachment.content_type.startswith('image/'):
-                            try:
-                                async with aiohttp.ClientSession() as session:
-                                    async with session.get(attachment.url) as resp:
-                                        if resp.status == 200:
-                                            image_bytes = await resp.read()
-                                            image_data.append({
-                                                'data': image_bytes,
-                                                'mime_type': attachment.content_type
-                                            })
-                            except Exception as e:
-                                logger.error(f"Failed to download image {attachment.filename}: {e}")
-                    
-                    # Get AI response
-                    answer = await gemini.answer_question(content, attachments_data, image_data)
-                    
-                    # Send response as a reply
-                    embed = discord.Embed(
-                        title="🤖 Lupin AI Assistant",
-                        description=answer,
-                        color=discord.Color.blue()
-                    )
-                    embed.set_footer(text=f"Asked by {message.author.name}")
-                    
-                    await message.reply(embed=embed, mention_author=False)
-                    logger.info(f"Answered question from {message.author} in {message.guild.name}")
-                    return
-                    
-            except Exception as e:
-                logger.error(f"Error answering question: {e}")
-                await message.reply("❌ Sorry, I encountered an error while processing your question. Please try again!")
-                return
-        
-        # If no additional content, show introduction embed
-        embed = discord.Embed(
-            title="🦊 Hey there! I'm Lupin",
-            description="Your **AI-powered coding streak companion**! 🚀\n\nI help you build **consistent coding habits** with smart streak tracking, AI assistance, visual progress calendars, and motivational features designed specifically for developers!",
-            color=discord.Color.blue()
-        )
-        
-        # Getting Started Section
-        embed.add_field(
-            name="🎯 **How to Start Your Streak**",
-            value="""
+    # If there's additional content (a question/request), use AI to respond
+    if content:
+        import gemini
+        from answers import StreamingAnswer
+
+        # Post a placeholder right away; it is edited in place as the answer streams in
+        reply = StreamingAnswer(message)
+        try:
+            await reply.start()
+            
+            # Process attachments: code files are read up to what Gemini is sent, images whole
+            code_files = features.code_attachments
+            images = features.image_attachments
+
+            # Download everything at once
+            file_downloads, image_downloads = await asyncio.gather(
+                http_client.fetch_attachments(code_files, http_client.QA_FILE_BYTES),
+                http_client.fetch_attachments(images, http_client.IMAGE_BYTES, truncate=False),
+            )
+
+            attachments_data = []
+            for attachment, data in zip(code_files, file_downloads):
+                if isinstance(data, Exception):
+                    logger.error(f"Failed to download attachment {attachment.filename}: {data}")
+                elif data is not None:
+                    attachments_data.append({
+                        'filename': attachment.filename,
+                        'content': data.decode('utf-8', 'replace'),
+                        'mime_type': attachment.content_type or 'text/plain'
+                    })
+
+            image_data = []
+            for attachment, data in zip(images, image_downloads):
+                if isinstance(data, Exception):
+                    logger.error(f"Failed to download image {attachment.filename}: {data}")
+                elif data is not None:
+                    image_data.append({
+                        'data': data,
+                        'mime_type': attachment.content_type
+                    })
+            
+            # Stream the answer into the placeholder reply; follow-ups in a thread or
+            # replies to an earlier answer carry that conversation's history
+            conversation = gemini.conversation_for(message)
+            answer = await reply.stream(gemini.stream_answer(
+                content, attachments_data, image_data, guild_id=message.guild.id if message.guild else None,
+                conversation=conversation
+            ))
+            gemini.link_messages(conversation, [message, *reply.messages])
+            logger.info(f"Answered question from {message.author} ({len(answer)} chars, {len(reply.messages)} message(s))")
+            return
+            
+        except Exception as e:
+            logger.error(f"Error answering question: {e}")
+            error_text = "❌ Sorry, I encountered an error while processing your question. Please try again!"
+            if reply.messages:
+                await reply.messages[-1].edit(embed=discord.Embed(description=error_text, color=discord.Color.red()))
+            else:
+                await message.reply(error_text)
+            return
+    
+    # If no additional content, show introduction embed
+    embed = discord.Embed(
+        title="🦊 Hey there! I'm Lupin",
+        description="Your **AI-powered coding streak companion**! 🚀\n\nI help you build **consistent coding habits** with smart streak tracking, AI assistance, visual progress calendars, and motivational features designed specifically for developers!",
+        color=discord.Color.blue()
+    )
+    
+    # Getting Started Section
+    embed.add_field(
+        name="🎯 **How to Start Your Streak**",
+        value="""
 1. Share **any code** in #daily-code (no #DAY needed!)
 2. Upload code files, screenshots, or snippets
 3. I'll **auto-detect and track** your streak
 4. Use `#DAY-n` optionally for reference
 """,
-            inline=False
-        )
-        
-        # AI Q&A Feature
-        embed.add_field(
-            name="🤖 **AI Q&A Assistant** (NEW!)",
-            value="💬 **Tag me with questions**: `@Lupin explain recursion`\n📁 **Analyze files**: Upload `.py`, `.js`, `.java` + ask\n🖼️ **Read screenshots**: Share error images for help\n✨ **Multi-file support**: Compare implementations\n🔍 **Debug help**: Get instant coding assistance",
-            inline=False
-        )
-        
-        # Visual Progress Features
-        embed.add_field(
-            name="📅 **Visual Progress Tracking**",
-            value="`/streak_calendar` - Visual 30-day calendar (✅/⚫)\n`/use_freeze` - Protect streak when you miss\n❄️ **Auto-freeze**: Automatically uses freezes\n🎯 **Simplified**: Just code daily, no #DAY tags!",
-            inline=True
-        )
-        
-        # Core Tracking
-        embed.add_field(
-            name="🔥 **Streak Tracking**",
-            value="`/mystats` - Progress & achievements\n`/leaderboard` - Server rankings\n`/streaks_history` - Last 30 days\n`/serverstats` - Server-wide stats\n🏆 **5 Badge Levels**: Beginner → Legend",
-            inline=True
-        )
-        
-        # Protection & Rewards
-        embed.add_field(
-            name="🛡️ **Streak Protection**",
-            value="`/restore` - Restore lost streaks (admin)\n⏰ **Daily reminders**: Stay motivated\n📊 **Weekly summaries**: Top performers\n🧊 **2-day grace period**: Built-in buffer",
-            inline=True
-        )
-        
-        # Fun Commands
-        embed.add_field(
-            name="🎮 **Fun & Motivation**",
-            value="`/challenge` - Random coding challenges\n`/meme` - Programming memes\n`/quote` - Inspirational quotes\n`/joke` - Developer jokes\n🎯 **Stay motivated** with daily content!",
-            inline=True
-        )
-        
-        # Smart Detection
-        embed.add_field(
-            name="✨ **Smart Code Detection**",
-            value="📝 **Text**: Detects code blocks automatically\n📁 **Files**: Supports 20+ languages\n🖼️ **Images**: OCR for code screenshots\n🔍 **Flexible**: Works in any format!",
-            inline=True
-        )
-        
-        # Achievement System
-        embed.add_field(
-            name="🏆 **Achievement Badges**",
-            value="🔰 **Beginner** (1-6 days)\n🌟 **Rising Star** (7-29 days)\n⭐ **Champion** (30-99 days)\n💎 **Master** (100-364 days)\n🏆 **Legend** (365+ days)",
-            inline=True
-        )
-        
-        # Quick Pro Tips
-        embed.add_field(
-            name="💡 **Pro Tips**",
-            value="• **Ask anything**: `@Lupin how do I use async in Python?`\n• **Upload files**: Get code reviews and explanations\n• **Screenshot errors**: I can read and debug them\n• **No tags needed**: Just share code daily!\n• **Use `/help`**: See all commands and features",
-            inline=False
-        )
-        
-        embed.set_footer(
-            text="Ready to start? Share code or ask a question! 💻 | Web Dashboard available • Use /help for full guide"
-        )
-        embed.timestamp = discord.utils.utcnow()
-        
-        # Add author with branding
-        embed.set_author(
-            name="Lupin Bot - Your AI Coding Companion",
-            icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png"
-        )
-        
-        await message.channel.send(embed=embed)
+        inline=False
+    )
+    
+    # AI Q&A Feature
+    embed.add_field(
+        name="🤖 **AI Q&A Assistant** (NEW!)",
+        value="💬 **Tag me with questions**: `@Lupin explain recursion`\n📁 **Analyze files**: Upload `.py`, `.js`, `.java` + ask\n🖼️ **Read screenshots**: Share error images for help\n✨ **Multi-file support**: Compare implementations\n🔍 **Debug help**: Get instant coding assistance",
+        inline=False
+    )
+    
+    # Visual Progress Features
+    embed.add_field(
+        name="📅 **Visual Progress Tracking**",
+        value="`/streak_calendar` - Year activity heatmap\n`/use_freeze` - Protect streak when you miss\n❄️ **Auto-freeze**: Automatically uses freezes\n🎯 **Simplified**: Just code daily, no #DAY tags!",
+        inline=True
+    )
+    
+    # Core Tracking
+    embed.add_field(
+        name="🔥 **Streak Tracking**",
+        value="`/mystats` - Progress & achievements\n`/leaderboard` - Server rankings\n`/streaks_history` - 30/90/365 days\n`/serverstats` - Server-wide stats\n🏆 **5 Badge Levels**: Beginner → Legend",
+        inline=True
+    )
+    
+    # Protection & Rewards
+    embed.add_field(
+        name="🛡️ **Streak Protection**",
+        value="`/restore` - Restore lost streaks (admin)\n⏰ **Daily reminders**: Stay motivated\n📊 **Weekly summaries**: Top performers\n🧊 **2-day grace period**: Built-in buffer",
+        inline=True
+    )
+    
+    # Fun Commands
+    embed.add_field(
+        name="🎮 **Fun & Motivation**",
+        value="`/challenge` - Random coding challenges\n`/meme` - Programming memes\n`/quote` - Inspirational quotes\n`/joke` - Developer jokes\n🎯 **Stay motivated** with daily content!",
+        inline=True
+    )
+    
+    # Smart Detection
+    embed.add_field(
+        name="✨ **Smart Code Detection**",
+        value="📝 **Text**: Detects code blocks automatically\n📁 **Files**: Supports 20+ languages\n🖼️ **Images**: OCR for code screenshots\n🔍 **Flexible**: Works in any format!",
+        inline=True
+    )
+    
+    # Achievement System
+    embed.add_field(
+        name="🏆 **Achievement Badges**",
+        value="🔰 **Beginner** (1-6 days)\n🌟 **Rising Star** (7-29 days)\n⭐ **Champion** (30-99 days)\n💎 **Master** (100-364 days)\n🏆 **Legend** (365+ days)",
+        inline=True
+    )
+    
+    # Quick Pro Tips
+    embed.add_field(
+        name="💡 **Pro Tips**",
+        value="• **Ask anything**: `@Lupin how do I use async in Python?`\n• **Upload files**: Get code reviews and explanations\n• **Screenshot errors**: I can read and debug them\n• **No tags needed**: Just share code daily!\n• **Use `/help`**: See all commands and features",
+        inline=False
+    )
+    
+    embed.set_footer(
+        text="Ready to start? Share code or ask a question! 💻 | Web Dashboard available • Use /help for full guide"
+    )
+    embed.timestamp = discord.utils.utcnow()
+    
+    # Add author with branding
+    embed.set_author(
+        name="Lupin Bot - Your AI Coding Companion",
+        icon_url="https://cdn.discordapp.com/emojis/1234567890123456789.png"
+    )
+    
+    await message.channel.send(embed=embed)
+    return
+
+bot.message_dispatcher.subscribe('qa', {MENTION}, answer_mention)
+
+@bot.event
+async def on_message(message):
+    if message.author.bot:
         return
     
-    await bot.process_commands(message)
+    features = bot.message_dispatcher.dispatch(message)
+    # Mentions are handled by answer_mention rather than as prefix commands
+    if not features.mentions_bot:
+        await bot.process_commands(message)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -455,7 +514,14 @@ async def main():
         if not token:
             logger.error('DISCORD_TOKEN not found in environment variables')
             return
-        await bot.start(token)
+        try:
+            await bot.start(token)
+        finally:
+            await backfill.cancel()
+            await catch_up.cancel()
+            # Budgets are reloaded from the ledger at startup, so don't lose the buffered rows
+            await usage.tracker.close()
+            await http_client.close_session()
 
 if __name__ == '__main__':
     # The setup_dashboard_integration function is called in on_ready,
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini REST API, for tests, benchmarks and offline development.
+
+Implements the endpoints the bot reaches through google-genai:
+  POST   /v1beta/models/<model>:generateContent
+  POST   /v1beta/models/<model>:streamGenerateContent?alt=sse
+  POST   /v1beta/cachedContents
+  DELETE /v1beta/cachedContents/<id>
+
+Structured requests get a response built from their response schema: booleans come up
+true with probability `code_rate`, numbers are 0.9, and an array whose items carry an
+`index` gets one item per attached image. Plain requests get `answer`. Responses can be
+delayed by a latency distribution, and errors and per-minute quota exhaustion injected.
+
+Point the bot at it with GEMINI_BASE_URL=http://127.0.0.1:<port> (any GEMINI_API_KEY works).
+
+Usage: python mock_gemini.py [--port 8089] [--latency lognormal:0.4,0.5] [--error-rate 0.02] [--rpm 60]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+from aiohttp import web
+
+DEFAULT_ANSWER = (
+    "A dictionary maps keys to values with average O(1) lookups. Use it when you need to find "
+    "items by a key instead of by position:\n```python\nages = {'ada': 36}\nprint(ages['ada'])\n```"
+)
+
+
+class Latency:
+    """Response delay in seconds drawn from a spec.
+
+    Specs: 'fixed:0.2', 'uniform:0.1,0.5', 'normal:mean,stddev' or 'lognormal:median,sigma'.
+    Samples are never negative.
+    """
+
+    KINDS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+
+    def __init__(self, spec: str = 'fixed:0', rng: random.Random = None):
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        self.args = [float(a) for a in args.split(',')] if args else []
+        if kind not in self.KINDS or len(self.args) != self.KINDS[kind]:
+            raise ValueError(f"invalid latency spec {spec!r}")
+        self.rng = rng or random.Random()
+        self.spec = spec
+
+    def sample(self) -> float:
+        if self.kind == 'fixed':
+            return self.args[0]
+        if self.kind == 'uniform':
+            return self.rng.uniform(*self.args)
+        if self.kind == 'normal':
+            return max(0.0, self.rng.gauss(*self.args))
+        median, sigma = self.args
+        return self.rng.lognormvariate(0, sigma) * median
+
+
+def _error(status: int, message: str, code: str) -> web.Response:
+    return web.json_response({'error': {'code': status, 'message': message, 'status': code}}, status=status)
+
+
+class MockGemini:
+    """The stand-in server. `stats` counts requests by endpoint and injected failures."""
+
+    def __init__(self, latency: str = 'fixed:0.05', error_rate: float = 0.0, rpm: int = 0,
+                 code_rate: float = 0.5, answer: str = DEFAULT_ANSWER, canned: dict = None,
+                 stream_chunks: int = 8, seed: Optional[int] = None):
+        self.rng = random.Random(seed)
+        self.latency = Latency(latency, self.rng)
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.code_rate = code_rate
+        self.answer = answer
+        # Fixed responses by response schema title, e.g. {'CodeDetectionResult': {...}}
+        self.canned = canned or {}
+        self.stream_chunks = stream_chunks
+        self.stats = Counter()
+        self.caches: dict[str, int] = {}  # name -> token count
+        self.recent = deque()
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url: Optional[str] = None
+        self.thread: Optional[threading.Thread] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/{version}/models/{model}:generateContent', self.handle_generate)
+        app.router.add_post('/{version}/models/{model}:streamGenerateContent', self.handle_stream)
+        app.router.add_post('/{version}/cachedContents', self.handle_cache_create)
+        app.router.add_delete('/{version}/cachedContents/{id}', self.handle_cache_delete)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{port}'
+        return self.base_url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def start_in_thread(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve from a separate event loop, so load on the server doesn't show up as client loop lag."""
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start(host, port))
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.stop())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name='mock-gemini', daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop_thread(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    def _inject(self) -> Optional[web.Response]:
+        """Quota and error injection, applied before any work is done."""
+        now = time.monotonic()
+        if self.rpm:
+            while self.recent and now - self.recent[0] >= 60:
+                self.recent.popleft()
+            if len(self.recent) >= self.rpm:
+                self.stats['quota_exceeded'] += 1
+                return _error(429, "Resource has been exhausted (e.g. check quota).", 'RESOURCE_EXHAUSTED')
+            self.recent.append(now)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return _error(500, "An internal error has occurred.", 'INTERNAL')
+        return None
+
+    def _fake(self, schema: dict, images: int, index: int = 1):
+        kind = schema.get('type', 'STRING').upper()
+        if kind == 'OBJECT':
+            return {
+                name: index if name == 'index' else self._fake(prop, images, index)
+                for name, prop in schema.get('properties', {}).items()
+            }
+        if kind == 'ARRAY':
+            items = schema.get('items', {})
+            count = images if 'index' in items.get('properties', {}) else 1
+            return [self._fake(items, images, i) for i in range(1, max(count, 1) + 1)]
+        if kind == 'BOOLEAN':
+            return self.rng.random() < self.code_rate
+        if kind in ('NUMBER', 'INTEGER'):
+            return 0.9 if kind == 'NUMBER' else 1
+        return 'lorem ipsum'
+
+    def _respond_text(self, body: dict) -> str:
+        config = body.get('generationConfig', {})
+        schema = config.get('responseSchema')
+        if schema is None:
+            return self.answer
+        if schema.get('title') in self.canned:
+            return json.dumps(self.canned[schema['title']])
+        images = sum(
+            1 for content in body.get('contents', []) for part in content.get('parts', []) if 'inlineData' in part
+        )
+        return json.dumps(self._fake(schema, images))
+
+    def _usage(self, body: dict, raw: bytes, text: str) -> dict:
+        cached = self.caches.get(body.get('cachedContent'), 0)
+        usage = {
+            'promptTokenCount': len(raw) // 4 + cached,
+            'candidatesTokenCount': len(text) // 4 + 1,
+        }
+        if cached:
+            usage['cachedContentTokenCount'] = cached
+        return usage
+
+    async def _read(self, request):
+        raw = await request.read()
+        body = json.loads(raw or b'{}')
+        cache = body.get('cachedContent')
+        if cache is not None and cache not in self.caches:
+            return raw, body, _error(404, f"CachedContent not found: {cache}", 'NOT_FOUND')
+        return raw, body, None
+
+    async def handle_generate(self, request):
+        self.stats['generate'] += 1
+        failure = self._inject()
+        if failure is not None:
+            return failure
+        raw, body, failure = await self._read(request)
+        if failure is not None:
+            return failure
+        await asyncio.sleep(self.latency.sample())
+        text = self._respond_text(body)
+        return web.json_response({
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}],
+            'usageMetadata': self._usage(body, raw, text),
+            'modelVersion': request.match_info['model'],
+        })
+
+    async def handle_stream(self, request):
+        """The sampled latency is split between time to first chunk and the chunks that follow."""
+        self.stats['stream'] += 1
+        failure = self._inject()
+        if failure is not None:
+            return failure
+        raw, body, failure = await self._read(request)
+        if failure is not None:
+            return failure
+        delay = self.latency.sample()
+        text = self._respond_text(body)
+        size = max(1, -(-len(text) // self.stream_chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+        await asyncio.sleep(delay / 2)
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        for number, piece in enumerate(pieces, start=1):
+            chunk = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': piece}]}}]}
+            if number == len(pieces):
+                chunk['candidates'][0]['finishReason'] = 'STOP'
+                chunk['usageMetadata'] = self._usage(body, raw, text)
+            await response.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+            if number < len(pieces):
+                await asyncio.sleep(delay / 2 / (len(pieces) - 1))
+        await response.write_eof()
+        return response
+
+    async def handle_cache_create(self, request):
+        self.stats['cache_create'] += 1
+        failure = self._inject()
+        if failure is not None:
+            return failure
+        raw = await request.read()
+        body = json.loads(raw)
+        name = f"cachedContents/mock-{self.stats['cache_create']}"
+        self.caches[name] = len(raw) // 4
+        return web.json_response({
+            'name': name,
+            'model': body.get('model'),
+            'usageMetadata': {'totalTokenCount': self.caches[name]},
+        })
+
+    async def handle_cache_delete(self, request):
+        self.stats['cache_delete'] += 1
+        self.caches.pop(f"cachedContents/{request.match_info['id']}", None)
+        return web.json_response({})
+
+
+async def _serve(args):
+    mock = MockGemini(latency=args.latency, error_rate=args.error_rate, rpm=args.rpm,
+                      code_rate=args.code_rate, seed=args.seed)
+    base_url = await mock.start(args.host, args.port)
+    print(f"Mock Gemini listening on {base_url} (latency {args.latency}, errors {args.error_rate:.0%}, "
+          f"rpm {args.rpm or 'unlimited'})")
+    print(f"Run the bot with GEMINI_BASE_URL={base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mock.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', default='lognormal:0.4,0.5', help="fixed:S | uniform:A,B | normal:M,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--rpm', type=int, default=0, help='Requests per minute before 429s (0 = unlimited)')
+    parser.add_argument('--code-rate', type=float, default=0.5, help='Probability a structured boolean comes back true')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,119 @@
+"""Token bucket rate limiter and circuit breaker for outbound API calls."""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger('LupinBot.ratelimit')
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a token does not become available within the allowed wait."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `capacity`.
+
+    A caller that has to wait reserves its token up front, taking the balance below zero, so
+    each later caller's wait includes everyone queued ahead of it.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, max_wait: float = 10.0):
+        """Take one token, sleeping until it is due; raise RateLimitExceeded if that is past max_wait."""
+        # No await before the reservation, so concurrent callers can't interleave here
+        self._refill()
+        wait = max(0.0, 1 - self.tokens) / self.rate
+        if wait > max_wait:
+            raise RateLimitExceeded(f'next token in {wait:.1f}s')
+        self.tokens -= 1
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.tokens += 1
+                raise
+
+    def snapshot(self) -> dict:
+        self._refill()
+        return {'tokens': round(max(self.tokens, 0.0), 2), 'capacity': self.capacity, 'rate_per_sec': self.rate}
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures -> half-open after `reset_timeout`.
+
+    While open every call is rejected immediately. Half-open lets a single probe through;
+    its success closes the breaker and its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                logger.info(f'Circuit {self.name} half-open, probing')
+            else:
+                self.rejected += 1
+                return False
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                self.rejected += 1
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f'Circuit {self.name} closed')
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f'Circuit {self.name} opened after {self.failures} consecutive failures')
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Forget an in-flight probe that ended without a verdict (e.g. cancelled)."""
+        self.probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'rejected': self.rejected,
+            'times_opened': self.times_opened,
+        }
@@ -0,0 +1,125 @@
+"""Reminder fan-out: chunked channel mentions and opt-in DM reminders."""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Iterable, List, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger('LupinBot.reminders')
+
+# Discord rejects message content longer than this
+MESSAGE_LIMIT = 2000
+
+
+def build_reminder_embed(guild_name: Optional[str] = None) -> discord.Embed:
+    """Build the daily reminder embed (DM reminders name the server they belong to)."""
+    description = "Time to continue your streak! Don't forget to post your progress today."
+    if guild_name:
+        description += f"\n\nServer: **{guild_name}**"
+    return discord.Embed(
+        title="🔥 Daily Coding Reminder!",
+        description=description,
+        color=discord.Color.orange()
+    )
+
+
+def chunk_mentions(user_ids: Iterable[int], limit: int = MESSAGE_LIMIT) -> List[Tuple[str, int]]:
+    """Split user mentions into space-separated messages that each fit within limit.
+
+    Returns a list of (content, mention_count) tuples.
+    """
+    chunks: List[Tuple[str, int]] = []
+    current: List[str] = []
+    length = 0
+    for user_id in user_ids:
+        mention = f'<@{user_id}>'
+        added = len(mention) + (1 if current else 0)
+        if current and length + added > limit:
+            chunks.append((" ".join(current), len(current)))
+            current, length = [], 0
+            added = len(mention)
+        current.append(mention)
+        length += added
+    if current:
+        chunks.append((" ".join(current), len(current)))
+    return chunks
+
+
+class ReminderFanout:
+    """Delivers reminders for rows from Database.get_due_reminder_recipients."""
+
+    def __init__(self, bot, dm_concurrency: int = 5, dm_interval: float = 0.25):
+        """
+        Initialize the fan-out engine.
+
+        discord.py already waits out 429 responses itself; the semaphore and interval keep
+        DM bursts small enough that those waits stay rare.
+
+        Args:
+            bot: Discord bot instance
+            dm_concurrency: Maximum number of DMs in flight at once
+            dm_interval: Pause in seconds after each DM, spreading DMs out under Discord's rate limits
+        """
+        self.bot = bot
+        self.dm_semaphore = asyncio.Semaphore(dm_concurrency)
+        self.dm_interval = dm_interval
+
+    async def _send_channel(self, guild_id: int, channel_id: int, user_ids: List[int], report: dict):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            logger.warning(f"Reminder channel {channel_id} not found for guild {guild_id}")
+            report['failed'] += len(user_ids)
+            return
+
+        embed = build_reminder_embed()
+        for idx, (content, count) in enumerate(chunk_mentions(user_ids)):
+            try:
+                # Only the first message carries the embed; the rest are mention overflow
+                if idx == 0:
+                    await channel.send(content, embed=embed)
+                else:
+                    await channel.send(content)
+                report['delivered'] += count
+            except Exception as e:
+                logger.error(f"Failed to send reminder chunk in guild {guild_id}: {e}")
+                report['failed'] += count
+
+    async def _send_dm(self, guild_id: int, user_id: int, report: dict):
+        async with self.dm_semaphore:
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                guild = self.bot.get_guild(guild_id)
+                embed = build_reminder_embed(guild.name if guild else None)
+                await user.send(embed=embed)
+                report['delivered'] += 1
+            except discord.Forbidden:
+                # User has DMs closed for this bot
+                logger.debug(f"Cannot DM reminder to user {user_id}")
+                report['failed'] += 1
+            except Exception as e:
+                logger.error(f"Failed to DM reminder to user {user_id}: {e}")
+                report['failed'] += 1
+            await asyncio.sleep(self.dm_interval)
+
+    async def run(self, recipients: List[Tuple]) -> dict:
+        """Deliver all due reminders and return delivered/failed/skipped counts."""
+        report = {'delivered': 0, 'failed': 0, 'skipped': 0}
+        channel_targets: dict[Tuple[int, int], List[int]] = defaultdict(list)
+        dm_targets: List[Tuple[int, int]] = []
+
+        for guild_id, channel_id, user_id, delivery, opt_out in recipients:
+            if delivery == 'dm':
+                dm_targets.append((guild_id, user_id))
+            elif opt_out:
+                report['skipped'] += 1
+            else:
+                channel_targets[(guild_id, channel_id)].append(user_id)
+
+        tasks = [
+            self._send_channel(guild_id, channel_id, user_ids, report)
+            for (guild_id, channel_id), user_ids in channel_targets.items()
+        ]
+        tasks.extend(self._send_dm(guild_id, user_id, report) for guild_id, user_id in dm_targets)
+        await asyncio.gather(*tasks)
+        return report
@@ -0,0 +1,115 @@
+"""One-time startup steps, and the catch-up to run when the gateway session is re-established."""
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+logger = logging.getLogger('LupinBot.startup')
+
+COMMAND_HASH_KEY = 'command_tree_hash'
+# Messages sent shortly before the disconnect was noticed may not have reached us either
+CATCH_UP_MARGIN = timedelta(minutes=2)
+
+
+def command_tree_hash(tree) -> str:
+    """Digest of the global command tree as it would be sent to Discord."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()),
+                     key=lambda command: (command.get('type', 1), command['name']))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def sync_commands(tree, db) -> Optional[int]:
+    """Sync the global command tree only if it changed since the last sync.
+
+    Returns the number of commands synced, or None when the stored hash matched.
+    """
+    digest = command_tree_hash(tree)
+    if db.get_bot_setting(COMMAND_HASH_KEY) == digest:
+        logger.info('Slash commands unchanged since the last sync, not syncing')
+        return None
+    synced = await tree.sync()
+    db.set_bot_setting(COMMAND_HASH_KEY, digest)
+    logger.info(f'Synced {len(synced)} slash commands')
+    return len(synced)
+
+
+class Startup:
+    """Startup state shared by every on_ready, which discord.py fires again after a reconnect
+    that couldn't resume the session.
+
+    The first on_ready moves pending -> starting -> ready. Every on_ready passes the startup
+    steps to run(), which runs those not yet completed: a step completes at most once per
+    process, and one that raises is retried on the next on_ready. On top of that, an on_ready
+    after the first only needs to catch up on what was missed since the disconnect recorded by
+    mark_disconnected (a resumed session replays missed events itself).
+    """
+
+    PENDING = 'pending'
+    STARTING = 'starting'
+    READY = 'ready'
+
+    def __init__(self):
+        self.state = self.PENDING
+        self.done: set[str] = set()
+        self.lock = asyncio.Lock()
+        self.ready_events = 0
+        self.disconnected_at: Optional[datetime] = None
+        # Start of the window the latest catch-up covers
+        self.catch_up_since: Optional[datetime] = None
+
+    async def once(self, step: str, fn) -> bool:
+        """Run `fn` (sync or async) unless `step` already completed; return whether it ran."""
+        if step in self.done:
+            return False
+        result = fn()
+        if inspect.isawaitable(result):
+            await result
+        self.done.add(step)
+        return True
+
+    async def run(self, steps: list[tuple], catch_up=None) -> bool:
+        """Handle an on_ready: run the pending (name, fn) steps, then `catch_up` if this is a
+        reconnect. A failing step is logged and left pending. Returns whether this was a reconnect."""
+        async with self.lock:
+            self.ready_events += 1
+            reconnect = self.state == self.READY
+            if not reconnect:
+                self.state = self.STARTING
+                # The startup steps cover any disconnect before the first ready
+                self.mark_resumed()
+            for name, fn in steps:
+                try:
+                    await self.once(name, fn)
+                except Exception as e:
+                    logger.error(f'Startup step {name} failed, retrying on the next ready: {e}')
+            if reconnect and catch_up is not None:
+                catch_up()
+            self.state = self.READY
+            return reconnect
+
+    def mark_disconnected(self):
+        # Keep the earliest disconnect until a catch-up has covered it
+        if self.disconnected_at is None:
+            self.disconnected_at = datetime.now(timezone.utc)
+
+    def mark_resumed(self):
+        self.disconnected_at = None
+
+    def take_gap(self) -> Optional[datetime]:
+        """Start of the window a catch-up has to cover, if a disconnect was recorded, clearing it."""
+        since, self.disconnected_at = self.disconnected_at, None
+        if since is None:
+            return None
+        self.catch_up_since = since - CATCH_UP_MARGIN
+        return self.catch_up_since
+
+    def snapshot(self) -> dict:
+        return {
+            'state': self.state,
+            'steps_done': sorted(self.done),
+            'ready_events': self.ready_events,
+            'disconnected_at': self.disconnected_at.isoformat() if self.disconnected_at else None,
+        }
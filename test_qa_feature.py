@@ -10,6 +10,7 @@ import os
 
 # Add parent directory to path
 sys.path.insert(0, '/app')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 async def test_qa_feature():
     """Test the Q&A feature with sample questions."""
@@ -17,15 +18,18 @@ async def test_qa_feature():
     print("TESTING LUPIN AI Q&A FEATURE")
     print("=" * 60)
     
-    # Check if GEMINI_API_KEY is set
+    # Check if GEMINI_API_KEY is set; without one, run against the local stand-in
     api_key = os.environ.get('GEMINI_API_KEY')
     if not api_key:
-        print("\n❌ GEMINI_API_KEY not found in environment")
-        print("   This feature requires a valid Gemini API key")
-        print("   Set it in .env file: GEMINI_API_KEY=your_key_here")
-        return False
-    
-    print(f"\n✅ GEMINI_API_KEY found (starts with: {api_key[:10]}...)")
+        from mock_gemini import MockGemini
+        base_url = MockGemini().start_in_thread()
+        os.environ['GEMINI_API_KEY'] = 'mock'
+        os.environ['GEMINI_BASE_URL'] = base_url
+        print("\n⚠️ GEMINI_API_KEY not found in environment")
+        print(f"   Using the local Gemini stand-in at {base_url} (mock_gemini.py)")
+        print("   Set GEMINI_API_KEY=your_key_here in .env to test against the real API")
+    else:
+        print(f"\n✅ GEMINI_API_KEY found (starts with: {api_key[:10]}...)")
     
     # Test imports
     print("\n1. Testing imports...")
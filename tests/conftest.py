@@ -0,0 +1,10 @@
+"""Fixtures shared across the test suite."""
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh Database in a temporary file."""
+    return Database(str(tmp_path / 'test.db'))
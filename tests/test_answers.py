@@ -0,0 +1,118 @@
+"""Streaming answer replies: page splitting and throttled edits."""
+import asyncio
+from types import SimpleNamespace
+
+from answers import CURSOR, StreamingAnswer, split_page
+
+
+class FakeSent:
+    def __init__(self, log, embed):
+        self.log = log
+        self.embeds = [embed]
+
+    async def edit(self, embed):
+        self.log.append('edit')
+        self.embeds.append(embed)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.log = []
+        self.sent = []
+        self.author = SimpleNamespace(name='ada')
+        self.channel = SimpleNamespace(send=self._send)
+
+    async def reply(self, embed, mention_author):
+        return await self._send(embed=embed)
+
+    async def _send(self, embed):
+        self.log.append('send')
+        sent = FakeSent(self.log, embed)
+        self.sent.append(sent)
+        return sent
+
+
+async def _chunks(parts, delay=0.0):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+
+def test_split_prefers_line_breaks():
+    text = 'a' * 60 + '\n' + 'b' * 60
+
+    page, rest = split_page(text, limit=100)
+
+    assert page == 'a' * 60
+    assert rest == 'b' * 60
+
+
+def test_split_closes_and_reopens_code_fence():
+    text = 'intro\n```py\n' + 'x = 1\n' * 30
+
+    page, rest = split_page(text, limit=100)
+
+    assert page.endswith('\n```') and page.count('```') == 2
+    assert rest.startswith('```\n')
+
+
+def test_edits_are_throttled_and_final_text_is_complete():
+    message = FakeMessage()
+    reply = StreamingAnswer(message, edit_interval=60)
+
+    answer = asyncio.run(reply.stream(_chunks(['Hel', 'lo', ' world'])))
+
+    assert answer == 'Hello world'
+    # Placeholder, first chunk shown immediately, then only the final edit
+    assert message.log == ['send', 'edit', 'edit']
+    final = message.sent[0].embeds[-1]
+    assert final.description == 'Hello world' and not final.description.endswith(CURSOR)
+    assert final.footer.text == 'Asked by ada'
+
+
+def test_long_answer_continues_in_follow_up_messages():
+    message = FakeMessage()
+    reply = StreamingAnswer(message, edit_interval=0, page_limit=300)
+
+    answer = asyncio.run(reply.stream(_chunks(['word ' * 5] * 25)))
+
+    assert len(message.sent) == 3
+    pages = [sent.embeds[-1].description for sent in message.sent]
+    assert all(len(page) <= 300 for page in pages)
+    assert ''.join(pages) == answer == 'word ' * 125
+    assert message.sent[-1].embeds[-1].footer.text == 'Asked by ada'
+    assert message.sent[0].embeds[-1].footer.text is None
+
+
+def test_empty_stream_shows_fallback():
+    message = FakeMessage()
+
+    asyncio.run(StreamingAnswer(message).stream(_chunks([])))
+
+    assert message.sent[0].embeds[-1].description.startswith('❌')
+
+
+def test_split_at_the_end_of_the_text_adds_no_page():
+    message = FakeMessage()
+    reply = StreamingAnswer(message, edit_interval=0, page_limit=100)
+    text = 'a' * 60 + '\n' + 'b' * 35
+
+    answer = asyncio.run(reply.stream(_chunks([text, '\n' * 5])))
+
+    assert len(message.sent) == 1
+    final = message.sent[0].embeds[-1]
+    assert final.description.rstrip('\n') == text
+    assert final.footer.text == 'Asked by ada'
+    assert answer.rstrip('\n') == text
+
+
+def test_held_whitespace_is_kept_when_more_text_follows():
+    message = FakeMessage()
+    reply = StreamingAnswer(message, edit_interval=0, page_limit=100)
+
+    answer = asyncio.run(reply.stream(_chunks(['a' * 60 + '\n' + 'b' * 35, '\n' * 5, 'c' * 10])))
+
+    assert len(message.sent) == 2
+    assert message.sent[1].embeds[-1].description == 'c' * 10
+    assert not any(sent.embeds[-1].description.startswith('❌') for sent in message.sent)
+    assert answer.replace('\n', '') == 'a' * 60 + 'b' * 35 + 'c' * 10
@@ -0,0 +1,94 @@
+"""Bounded, cancellable multi-guild backfill."""
+import asyncio
+from types import SimpleNamespace
+
+from backfill import Backfill
+
+
+def _guilds(count, channels):
+    return [SimpleNamespace(id=g, channels=[SimpleNamespace(id=g * 100 + c) for c in range(channels)])
+            for g in range(count)]
+
+
+def test_parallelism_is_bounded_across_guilds_and_channels():
+    active = {'guilds': set(), 'channels': 0}
+    peaks = {'guilds': 0, 'channels': 0}
+    finished = {}
+
+    async def backfill_channel(guild, channel):
+        active['guilds'].add(guild.id)
+        active['channels'] += 1
+        peaks['guilds'] = max(peaks['guilds'], len(active['guilds']))
+        peaks['channels'] = max(peaks['channels'], active['channels'])
+        await asyncio.sleep(0.01)
+        active['channels'] -= 1
+        return 5
+
+    def finish_guild(guild, processed):
+        active['guilds'].discard(guild.id)
+        finished[guild.id] = processed
+
+    async def scenario():
+        runner = Backfill(lambda g: g.channels, backfill_channel, finish_guild,
+                          guild_concurrency=3, channel_concurrency=4)
+        await runner.start(_guilds(10, 3))
+        return runner
+
+    runner = asyncio.run(scenario())
+
+    assert finished == {g: 15 for g in range(10)}
+    assert peaks['guilds'] <= 3 and peaks['channels'] == 4
+    assert runner.snapshot() == {'running': False, 'guilds_total': 10, 'guilds_done': 10, 'guilds_failed': 0,
+                                 'channels_done': 30, 'channels_failed': 0, 'messages': 150}
+
+
+def test_a_failing_channel_does_not_stop_its_guild():
+    finished = {}
+
+    async def backfill_channel(guild, channel):
+        if channel.id == 1:
+            raise RuntimeError('Missing Access')
+        return 2
+
+    async def scenario():
+        runner = Backfill(lambda g: g.channels, backfill_channel, lambda g, n: finished.__setitem__(g.id, n))
+        await runner.start(_guilds(1, 3))
+        return runner
+
+    runner = asyncio.run(scenario())
+
+    assert finished == {0: 4}
+    assert runner.channels_failed == 1 and runner.channels_done == 2
+
+
+def test_cancel_stops_the_run_without_finishing_guilds():
+    finished = {}
+    started = []
+
+    async def backfill_channel(guild, channel):
+        started.append(channel.id)
+        await asyncio.sleep(10)
+        return 1
+
+    async def scenario():
+        runner = Backfill(lambda g: g.channels, backfill_channel, lambda g, n: finished.__setitem__(g.id, n),
+                          guild_concurrency=2, channel_concurrency=2)
+        runner.start(_guilds(5, 2))
+        await asyncio.sleep(0.01)
+        await runner.cancel()
+        return runner
+
+    runner = asyncio.run(scenario())
+
+    assert not runner.running
+    assert len(started) == 2 and finished == {}
+
+
+def test_checkpoint_is_written_with_the_batch(db):
+    db.save_backfill_batch(10, 500, 1001, [(1, 'ada', 'Ada', None)], [(1, '2026-10-17', 3), (1, '2026-10-18', 4)])
+    db.save_backfill_batch(10, 500, 1100, [], [(2, '2026-10-18', 1)])
+
+    assert db.get_last_processed(10, 500) == 1100
+    assert db.get_users([1]) == {1: ('ada', 'Ada', None)}
+    assert [row[0] for row in db.get_logs_since(1, 10, '2026-10-01')] == ['2026-10-17', '2026-10-18']
+    assert len(db.get_logs_since(2, 10, '2026-10-01')) == 1
@@ -0,0 +1,123 @@
+"""Weekly challenge pre-generation: scheduling window, retries and posting stored text."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+import pytz
+
+import gemini
+from cogs import challenges
+from cogs.challenges import Challenges
+
+IST = pytz.timezone('Asia/Kolkata')
+# Sunday 09:00 IST is the default due time; 2026-10-18 is a Sunday
+DUE = IST.localize(datetime(2026, 10, 18, 9, 0))
+WEEK = '2026-W42'
+
+
+class FakeChannel:
+    name = 'daily-code'
+    id = 5
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, embed):
+        self.sent.append(embed)
+
+
+@pytest.fixture
+def cog(db, monkeypatch):
+    cog = Challenges.__new__(Challenges)
+    cog.db = db
+    cog.generation_tasks = {}
+    cog.challenge_pool = ['pool challenge']
+    cog.channel = FakeChannel()
+    cog._set_challenge_settings(1, channel_id=cog.channel.id)
+    monkeypatch.setattr(challenges, 'RETRY_BACKOFF', [0])
+
+    async def no_history(guild):
+        return ['#day 1 solved two-sum']
+
+    monkeypatch.setattr(cog, '_collect_last7_history_snippets', no_history)
+    return cog
+
+
+def _guild(cog):
+    return SimpleNamespace(id=1, name='Guild', get_channel=lambda channel_id: cog.channel)
+
+
+async def _tick(cog, monkeypatch, now):
+    monkeypatch.setattr(cog, '_get_ist_now', lambda: now)
+    await cog._post_weekly_challenge_if_due(_guild(cog))
+    # Let any background generation finish
+    await asyncio.gather(*cog.generation_tasks.values(), return_exceptions=True)
+
+
+def test_due_window(cog):
+    assert cog._current_due_time(1, IST.localize(datetime(2026, 10, 18, 7, 59))) is None
+    assert cog._current_due_time(1, IST.localize(datetime(2026, 10, 18, 8, 0))) == DUE
+    assert cog._current_due_time(1, IST.localize(datetime(2026, 10, 18, 9, 14))) == DUE
+    assert cog._current_due_time(1, IST.localize(datetime(2026, 10, 18, 9, 15))) is None
+
+
+def test_due_window_crossing_into_next_week(cog):
+    cog._set_challenge_settings(1, weekday='Monday', time_ist='00:30')
+
+    due = cog._current_due_time(1, IST.localize(datetime(2026, 10, 18, 23, 45)))
+
+    assert due == IST.localize(datetime(2026, 10, 19, 0, 30))
+
+
+def test_generated_ahead_then_posted_at_due_time(cog, monkeypatch):
+    calls = []
+
+    async def generate(snippets, guild_name, channel_name, fallback=True, guild_id=None):
+        calls.append(fallback)
+        return 'Build a trie'
+
+    monkeypatch.setattr(gemini, 'generate_challenge_from_history', generate)
+
+    async def scenario():
+        await _tick(cog, monkeypatch, IST.localize(datetime(2026, 10, 18, 8, 0)))
+        assert cog.channel.sent == []
+        await _tick(cog, monkeypatch, IST.localize(datetime(2026, 10, 18, 8, 30)))
+        await _tick(cog, monkeypatch, DUE)
+        await _tick(cog, monkeypatch, IST.localize(datetime(2026, 10, 18, 9, 1)))
+
+    asyncio.run(scenario())
+
+    assert calls == [False]
+    assert [embed.description for embed in cog.channel.sent] == ['Build a trie']
+    assert cog.db.get_last_week_sent(1) == WEEK
+    assert cog.db.get_pending_challenge(1, WEEK)[2] is not None
+
+
+def test_retries_then_falls_back_to_pool(cog, monkeypatch):
+    attempts = 0
+
+    async def failing(snippets, guild_name, channel_name, fallback=True, guild_id=None):
+        nonlocal attempts
+        attempts += 1
+        raise RuntimeError('quota')
+
+    monkeypatch.setattr(gemini, 'generate_challenge_from_history', failing)
+
+    async def scenario():
+        await _tick(cog, monkeypatch, IST.localize(datetime(2026, 10, 18, 8, 0)))
+        await _tick(cog, monkeypatch, DUE)
+
+    asyncio.run(scenario())
+
+    assert attempts == challenges.MAX_GENERATION_ATTEMPTS
+    assert [embed.description for embed in cog.channel.sent] == ['pool challenge']
+
+
+def test_failed_attempt_keeps_count_and_success_keeps_text(db):
+    db.record_challenge_attempt(1, WEEK, error='timeout')
+    db.record_challenge_attempt(1, WEEK, challenge_text='Build a trie')
+    db.record_challenge_attempt(1, WEEK, error='late failure')
+
+    text, attempts, posted_at = db.get_pending_challenge(1, WEEK)
+    assert (text, attempts, posted_at) == ('Build a trie', 3, None)
@@ -0,0 +1,89 @@
+"""Local chat-vs-code classifier: features, shipped model, process pool and cog modes."""
+import asyncio
+import logging
+import re
+
+import numpy as np
+import pytest
+
+import code_classifier
+from code_classifier import CodeClassifier, NaiveBayesModel
+from cogs.streaks import Streaks
+
+
+def test_features_are_stable_hashes():
+    a = code_classifier.featurize('for i in range(3): print(i)')
+    b = code_classifier.featurize('for i in range(3): print(i)')
+
+    assert a.shape == (1 << code_classifier.HASH_BITS,)
+    assert np.array_equal(a, b)
+    assert code_classifier.featurize('').sum() == 0
+
+
+def test_shipped_model_separates_chat_and_code():
+    model = NaiveBayesModel.load()
+
+    probabilities = model.predict_proba([
+        'def add(a, b):\n    return a + b',
+        'SELECT id FROM users WHERE active = 1;',
+        'i wrote a function that sorts a list today',
+        'good morning everyone, streak saved!',
+    ])
+
+    assert list(probabilities >= 0.5) == [True, True, False, False]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    model = NaiveBayesModel.fit(['x = 1', 'int y = 2;', 'hello there', 'see you later'], [True, True, False, False])
+    path = str(tmp_path / 'model.npz')
+
+    model.save(path)
+    loaded = NaiveBayesModel.load(path)
+
+    assert np.allclose(model.predict_proba(['z = 3']), loaded.predict_proba(['z = 3']), atol=1e-2)
+
+
+def test_pool_inference():
+    classifier = CodeClassifier()
+    try:
+        verdicts = asyncio.run(classifier.predict(['print("hi")', 'thanks for the help']))
+    finally:
+        classifier.shutdown()
+
+    assert verdicts[0] > 0.5 > verdicts[1]
+
+
+class FakeClassifier:
+    def __init__(self, verdict):
+        self.verdict = verdict
+
+    async def is_code(self, text):
+        return self.verdict
+
+
+def _cog(mode, verdict):
+    cog = Streaks.__new__(Streaks)
+    cog.code_pattern = re.compile(r'```[\s\S]*?```|`[^`]+`')
+    cog.classifier_mode = mode
+    cog.classifier = FakeClassifier(verdict)
+    cog.classifier_disagreements = 0
+    return cog
+
+
+def test_shadow_mode_keeps_keyword_verdict(caplog):
+    cog = _cog('shadow', False)
+
+    with caplog.at_level(logging.INFO):
+        verdict = asyncio.run(cog._text_has_code('going for a walk'))
+
+    # 'for ' is a keyword, so the keyword check wins and the disagreement is only logged
+    assert verdict is True
+    assert cog.classifier_disagreements == 1
+    assert 'disagrees' in caplog.text
+
+
+def test_on_mode_uses_model_but_fences_are_definitive():
+    cog = _cog('on', False)
+
+    assert asyncio.run(cog._text_has_code('going for a walk')) is False
+    assert asyncio.run(cog._text_has_code('```x = 1```')) is True
@@ -0,0 +1,197 @@
+"""Threaded Q&A memory: history, token budget, LRU eviction and Gemini context caches."""
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+from google.genai import types
+
+import gemini
+from conversations import ConversationStore
+
+
+class StandInModels:
+    """Streams a fixed answer and records every request it receives."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def generate_content_stream(self, model, contents, config):
+        self.requests.append((contents, config))
+        answer = f"answer {len(self.requests)}"
+
+        async def chunks():
+            yield SimpleNamespace(text=answer)
+
+        return chunks()
+
+
+class StandInCaches:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.created = {}
+        self.deleted = []
+
+    async def create(self, model, config):
+        if self.fail:
+            raise RuntimeError("caching unavailable")
+        name = f"cachedContents/{len(self.created) + 1}"
+        self.created[name] = config
+        return SimpleNamespace(name=name)
+
+    async def delete(self, name):
+        self.deleted.append(name)
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    client = SimpleNamespace(aio=SimpleNamespace(models=StandInModels(), caches=StandInCaches()))
+    monkeypatch.setattr(gemini, '_client', client)
+    monkeypatch.setattr(gemini, '_buckets', {})
+    monkeypatch.setattr(gemini, '_breakers', {})
+    monkeypatch.setattr(gemini, '_answer_cache', gemini.TTLCache(ttl=60))
+    monkeypatch.setattr(gemini, '_answer_flights', gemini.SingleFlight())
+    monkeypatch.setattr(gemini, '_conversations', ConversationStore(on_cache_released=gemini._release_context_cache))
+    monkeypatch.setattr(gemini, 'CONTEXT_CACHE_MIN_TOKENS', 1000)
+    return client.aio
+
+
+def _thread_message(message_id, thread_id=500):
+    thread = discord.Thread.__new__(discord.Thread)
+    thread.id = thread_id
+    return SimpleNamespace(id=message_id, channel=thread, reference=None)
+
+
+async def _ask(question, conversation, attachments=None):
+    return ''.join([chunk async for chunk in gemini.stream_answer(question, attachments, conversation=conversation)])
+
+
+def _texts(contents):
+    return [part.text for content in contents for part in content.parts]
+
+
+def test_follow_up_carries_the_thread_history(stand_in):
+    async def scenario():
+        conversation = gemini.conversation_for(_thread_message(1))
+        await _ask('what is a dict?', conversation)
+        return await _ask('why?', gemini.conversation_for(_thread_message(2)))
+
+    assert asyncio.run(scenario()) == 'answer 2'
+    contents, config = stand_in.models.requests[1]
+    assert [c.role for c in contents] == ['user', 'model', 'user']
+    assert _texts(contents) == ['what is a dict?', 'answer 1', 'why?']
+    assert config.system_instruction == gemini.ANSWER_INSTRUCTION
+
+
+def test_follow_up_skips_the_answer_cache(stand_in):
+    async def scenario():
+        await _ask('why?', gemini.conversation_for(SimpleNamespace(id=1, channel=None, reference=None)))
+        conversation = gemini.conversation_for(_thread_message(2))
+        await _ask('why?', conversation)
+        return await _ask('why?', conversation)
+
+    # The unthreaded question and the first in the thread share the cache; the follow-up doesn't
+    assert asyncio.run(scenario()) == 'answer 2'
+    assert len(stand_in.models.requests) == 2
+
+
+def test_reply_to_an_answer_continues_its_conversation(stand_in):
+    question = SimpleNamespace(id=10, channel=None, reference=None)
+    conversation = gemini.conversation_for(question)
+    gemini.link_messages(conversation, [question, SimpleNamespace(id=11)])
+
+    reply = SimpleNamespace(id=12, channel=None, reference=SimpleNamespace(message_id=11))
+    unrelated = SimpleNamespace(id=13, channel=None, reference=SimpleNamespace(message_id=99))
+    assert gemini.conversation_for(reply) is conversation
+    assert gemini.conversation_for(unrelated) is not conversation
+
+
+def test_large_file_is_cached_for_follow_ups(stand_in):
+    big_file = [{'filename': 'app.py', 'content': 'x = 1\n' * 1500}]
+
+    async def scenario():
+        conversation = gemini.conversation_for(_thread_message(1))
+        await _ask('review this', conversation, big_file)
+        await _ask('and the naming?', conversation)
+        await _ask('anything else?', conversation)
+        return conversation
+
+    conversation = asyncio.run(scenario())
+    assert list(stand_in.caches.created) == ['cachedContents/1']
+    cached = stand_in.caches.created['cachedContents/1']
+    assert cached.system_instruction == gemini.ANSWER_INSTRUCTION
+    assert len(cached.contents) == 2 and 'app.py' in cached.contents[0].parts[0].text
+
+    first, second, third = stand_in.models.requests
+    assert first[1].cached_content is None
+    # Follow-ups reference the cache instead of resending the file and instruction
+    assert second[1].cached_content == third[1].cached_content == 'cachedContents/1'
+    assert second[1].system_instruction is None
+    assert _texts(second[0]) == ['and the naming?']
+    assert _texts(third[0]) == ['and the naming?', 'answer 2', 'anything else?']
+    assert conversation.cached_turns == 2
+
+
+def test_cache_failure_falls_back_to_full_history(stand_in):
+    stand_in.caches.fail = True
+    big_file = [{'filename': 'app.py', 'content': 'x = 1\n' * 1500}]
+
+    async def scenario():
+        conversation = gemini.conversation_for(_thread_message(1))
+        await _ask('review this', conversation, big_file)
+        return await _ask('and the naming?', conversation)
+
+    assert asyncio.run(scenario()) == 'answer 2'
+    contents, config = stand_in.models.requests[1]
+    assert config.cached_content is None and len(contents) == 3
+
+
+def test_token_budget_drops_oldest_exchanges_and_their_cache(stand_in, monkeypatch):
+    monkeypatch.setattr(gemini._conversations, 'token_budget', 2500)
+    big_file = [{'filename': 'app.py', 'content': 'x = 1\n' * 1500}]
+
+    async def scenario():
+        conversation = gemini.conversation_for(_thread_message(1))
+        await _ask('review this', conversation, big_file)
+        await _ask('and the naming?', conversation)
+        await _ask('more', conversation, [{'filename': 'b.py', 'content': 'y = 2\n' * 1000}])
+        await asyncio.sleep(0)
+        return conversation
+
+    conversation = asyncio.run(scenario())
+    assert conversation.total_tokens <= 2500
+    assert 'app.py' not in ''.join(_texts(conversation.turns))
+    assert conversation.cache_name is None
+    assert stand_in.caches.deleted == ['cachedContents/1']
+
+
+def test_least_recently_used_conversation_is_evicted():
+    released = []
+    store = ConversationStore(max_conversations=2, on_cache_released=released.append)
+    first = store.get(1)
+    first.set_cache('cachedContents/1', 0, 60)
+    store.get(2)
+    store.get(1)
+    store.get(3)
+
+    assert list(store.conversations) == [1, 3]
+    assert released == []
+    store.get(4)
+    assert list(store.conversations) == [3, 4]
+    assert released == ['cachedContents/1']
+    assert store.snapshot()['evictions'] == 2
+
+
+def test_remembered_questions_drop_image_bytes():
+    store = ConversationStore()
+    conversation = store.get(1)
+    screenshot = types.Part.from_bytes(data=b'\x89PNG' + bytes(5_000_000), mime_type='image/png')
+    question = types.UserContent(parts=[screenshot, types.Part.from_text(text='Why does this fail?')])
+
+    store.remember(conversation, question, 'The loop never ends.')
+
+    stored = conversation.turns[0]
+    assert all(part.inline_data is None for part in stored.parts)
+    assert stored.parts[0].text == '[image/png attached earlier, not kept]'
+    assert stored.parts[1].text == 'Why does this fail?'
+    assert conversation.total_tokens < 100
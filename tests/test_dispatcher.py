@@ -0,0 +1,163 @@
+"""Feature extraction and routing in MessageDispatcher."""
+import asyncio
+from types import SimpleNamespace
+
+import dispatcher
+from dispatcher import MessageDispatcher, MessageFeatures
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+    def mentioned_in(self, message):
+        return any(m.id == self.id for m in message.mentions)
+
+
+def _attachment(filename, content_type=None):
+    return SimpleNamespace(id=hash(filename), filename=filename, content_type=content_type)
+
+
+def _message(content='', attachments=(), mentions=(), reference=None, channel='general'):
+    return SimpleNamespace(
+        content=content, attachments=list(attachments), mentions=list(mentions), mention_everyone=False,
+        reference=reference, guild=SimpleNamespace(id=1), channel=SimpleNamespace(name=channel),
+    )
+
+
+def test_features_are_extracted_once_for_every_listener():
+    bot_user = FakeUser(99)
+    message = _message(
+        '<@99> #DAY - 12 here is ```print(1)```',
+        attachments=[_attachment('solution.py'), _attachment('shot.png', 'image/png'),
+                     _attachment('clip.mp4', 'video/mp4'), _attachment('Dockerfile', 'text/plain')],
+        mentions=[bot_user],
+        channel='daily-code',
+    )
+
+    features = MessageFeatures.from_message(message, bot_user, lambda channel: channel.name == 'daily-code')
+
+    assert features.day_number == 12
+    assert features.has_code_block and not features.code_hint
+    assert [a.filename for a in features.code_attachments] == ['solution.py']
+    assert [a.filename for a in features.image_attachments] == ['shot.png']
+    assert [a.filename for a in features.other_attachments] == ['Dockerfile']
+    assert features.mentions_bot and features.in_monitored_channel and not features.is_reply
+    assert features.kinds == {dispatcher.TEXT, dispatcher.DAY, dispatcher.CODE_BLOCK, dispatcher.CODE_FILE,
+                              dispatcher.IMAGE, dispatcher.FILE, dispatcher.MENTION, dispatcher.MONITORED}
+
+
+def test_chatter_is_dropped_without_running_any_handler():
+    bot = SimpleNamespace(user=FakeUser(99))
+    calls = []
+
+    async def handler(features):
+        calls.append(features.message.content)
+
+    async def scenario():
+        disp = MessageDispatcher(bot)
+        disp.subscribe('streaks', {dispatcher.DAY, dispatcher.CODE_HINT}, handler)
+        disp.subscribe('qa', {dispatcher.MENTION}, handler)
+        disp.dispatch(_message('good morning everyone'))
+        disp.dispatch(_message('#day 3 finished the linked list problem'))
+        await asyncio.gather(*disp.tasks)
+        return disp
+
+    disp = asyncio.run(scenario())
+
+    assert calls == ['#day 3 finished the linked list problem']
+    assert disp.stats['ignored'] == 1
+    assert disp.stats['streaks'] == 1 and disp.stats['qa'] == 0
+
+
+def test_a_failing_handler_does_not_affect_the_others(caplog):
+    bot = SimpleNamespace(user=FakeUser(99))
+    seen = []
+
+    async def broken(features):
+        raise RuntimeError('boom')
+
+    async def working(features):
+        seen.append(features.day_number)
+
+    async def scenario():
+        disp = MessageDispatcher(bot)
+        disp.subscribe('broken', {dispatcher.DAY}, broken)
+        disp.subscribe('working', {dispatcher.DAY}, working)
+        disp.dispatch(_message('#day-7'))
+        await asyncio.gather(*disp.tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+        return disp
+
+    disp = asyncio.run(scenario())
+
+    assert seen == [7]
+    assert not disp.tasks
+    assert 'Message handler broken failed' in caplog.text
+
+
+class FakeDb:
+    def __init__(self, configured):
+        self.configured = configured
+        self.queries = 0
+
+    def get_daily_code_channel(self, guild_id):
+        self.queries += 1
+        return self.configured.get(guild_id)
+
+
+def _guild(guild_id, *channels):
+    guild = SimpleNamespace(id=guild_id, text_channels=[])
+    guild.text_channels = [SimpleNamespace(id=cid, name=name, guild=guild) for cid, name in channels]
+    return guild
+
+
+def test_monitored_channels_follow_settings_names_and_threads():
+    db = FakeDb({1: 11})
+    guild = _guild(1, (10, 'general'), (11, 'progress'), (12, 'Daily-Code-python'))
+    monitored = dispatcher.MonitoredChannels(db)
+    general, progress, daily = guild.text_channels
+
+    assert not monitored.is_monitored(general)
+    assert monitored.is_monitored(progress) and monitored.is_monitored(daily)
+    assert monitored.is_monitored(SimpleNamespace(id=99, parent_id=12, guild=guild))
+    assert monitored.is_monitored(SimpleNamespace(id=1, guild=None)) is False
+    # Built once per guild, not looked up per message
+    assert db.queries == 1
+
+    general.name = 'daily-code-js'
+    monitored.refresh(guild)
+    assert monitored.is_monitored(general)
+    assert monitored.snapshot() == {'guilds': 1, 'channels': 3}
+
+
+def test_rejected_messages_are_counted_with_the_analysis_they_skip():
+    guild = _guild(1, (10, 'general'), (12, 'daily-code'))
+    general, daily = guild.text_channels
+    bot = SimpleNamespace(user=FakeUser(99))
+    handled = []
+
+    async def handler(features):
+        handled.append(features.message.content)
+
+    def message(content, channel, attachments=()):
+        msg = _message(content, attachments)
+        msg.channel, msg.guild = channel, channel.guild
+        return msg
+
+    async def scenario():
+        disp = MessageDispatcher(bot)
+        disp.monitored = dispatcher.MonitoredChannels(FakeDb({}))
+        disp.subscribe('streaks', {dispatcher.DAY, dispatcher.IMAGE, dispatcher.MONITORED}, handler,
+                       accept=lambda f: f.in_monitored_channel or f.day_number is not None)
+        disp.dispatch(message('lol', general, [_attachment('meme.png', 'image/png')]))
+        disp.dispatch(message('look', daily, [_attachment('code.png', 'image/png')]))
+        disp.dispatch(message('#day 4', general))
+        await asyncio.gather(*disp.tasks)
+        return disp
+
+    disp = asyncio.run(scenario())
+
+    assert handled == ['look', '#day 4']
+    assert disp.stats['streaks_skipped'] == 1
+    assert disp.stats['streaks_skipped_images'] == 1
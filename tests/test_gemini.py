@@ -0,0 +1,205 @@
+"""Gemini wrappers: async client usage, shared concurrency limit, timeouts."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import gemini
+
+
+class FakeModels:
+    def __init__(self, delay=0.05, text='{"contains_code": true, "confidence": 0.9}'):
+        self.delay = delay
+        self.text = text
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def generate_content(self, model, contents, config):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return SimpleNamespace(text=self.text)
+
+    async def generate_content_stream(self, model, contents, config):
+        self.calls += 1
+
+        async def chunks():
+            for start in range(0, len(self.text), 10):
+                await asyncio.sleep(self.delay / 10)
+                yield SimpleNamespace(text=self.text[start:start + 10])
+
+        return chunks()
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    models = FakeModels()
+    monkeypatch.setattr(gemini, '_client', SimpleNamespace(aio=SimpleNamespace(models=models)))
+    # Fresh limiter state so earlier tests don't drain the token bucket
+    monkeypatch.setattr(gemini, '_buckets', {})
+    monkeypatch.setattr(gemini, '_breakers', {})
+    monkeypatch.setattr(gemini, '_answer_cache', gemini.TTLCache(ttl=60))
+    monkeypatch.setattr(gemini, '_answer_flights', gemini.SingleFlight())
+    return models
+
+
+def test_concurrent_calls_share_the_limit(fake_models, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(gemini, '_semaphore', asyncio.Semaphore(2))
+        results = await asyncio.gather(*(gemini.detect_code_in_image(b'img') for _ in range(6)))
+        return results
+
+    assert asyncio.run(scenario()) == [True] * 6
+    assert fake_models.peak == 2
+
+
+def test_calls_do_not_block_the_event_loop(fake_models):
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        await gemini.detect_code_in_image(b'img')
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+
+
+def test_timeout_falls_back(fake_models, monkeypatch):
+    fake_models.delay = 1
+    monkeypatch.setattr(gemini, 'DETECTION_TIMEOUT', 0.01)
+
+    # Detection accepts the image when Gemini cannot answer
+    assert asyncio.run(gemini.detect_code_in_image(b'img')) is True
+
+
+def test_long_answer_is_not_truncated(fake_models):
+    fake_models.text = 'x' * 5000
+
+    answer = asyncio.run(gemini.answer_question('why?'))
+
+    # Splitting long answers across messages is the caller's job now
+    assert answer == 'x' * 5000
+
+
+def test_identical_questions_share_one_call(fake_models):
+    fake_models.text = 'Use a dict.'
+
+    async def scenario():
+        return await asyncio.gather(
+            gemini.answer_question('How do I count words?'),
+            gemini.answer_question('how do I   count words'),
+            gemini.answer_question('How do I count words?', image_data=[{'data': b'png', 'mime_type': 'image/png'}]),
+        )
+
+    assert asyncio.run(scenario()) == ['Use a dict.'] * 3
+    # The two text-only questions coalesce; the one with an image is a different request
+    assert fake_models.calls == 2
+    assert gemini.get_answer_stats()['coalesced'] == 1
+
+
+def test_repeat_question_served_from_cache(fake_models):
+    fake_models.text = 'Use a dict.'
+    attachment = [{'filename': 'a.py', 'content': 'print(1)'}]
+
+    asyncio.run(gemini.answer_question('why?', attachment))
+    asyncio.run(gemini.answer_question('Why', [{'filename': 'renamed.py', 'content': 'print(1)'}]))
+    asyncio.run(gemini.answer_question('why?', [{'filename': 'a.py', 'content': 'print(2)'}]))
+
+    assert fake_models.calls == 2
+
+
+def test_failed_answers_are_not_cached(fake_models):
+    fake_models.text = ''
+
+    asyncio.run(gemini.answer_question('why?'))
+    asyncio.run(gemini.answer_question('why?'))
+
+    assert fake_models.calls == 2
+
+
+def _batch_reply(*flags):
+    return json.dumps({'verdicts': [
+        {'index': i, 'contains_code': flag, 'confidence': 0.9} for i, flag in enumerate(flags, start=1)
+    ]})
+
+
+def test_batch_classification_returns_all_verdicts(fake_models, monkeypatch):
+    monkeypatch.setattr(gemini, 'BATCH_IMAGES', 3)
+    fake_models.text = _batch_reply(False, True, False)
+    images = [(b'img%d' % i, 'image/png') for i in range(5)]
+
+    verdicts = asyncio.run(gemini.classify_code_images(images))
+
+    # Five images in batches of three; the second batch's reply is longer than the batch
+    assert verdicts == [False, True, False, False, True]
+    assert fake_models.calls == 2
+
+
+def test_any_positive_stops_after_first_hit(fake_models, monkeypatch):
+    monkeypatch.setattr(gemini, 'BATCH_IMAGES', 2)
+    fake_models.text = _batch_reply(False, True)
+    images = [(b'img%d' % i, 'image/png') for i in range(6)]
+
+    assert asyncio.run(gemini.any_image_has_code(images)) is True
+    assert fake_models.calls == 1
+
+
+def test_missing_verdicts_accept_the_image(fake_models):
+    fake_models.text = _batch_reply(False)
+
+    verdicts = asyncio.run(gemini.classify_code_images([(b'a', 'image/png'), (b'b', 'image/png')]))
+
+    assert verdicts == [False, True]
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def test_answer_streams_in_chunks_and_is_cached(fake_models):
+    fake_models.text = 'A fairly long answer about dictionaries.'
+
+    chunks = asyncio.run(_collect(gemini.stream_answer('why?')))
+    again = asyncio.run(_collect(gemini.stream_answer('Why')))
+
+    assert len(chunks) > 1 and ''.join(chunks) == fake_models.text
+    assert again == [fake_models.text]
+    assert fake_models.calls == 1
+
+
+def test_identical_question_waits_for_streaming_leader(fake_models):
+    fake_models.text = 'Use a dict.'
+
+    async def scenario():
+        return await asyncio.gather(
+            _collect(gemini.stream_answer('why?')),
+            gemini.answer_question('why?'),
+        )
+
+    streamed, answered = asyncio.run(scenario())
+    assert ''.join(streamed) == answered == 'Use a dict.'
+    assert fake_models.calls == 1
+
+
+def test_stream_failure_yields_error(fake_models, monkeypatch):
+    async def broken(model, contents, config):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(fake_models, 'generate_content_stream', broken)
+
+    chunks = asyncio.run(_collect(gemini.stream_answer('why?')))
+
+    assert len(chunks) == 1 and chunks[0].startswith('❌')
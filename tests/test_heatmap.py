@@ -0,0 +1,50 @@
+"""Heatmap rendering and the version-stamped render cache."""
+from datetime import date
+
+import pytest
+
+import heatmap
+from database import Database
+
+END = date(2026, 10, 19)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    heatmap.heatmap_cache.entries.clear()
+
+
+def test_day_vector_marks_logged_days():
+    vector = heatmap.build_day_vector(['2026-10-19', '2026-10-17', '2025-01-01'], END, 7)
+
+    assert vector == [False, False, False, False, True, False, True]
+
+
+def test_png_is_well_formed():
+    image = heatmap.render_png([True, False] * 200, END)
+
+    assert image.startswith(b'\x89PNG\r\n\x1a\n')
+    assert image.endswith(b'IEND\xaeB`\x82')
+
+
+def test_repeat_view_is_a_cache_hit(db):
+    db.log_specific_day(1, 10, '2026-10-18', 1)
+
+    first = heatmap.get_heatmap(db, 1, 10, days=30, end=END)
+    hits = heatmap.heatmap_cache.hits
+    second = heatmap.get_heatmap(db, 1, 10, days=30, end=END)
+
+    assert second is first
+    assert heatmap.heatmap_cache.hits == hits + 1
+
+
+def test_writes_from_another_process_are_picked_up(db, tmp_path):
+    db.log_specific_day(1, 10, '2026-10-18', 1)
+    before = heatmap.get_heatmap(db, 1, 10, days=30, fmt='svg', end=END)
+
+    # A separate Database instance stands in for the bot writing while the dashboard reads
+    Database(db.db_name).log_specific_day(1, 10, '2026-10-19', 2)
+    after = heatmap.get_heatmap(db, 1, 10, days=30, fmt='svg', end=END)
+
+    assert after != before
+    assert b'2026-10-19 \xe2\x9c\x93' in after
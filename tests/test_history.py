@@ -0,0 +1,84 @@
+"""Snowflake-range parallel history reads against a fake paginated channel."""
+import asyncio
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+import history
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeChannel:
+    """Serves messages in pages of 100 like Discord, counting cursors reading at the same time."""
+
+    def __init__(self, ids, page_delay=0.005, fail_after=None):
+        self.id = discord.utils.time_snowflake(START - timedelta(days=1))
+        self.ids = sorted(ids)
+        self.page_delay = page_delay
+        self.fail_after = fail_after
+        self.active = 0
+        self.peak = 0
+        self.pages = 0
+
+    async def history(self, limit, after, before, oldest_first):
+        assert limit is None and oldest_first
+        selected = [i for i in self.ids if after.id < i < before.id]
+        for start in range(0, len(selected), 100):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(self.page_delay)
+            self.active -= 1
+            self.pages += 1
+            if self.fail_after is not None and self.pages > self.fail_after:
+                raise discord.DiscordException('Missing Access')
+            for message_id in selected[start:start + 100]:
+                yield SimpleNamespace(id=message_id)
+
+
+def _ids(count, days):
+    step = timedelta(days=days) / count
+    return [discord.utils.time_snowflake(START + step * i) + 1 for i in range(count)]
+
+
+async def _collect(channel, **kwargs):
+    async with aclosing(history.parallel_history(channel, **kwargs)) as messages:
+        return [m.id async for m in messages]
+
+
+def test_ranges_are_read_concurrently_and_merged_in_order():
+    ids = _ids(1200, days=30)
+    channel = FakeChannel(ids)
+
+    result = asyncio.run(_collect(channel, after=START - timedelta(hours=1), before=START + timedelta(days=31), parts=4))
+
+    assert result == ids
+    assert channel.peak == 4
+
+
+def test_message_on_a_range_boundary_is_read_once():
+    after, before = 1 << 40, (1 << 40) + (4 * 10 * 3600 * 1000 << 22)
+    ranges = history.split_range(after, before, 4)
+    boundary = ranges[1][1]
+    channel = FakeChannel([after + 5, boundary, before - 5])
+
+    result = asyncio.run(_collect(channel, after=discord.Object(after), before=discord.Object(before), parts=4))
+
+    assert len(ranges) == 4
+    assert result == [after + 5, boundary, before - 5]
+
+
+def test_short_windows_use_one_cursor():
+    assert len(history.split_range(1 << 40, (1 << 40) + (3600 * 1000 << 22), 4)) == 1
+
+
+def test_limit_stops_early_and_errors_propagate():
+    ids = _ids(1000, days=20)
+
+    assert asyncio.run(_collect(FakeChannel(ids), after=START - timedelta(hours=1), limit=150)) == ids[:150]
+
+    with pytest.raises(discord.DiscordException):
+        asyncio.run(_collect(FakeChannel(ids, fail_after=3), after=START - timedelta(hours=1)))
@@ -0,0 +1,187 @@
+"""Shared HTTP session and size-capped streaming downloads, against a local server."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+import http_client
+from cache import AttachmentCache
+
+
+async def _serve(handlers):
+    app = web.Application()
+    for path, handler in handlers.items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+
+
+def _run(handlers, scenario):
+    async def wrapper():
+        runner, base_url = await _serve(handlers)
+        try:
+            return await scenario(base_url)
+        finally:
+            await http_client.close_session()
+            await runner.cleanup()
+
+    return asyncio.run(wrapper())
+
+
+def _endless(sent):
+    """Streams 64 KiB chunks for as long as the client keeps reading."""
+    async def handler(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        try:
+            for _ in range(1000):
+                await response.write(b'x' * 65536)
+                sent['bytes'] += 65536
+                await asyncio.sleep(0.001)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        return response
+    return handler
+
+
+async def _small(request):
+    return web.Response(body=b'print("hi")\n')
+
+
+async def _big(request):
+    return web.Response(body=b'y' * 200_000)
+
+
+async def _missing(request):
+    return web.Response(status=404)
+
+
+def test_truncated_download_stops_early():
+    sent = {'bytes': 0}
+
+    async def scenario(base_url):
+        head = await http_client.fetch(f'{base_url}/endless', 4096)
+        await asyncio.sleep(0.1)
+        return head
+
+    head = _run({'/endless': _endless(sent)}, scenario)
+    assert head == b'x' * 4096
+    # The server gave up long before its 64 MB body was sent
+    assert sent['bytes'] < 16 * 1024 * 1024
+
+
+def test_capped_download_rejects_oversized_bodies():
+    async def scenario(base_url):
+        small = await http_client.fetch(f'{base_url}/small', 1000, truncate=False)
+        with pytest.raises(http_client.DownloadTooLarge):
+            await http_client.fetch(f'{base_url}/big', 100_000, truncate=False)
+        with pytest.raises(http_client.DownloadTooLarge):
+            await http_client.fetch(f'{base_url}/endless', 100_000, truncate=False)
+        missing = await http_client.fetch(f'{base_url}/missing', 1000)
+        return small, missing
+
+    small, missing = _run({'/small': _small, '/big': _big, '/endless': _endless({'bytes': 0}),
+                           '/missing': _missing}, scenario)
+    assert small == b'print("hi")\n'
+    assert missing is None
+
+
+def test_attachment_size_is_checked_before_connecting():
+    attachment = SimpleNamespace(url='http://127.0.0.1:9/never', size=50_000_000)
+
+    async def scenario():
+        with pytest.raises(http_client.DownloadTooLarge):
+            await http_client.fetch_attachment(attachment, http_client.IMAGE_BYTES, truncate=False)
+
+    asyncio.run(scenario())
+
+
+def test_attachments_are_fetched_concurrently_over_one_session():
+    async def slow(request):
+        await asyncio.sleep(0.2)
+        return web.Response(body=b'data')
+
+    async def scenario(base_url):
+        session = http_client.get_session()
+        attachments = [SimpleNamespace(url=f'{base_url}/slow', size=4) for _ in range(5)]
+        attachments.append(SimpleNamespace(url=f'{base_url}/missing', size=0))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await http_client.fetch_attachments(attachments, 1000)
+        return results, loop.time() - start, session is http_client.get_session()
+
+    results, elapsed, shared = _run({'/slow': slow, '/missing': _missing}, scenario)
+    assert results == [b'data'] * 5 + [None]
+    assert elapsed < 0.6
+    assert shared
+
+
+def test_listeners_share_one_download_per_attachment(monkeypatch):
+    monkeypatch.setattr(http_client, 'attachment_cache', AttachmentCache())
+    requests = {'count': 0}
+
+    async def image(request):
+        requests['count'] += 1
+        await asyncio.sleep(0.05)
+        return web.Response(body=b'\x89PNG' + b'z' * 5000)
+
+    async def scenario(base_url):
+        screenshot = SimpleNamespace(id=42, url=f'{base_url}/image', size=5004)
+        # Q&A and streak detection fetch the same screenshot at the same time, then a preview
+        together = await asyncio.gather(
+            http_client.fetch_attachment(screenshot, http_client.IMAGE_BYTES, truncate=False),
+            http_client.fetch_attachment(screenshot, http_client.IMAGE_BYTES, truncate=False),
+        )
+        preview = await http_client.fetch_attachment(screenshot, 100)
+        with pytest.raises(http_client.DownloadTooLarge):
+            await http_client.fetch_attachment(screenshot, 1000, truncate=False)
+        return together, preview
+
+    (first, second), preview = _run({'/image': image}, scenario)
+    assert first == second and len(first) == 5004
+    assert preview == first[:100]
+    assert requests['count'] == 1
+
+
+def test_truncated_entry_is_refetched_when_more_is_needed(monkeypatch):
+    monkeypatch.setattr(http_client, 'attachment_cache', AttachmentCache())
+    requests = {'count': 0}
+
+    async def text(request):
+        requests['count'] += 1
+        return web.Response(body=b'a' * 10_000)
+
+    async def scenario(base_url):
+        attachment = SimpleNamespace(id=7, url=f'{base_url}/text', size=None)
+        head = await http_client.fetch_attachment(attachment, 100)
+        again = await http_client.fetch_attachment(attachment, 50)
+        whole = await http_client.fetch_attachment(attachment, 100_000)
+        return head, again, whole
+
+    head, again, whole = _run({'/text': text}, scenario)
+    assert (len(head), len(again), len(whole)) == (100, 50, 10_000)
+    assert requests['count'] == 2
+
+
+def test_attachment_cache_evicts_by_size_and_age(monkeypatch):
+    cache = AttachmentCache(max_bytes=1000, ttl=60)
+    cache.set_data(1, b'a' * 400, True)
+    cache.set_data(2, b'b' * 400, True)
+    cache.set_verdict(2, 'code', False)
+    assert cache.get_data(1) == (b'a' * 400, True)
+    cache.set_data(3, b'c' * 400, True)
+
+    # 2 was least recently used and goes first, verdicts included
+    assert cache.get_data(2) == (None, False)
+    assert cache.get_verdict(2, 'code') is None
+    assert cache.size == 800
+
+    clock = [time.monotonic() + 61]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+    assert cache.get_data(1) == (None, False)
+    assert cache.snapshot()['evictions'] == 1
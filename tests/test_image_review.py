@@ -0,0 +1,112 @@
+"""Backfill image guesses and their background Gemini review."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import gemini
+import http_client
+import image_review
+from cache import AttachmentCache
+from cogs.streaks import Streaks
+from dispatcher import CODE_BLOCK_PATTERN
+
+
+def _image(attachment_id, width=1200, height=800, content_type='image/png'):
+    return SimpleNamespace(id=attachment_id, filename=f'{attachment_id}.png', content_type=content_type,
+                           width=width, height=height, url=f'https://cdn.example/{attachment_id}.png')
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(http_client, 'attachment_cache', AttachmentCache())
+
+
+def test_local_guess_skips_gifs_and_tiny_images():
+    assert image_review.looks_like_code(_image(1))
+    assert not image_review.looks_like_code(_image(2, content_type='image/gif'))
+    assert not image_review.looks_like_code(_image(3, width=64, height=64))
+
+
+def test_image_size_from_headers():
+    jpeg = (b'\xff\xd8' + b'\xff\xe0\x00\x10' + bytes(14)
+            + b'\xff\xc0\x00\x11\x08' + (600).to_bytes(2, 'big') + (1024).to_bytes(2, 'big') + bytes(12))
+
+    assert image_review.image_size(jpeg) == (1024, 600)
+    assert image_review.image_size(b'not an image') == (None, None)
+    assert image_review.image_looks_like_code(jpeg, 'image/jpeg')
+
+
+def test_historical_messages_never_wait_on_gemini(monkeypatch):
+    async def no_gemini(*args, **kwargs):
+        raise AssertionError('Gemini called during backfill')
+
+    monkeypatch.setattr(gemini, 'classify_code_images', no_gemini)
+    monkeypatch.setattr(http_client, 'fetch_attachments', no_gemini)
+    cog = Streaks.__new__(Streaks)
+    cog.code_pattern = CODE_BLOCK_PATTERN
+    cog.classifier = None
+    screenshot, sticker = _image(1), _image(2, width=80, height=80)
+    message = SimpleNamespace(id=7, content='#day 4', attachments=[screenshot, sticker], guild=None)
+
+    deferred = []
+    assert asyncio.run(cog.has_media_or_code(message, deferred=deferred)) is True
+    assert deferred == [screenshot]
+
+
+def _run_review(db, verdicts, monkeypatch, attachments):
+    async def fetch_attachments(items, max_bytes, truncate=True):
+        return [b'png'] * len(items)
+
+    async def classify(images, any_positive=False, guild_id=None):
+        return verdicts[:len(images)]
+
+    monkeypatch.setattr(http_client, 'fetch_attachments', fetch_attachments)
+    monkeypatch.setattr(gemini, 'classify_code_images', classify)
+    queue = image_review.ImageReviewQueue(db)
+    asyncio.run(queue.review(10, 1, '2026-10-01', 4, attachments))
+    return queue
+
+
+def test_review_removes_logs_whose_images_have_no_code(db, monkeypatch):
+    db.log_specific_day(1, 10, '2026-10-01', 4)
+
+    queue = _run_review(db, [False], monkeypatch, [_image(1)])
+
+    assert db.get_logs_since(1, 10, '2026-09-01') == []
+    assert queue.stats['revoked'] == 1
+    assert http_client.attachment_cache.get_verdict(1, 'code') is False
+
+
+def test_review_keeps_confirmed_logs(db, monkeypatch):
+    db.log_specific_day(1, 10, '2026-10-01', 4)
+
+    queue = _run_review(db, [True], monkeypatch, [_image(1)])
+
+    assert db.get_logs_since(1, 10, '2026-09-01') == [('2026-10-01', 4)]
+    assert queue.stats['confirmed'] == 1
+
+
+def test_queued_reviews_wait_for_gemini_headroom(db, monkeypatch):
+    headroom = {'free': False}
+    reviewed = []
+    monkeypatch.setattr(image_review, 'REVIEW_IDLE_WAIT', 0.01)
+    monkeypatch.setattr(gemini, 'has_headroom', lambda model, fraction: headroom['free'])
+
+    async def scenario():
+        queue = image_review.ImageReviewQueue(db)
+
+        async def review(*item):
+            reviewed.append(item[2])
+
+        queue.review = review
+        queue.submit(10, 1, '2026-10-01', 4, [_image(1)])
+        await asyncio.sleep(0.05)
+        assert reviewed == []
+        headroom['free'] = True
+        await asyncio.sleep(0.05)
+        queue.stop()
+
+    asyncio.run(scenario())
+
+    assert reviewed == ['2026-10-01']
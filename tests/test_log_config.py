@@ -0,0 +1,66 @@
+"""Queued logging, rotation, JSON output and per-call-site sampling."""
+import json
+import logging
+
+import pytest
+
+import log_config
+
+
+def _record(msg, level=logging.INFO, lineno=10):
+    return logging.LogRecord('LupinBot.test', level, 'cogs/fun.py', lineno, msg, None, None)
+
+
+def test_sampling_limits_each_call_site_and_reports_drops(monkeypatch):
+    clock = {'now': 100.0}
+    monkeypatch.setattr(log_config.time, 'monotonic', lambda: clock['now'])
+    sampler = log_config.SamplingFilter(burst=2, window=60)
+
+    passed = [sampler.filter(_record(f'Cache hit for meme:{i}')) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert sampler.filter(_record('Other call site', lineno=11))
+    assert sampler.filter(_record('Gemini unavailable', level=logging.WARNING))
+
+    clock['now'] += 60
+    record = _record('Cache hit for meme:9')
+    assert sampler.filter(record)
+    assert record.getMessage() == 'Cache hit for meme:9 (3 similar messages suppressed)'
+
+
+def test_json_lines():
+    line = log_config.JsonFormatter().format(_record('Synced 12 slash commands'))
+
+    entry = json.loads(line)
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'LupinBot.test'
+    assert entry['message'] == 'Synced 12 slash commands'
+
+
+@pytest.fixture
+def restore_root():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    log_config.stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_records_are_written_by_the_listener_and_rotated(tmp_path, monkeypatch, restore_root):
+    monkeypatch.setattr(log_config, 'LOG_MAX_BYTES', 500)
+    monkeypatch.setattr(log_config, 'LOG_BACKUP_COUNT', 2)
+    log_file = tmp_path / 'bot.log'
+    log_config.setup_logging(log_file=str(log_file), json_format=True)
+
+    logger = logging.getLogger('LupinBot.test')
+    for i in range(15):
+        logger.warning(f'Backfill error in guild {i}')
+    log_config.stop_logging()
+
+    assert (tmp_path / 'bot.log.1').exists()
+    assert not (tmp_path / 'bot.log.3').exists()
+    lines = log_file.read_text().splitlines()
+    assert json.loads(lines[-1])['message'] == 'Backfill error in guild 14'
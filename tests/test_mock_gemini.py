@@ -0,0 +1,122 @@
+"""The local Gemini stand-in, driven through the real google-genai client."""
+import asyncio
+import random
+
+import pytest
+from google import genai
+from google.genai import types
+
+import gemini
+from conversations import ConversationStore
+from mock_gemini import Latency, MockGemini
+
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(gemini, '_buckets', {})
+    monkeypatch.setattr(gemini, '_breakers', {})
+    monkeypatch.setattr(gemini, '_answer_cache', gemini.TTLCache(ttl=60))
+    monkeypatch.setattr(gemini, '_answer_flights', gemini.SingleFlight())
+    monkeypatch.setattr(gemini, '_conversations', ConversationStore())
+
+
+def _run(mock, scenario, monkeypatch):
+    """Start the stand-in, point gemini at it, run `scenario()` and shut everything down."""
+    async def wrapper():
+        base_url = await mock.start()
+        client = genai.Client(api_key='mock', http_options=types.HttpOptions(base_url=base_url))
+        monkeypatch.setattr(gemini, '_client', client)
+        try:
+            return await scenario()
+        finally:
+            await client.aio.aclose()
+            await mock.stop()
+
+    return asyncio.run(wrapper())
+
+
+def test_latency_specs():
+    rng = random.Random(1)
+    assert Latency('fixed:0.2', rng).sample() == 0.2
+    assert all(0.1 <= Latency('uniform:0.1,0.3', rng).sample() <= 0.3 for _ in range(50))
+    assert all(Latency('normal:0.0,1', rng).sample() >= 0 for _ in range(50))
+    samples = sorted(Latency('lognormal:0.4,0.5', rng).sample() for _ in range(501))
+    assert 0.3 < samples[250] < 0.5
+    with pytest.raises(ValueError):
+        Latency('gamma:1')
+
+
+def test_answer_and_streamed_answer(fresh_state, monkeypatch):
+    mock = MockGemini(latency='fixed:0', answer='Use a set for membership tests.', stream_chunks=4)
+
+    async def scenario():
+        answer = await gemini.answer_question('how do I dedupe?')
+        chunks = [chunk async for chunk in gemini.stream_answer('and faster?')]
+        return answer, chunks
+
+    answer, chunks = _run(mock, scenario, monkeypatch)
+    assert answer == 'Use a set for membership tests.'
+    assert len(chunks) == 4 and ''.join(chunks) == answer
+    assert mock.stats['generate'] == 1 and mock.stats['stream'] == 1
+    assert gemini.usage.tokens[('gemini-2.5-flash', 'qa', 'output')] > 0
+
+
+def test_structured_outputs_follow_the_schema(fresh_state, monkeypatch):
+    mock = MockGemini(latency='fixed:0', code_rate=1.0)
+    images = [(b'\x89PNG' + bytes([i]), 'image/png') for i in range(3)]
+
+    async def scenario():
+        single = await gemini.detect_code_in_image(b'\x89PNG', 'image/png')
+        batch = await gemini.classify_code_images(images)
+        mock.code_rate = 0.0
+        none = await gemini.classify_code_images(images)
+        return single, batch, none
+
+    single, batch, none = _run(mock, scenario, monkeypatch)
+    assert single is True
+    assert batch == [True, True, True]
+    assert none == [False, False, False]
+
+
+def test_canned_response(fresh_state, monkeypatch):
+    mock = MockGemini(latency='fixed:0', canned={'CodeDetectionResult': {'contains_code': True, 'confidence': 0.2}})
+
+    result = _run(mock, lambda: gemini.detect_code_in_image(b'img', 'image/png'), monkeypatch)
+    assert result is False
+
+
+def test_quota_and_error_injection(fresh_state, monkeypatch):
+    mock = MockGemini(latency='fixed:0', rpm=1)
+
+    async def scenario():
+        first = await gemini.answer_question('one')
+        limited = await gemini.answer_question('two')
+        mock.rpm, mock.error_rate = 0, 1.0
+        failed = await gemini.answer_question('three')
+        return first, limited, failed
+
+    first, limited, failed = _run(mock, scenario, monkeypatch)
+    assert not first.startswith('❌')
+    assert limited.startswith('❌') and 'RESOURCE_EXHAUSTED' in limited
+    assert failed.startswith('❌') and 'INTERNAL' in failed
+    assert mock.stats['quota_exceeded'] == 1 and mock.stats['errors'] == 1
+
+
+def test_context_cache_round_trip(fresh_state, monkeypatch):
+    monkeypatch.setattr(gemini, 'CONTEXT_CACHE_MIN_TOKENS', 1000)
+    mock = MockGemini(latency='fixed:0')
+    conversation = gemini._conversations.get(1)
+    big_file = [{'filename': 'app.py', 'content': 'x = 1\n' * 1500}]
+
+    async def ask(question, attachments=None):
+        return ''.join([c async for c in gemini.stream_answer(question, attachments, conversation=conversation)])
+
+    async def scenario():
+        await ask('review this', big_file)
+        return await ask('and the naming?')
+
+    answer = _run(mock, scenario, monkeypatch)
+    assert not answer.startswith('❌')
+    assert mock.stats['cache_create'] == 1
+    assert conversation.cache_name in mock.caches
+    assert gemini.usage.tokens[('gemini-2.5-flash', 'qa', 'cached')] > 0
@@ -0,0 +1,121 @@
+"""Token bucket and circuit breaker behaviour, including Gemini fallbacks while open."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import gemini
+from ratelimit import CircuitBreaker, RateLimitExceeded, TokenBucket
+
+
+def test_bucket_allows_burst_then_waits():
+    async def scenario():
+        bucket = TokenBucket(rate=100, capacity=3)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        return loop.time() - start
+
+    elapsed = asyncio.run(scenario())
+    assert 0.005 <= elapsed < 0.5
+
+
+def test_bucket_rejects_long_waits():
+    async def scenario():
+        bucket = TokenBucket(rate=0.01, capacity=1)
+        await bucket.acquire()
+        await bucket.acquire(max_wait=1)
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(scenario())
+
+
+def test_queued_callers_past_max_wait_are_rejected():
+    async def scenario():
+        bucket = TokenBucket(rate=10, capacity=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(*(bucket.acquire(max_wait=0.2) for _ in range(30)),
+                                        return_exceptions=True)
+        return results, loop.time() - start
+
+    results, elapsed = asyncio.run(scenario())
+    # One token in the bucket plus two more that arrive within 0.2s
+    assert results.count(None) == 3
+    assert all(isinstance(r, RateLimitExceeded) for r in results if r is not None)
+    assert elapsed < 0.5
+
+
+def test_breaker_opens_half_opens_and_closes(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('ratelimit.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    now[0] = 11
+    assert breaker.allow_request()  # the single half-open probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('ratelimit.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    now[0] = 11
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_open_breaker_skips_gemini(monkeypatch):
+    calls = 0
+
+    async def failing_generate(model, contents, config):
+        nonlocal calls
+        calls += 1
+        raise RuntimeError('429 RESOURCE_EXHAUSTED')
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=failing_generate)))
+    monkeypatch.setattr(gemini, '_client', client)
+    monkeypatch.setattr(gemini, '_buckets', {})
+    monkeypatch.setattr(gemini, '_breakers', {})
+
+    async def scenario():
+        return [await gemini.detect_code_in_image(b'img') for _ in range(20)]
+
+    assert asyncio.run(scenario()) == [True] * 20
+    # Five failures open the breaker; the rest fall back without a round trip
+    assert calls == 5
+    assert gemini.get_status()['gemini-2.5-flash']['breaker']['state'] == 'open'
+
+
+def test_local_throttling_does_not_open_the_breaker(monkeypatch):
+    async def generate_content(model, contents, config):
+        return SimpleNamespace(text='ok', usage_metadata=None)
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    monkeypatch.setattr(gemini, '_buckets', {'m': TokenBucket(rate=0.01, capacity=1)})
+    monkeypatch.setattr(gemini, '_breakers', {'m': CircuitBreaker('m', failure_threshold=2)})
+
+    async def scenario():
+        await gemini.generate(client, 'm', 'hi', None, timeout=1)
+        for _ in range(5):
+            with pytest.raises(RateLimitExceeded):
+                await gemini.generate(client, 'm', 'hi', None, timeout=1)
+
+    asyncio.run(scenario())
+
+    assert gemini._breakers['m'].state == CircuitBreaker.CLOSED
+    assert gemini._breakers['m'].failures == 0
@@ -0,0 +1,69 @@
+"""Reminder fan-out: mention chunking and the due-recipient query."""
+
+from reminders import MESSAGE_LIMIT, chunk_mentions
+
+TODAY = '2026-10-19'
+USER = 100000000000000000  # snowflake-sized ids: 18 digits, 21-char mentions
+
+
+def test_chunks_stay_within_message_limit():
+    user_ids = [USER + i for i in range(500)]
+
+    chunks = chunk_mentions(user_ids)
+
+    assert all(len(content) <= MESSAGE_LIMIT for content, _ in chunks)
+    assert sum(count for _, count in chunks) == len(user_ids)
+    assert " ".join(content for content, _ in chunks) == " ".join(f'<@{u}>' for u in user_ids)
+
+
+def test_chunk_boundary_is_exact():
+    # 21-char mentions joined by spaces: 90 take 1979 chars, a 91st would make 2001
+    chunks = chunk_mentions([USER + i for i in range(91)])
+
+    assert [count for _, count in chunks] == [90, 1]
+    assert len(chunks[0][0]) == 90 * 22 - 1
+    assert chunk_mentions([USER + i for i in range(90)], limit=90 * 22 - 1)[0][1] == 90
+
+
+def test_no_mentions_means_no_messages():
+    assert chunk_mentions([]) == []
+
+
+def _setup_guild(db):
+    db.set_server_setting(1, 'reminder_time', '12:30')
+    db.set_server_setting(1, 'reminder_channel_id', 99)
+    for user_id in (10, 11, 12, 13, 14):
+        db.update_streak_with_date(user_id, 1, 3, 3, 3, '2026-10-18')
+
+
+def test_due_recipients_for_guild_reminder(db):
+    _setup_guild(db)
+    db.set_user_setting(11, 1, 'opt_out_mentions', 1)
+    db.set_user_setting(12, 1, 'custom_reminder_time', '08:00')
+    db.log_specific_day(13, 1, TODAY, 4)
+    db.reset_streak(14, 1)
+
+    rows = db.get_due_reminder_recipients(TODAY, '12:30')
+
+    by_user = {user_id: (guild_id, channel_id, delivery, opt_out) for guild_id, channel_id, user_id, delivery, opt_out in rows}
+    # 12 has a custom time (DM only), 13 already logged, 14 has no active streak
+    assert set(by_user) == {10, 11}
+    assert by_user[10] == (1, 99, 'channel', 0)
+    assert by_user[11] == (1, 99, 'channel', 1)
+
+
+def test_due_recipients_for_custom_dm_time(db):
+    _setup_guild(db)
+    db.set_user_setting(12, 1, 'custom_reminder_time', '08:00')
+    db.set_user_setting(13, 1, 'custom_reminder_time', '08:00')
+    db.log_specific_day(13, 1, TODAY, 4)
+
+    rows = db.get_due_reminder_recipients(TODAY, '08:00')
+
+    assert rows == [(1, None, 12, 'dm', 0)]
+
+
+def test_no_recipients_at_other_times(db):
+    _setup_guild(db)
+
+    assert db.get_due_reminder_recipients(TODAY, '12:31') == []
@@ -0,0 +1,74 @@
+"""Daily rollover: grace period, automatic freezes, expiry and freeze awards."""
+
+RUN_DATE = '2026-10-19'
+
+
+def test_one_day_gap_is_covered_by_a_freeze(db):
+    # Last log 3 days ago: one day past the 2-day grace period
+    db.update_streak_with_date(1, 10, 5, 5, 5, '2026-10-16')
+
+    result = db.run_daily_rollover(RUN_DATE)
+
+    assert result['frozen'] == 1
+    assert result['expired'] == 0
+    current_streak, _, last_log_date, _ = db.get_streak(1, 10)
+    assert current_streak == 5
+    assert last_log_date == '2026-10-17'
+    assert db.get_streak_freeze(1, 10) == 0
+
+
+def test_gap_without_enough_freezes_expires(db):
+    # Two days past grace needs two freezes; the user only has the default one
+    db.update_streak_with_date(1, 10, 5, 5, 5, '2026-10-15')
+
+    result = db.run_daily_rollover(RUN_DATE)
+
+    assert result['expired'] == 1
+    current_streak, longest_streak, last_log_date, last_day_number = db.get_streak(1, 10)
+    assert (current_streak, longest_streak, last_day_number) == (0, 5, 0)
+    # The real last post is kept, no log is faked for the run date
+    assert last_log_date == '2026-10-15'
+    assert db.get_streak_freeze(1, 10) == 1
+
+
+def test_streak_inside_grace_period_is_untouched(db):
+    db.update_streak_with_date(1, 10, 5, 5, 5, '2026-10-17')
+
+    result = db.run_daily_rollover(RUN_DATE)
+
+    assert result == {'frozen': 0, 'expired': 0, 'awarded': 0}
+    assert db.get_streak(1, 10)[0] == 5
+
+
+def test_seven_day_milestone_awards_a_freeze(db):
+    db.update_streak_with_date(1, 10, 7, 7, 7, '2026-10-19')
+
+    assert db.run_daily_rollover(RUN_DATE)['awarded'] == 1
+    assert db.get_streak_freeze(1, 10) == 2
+
+    # The same milestone is not awarded again on later days
+    assert db.run_daily_rollover('2026-10-20')['awarded'] == 0
+    assert db.get_streak_freeze(1, 10) == 2
+
+
+def test_skipped_milestones_are_all_awarded(db):
+    db.update_streak_with_date(1, 10, 21, 21, 21, '2026-10-19')
+
+    assert db.run_daily_rollover(RUN_DATE)['awarded'] == 3
+    assert db.get_streak_freeze(1, 10) == 4
+
+
+def test_lowered_streak_can_earn_milestones_again(db):
+    db.update_streak_with_date(1, 10, 14, 14, 14, '2026-10-19')
+    db.run_daily_rollover(RUN_DATE)
+    db.clear_freeze_awards_above(1, 10, 7)
+
+    assert db.run_daily_rollover('2026-10-20')['awarded'] == 1
+
+
+def test_rerun_on_same_date_is_a_no_op(db):
+    db.update_streak_with_date(1, 10, 5, 5, 5, '2026-10-16')
+    db.run_daily_rollover(RUN_DATE)
+
+    assert db.run_daily_rollover(RUN_DATE) is None
+    assert db.get_streak_freeze(1, 10) == 0
@@ -0,0 +1,115 @@
+"""One-time startup steps and command syncing only when the tree changes."""
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+from discord import app_commands
+
+import startup
+
+
+class FakeTree(app_commands.CommandTree):
+    def __init__(self):
+        super().__init__(discord.Client(intents=discord.Intents.none()))
+        self.syncs = 0
+
+    async def sync(self, *, guild=None):
+        self.syncs += 1
+        return self.get_commands()
+
+
+def _tree(description='Show your streak'):
+    tree = FakeTree()
+
+    @tree.command(name='streak', description=description)
+    async def streak(interaction: discord.Interaction, days: int = 7):
+        pass
+
+    return tree
+
+
+def test_hash_tracks_command_changes():
+    assert startup.command_tree_hash(_tree()) == startup.command_tree_hash(_tree())
+    assert startup.command_tree_hash(_tree()) != startup.command_tree_hash(_tree('Show a streak'))
+
+
+def test_sync_is_skipped_while_the_tree_is_unchanged(db):
+    tree = _tree()
+    assert asyncio.run(startup.sync_commands(tree, db)) == 1
+    assert asyncio.run(startup.sync_commands(_tree(), db)) is None
+    assert tree.syncs == 1
+
+    changed = _tree('Show a streak')
+    assert asyncio.run(startup.sync_commands(changed, db)) == 1
+    assert changed.syncs == 1
+
+
+def test_steps_run_once_and_retry_after_failing():
+    calls = []
+
+    async def flaky():
+        calls.append('flaky')
+        if len(calls) == 1:
+            raise RuntimeError('gateway hiccup')
+
+    async def scenario():
+        state = startup.Startup()
+        with pytest.raises(RuntimeError):
+            await state.once('commands', flaky)
+        assert await state.once('commands', flaky) is True
+        assert await state.once('commands', flaky) is False
+        assert await state.once('dashboard', lambda: calls.append('dashboard')) is True
+        assert await state.once('dashboard', lambda: calls.append('dashboard')) is False
+
+    asyncio.run(scenario())
+
+    assert calls == ['flaky', 'flaky', 'dashboard']
+
+
+def test_catch_up_starts_at_the_first_unresumed_disconnect():
+    state = startup.Startup()
+    state.mark_disconnected()
+    first = state.disconnected_at
+    state.mark_disconnected()
+
+    assert state.take_gap() == first - startup.CATCH_UP_MARGIN
+    assert state.take_gap() is None
+
+    state.mark_disconnected()
+    state.mark_resumed()
+    assert state.take_gap() is None
+
+
+def test_failed_command_sync_is_retried_on_reconnect(db):
+    tree = _tree()
+    real_sync = tree.sync
+    attempts = []
+    catch_ups = []
+
+    async def sync(*, guild=None):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise discord.HTTPException(SimpleNamespace(status=503, reason='Service Unavailable'), 'unavailable')
+        return await real_sync()
+
+    tree.sync = sync
+    steps = [('commands', lambda: startup.sync_commands(tree, db))]
+
+    async def scenario():
+        state = startup.Startup()
+        assert await state.run(steps, catch_up=lambda: catch_ups.append(1)) is False
+        assert 'commands' not in state.done
+        assert state.state == startup.Startup.READY
+
+        state.mark_disconnected()
+        assert await state.run(steps, catch_up=lambda: catch_ups.append(1)) is True
+        assert 'commands' in state.done
+        assert await state.run(steps) is True
+
+    asyncio.run(scenario())
+
+    assert len(attempts) == 2
+    assert tree.syncs == 1
+    assert catch_ups == [1]
+    assert db.get_bot_setting(startup.COMMAND_HASH_KEY) == startup.command_tree_hash(tree)
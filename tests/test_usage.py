@@ -0,0 +1,125 @@
+"""Gemini usage tracking: counters, histograms, the daily ledger and per-guild budgets."""
+import asyncio
+from types import SimpleNamespace
+
+import gemini
+from usage import UsageTracker
+
+
+def _response(prompt=10, output=5):
+    return SimpleNamespace(usage_metadata=SimpleNamespace(prompt_token_count=prompt, candidates_token_count=output))
+
+
+def test_records_counters_tokens_and_latency():
+    tracker = UsageTracker()
+
+    tracker.record('flash', 'qa', 1, 'ok', 0.3, _response())
+    tracker.record('flash', 'qa', 1, 'timeout', 61)
+    tracker.record_fallback('image_detection', 1, 'error')
+
+    snapshot = tracker.snapshot()
+    assert {(c['outcome'], c['count']) for c in snapshot['calls']} == {('ok', 1), ('timeout', 1)}
+    assert snapshot['tokens'] == {'flash/qa/prompt': 10, 'flash/qa/output': 5}
+    buckets = snapshot['latency']['flash/qa']['buckets']
+    assert buckets['0.5'] == 1 and buckets['+Inf'] == 1
+    assert snapshot['fallbacks'] == {'image_detection/error': 1}
+
+
+def test_ledger_persists_and_seeds_budget_counts(db):
+    tracker = UsageTracker()
+    tracker.attach(db)
+    tracker.record('flash', 'image_detection', 7, 'ok', 0.2, _response(100, 3))
+    tracker.record('flash', 'image_detection', 7, 'error', 0.2)
+    # Rejected before reaching Gemini: not a billable call
+    tracker.record('flash', 'image_detection', 7, 'circuit_open', 0.0)
+    tracker.flush()
+
+    (purpose, calls, errors, fallbacks, prompt, output), = db.get_gemini_usage(7, tracker.today)
+    assert (purpose, calls, errors, prompt, output) == ('image_detection', 2, 1, 100, 3)
+
+    # A fresh tracker (e.g. after a restart) picks up today's count from the ledger
+    restarted = UsageTracker()
+    restarted.attach(db)
+    assert restarted.usage_today(7) == 2
+
+
+def test_buffered_usage_is_written_on_close(db):
+    async def scenario():
+        tracker = UsageTracker()
+        tracker.attach(db)
+        tracker.record('flash', 'qa', 7, 'ok', 0.2, _response())
+        assert db.get_gemini_usage(7, tracker.today) == []
+        await tracker.close()
+        return tracker.today
+
+    today = asyncio.run(scenario())
+
+    restarted = UsageTracker()
+    restarted.attach(db)
+    assert restarted.usage_today(7) == 1
+    assert db.get_gemini_usage(7, today)[0][1] == 1
+
+
+def test_budget_is_enforced_per_guild(db):
+    tracker = UsageTracker(default_budget=0)
+    tracker.attach(db)
+    tracker.set_budget(7, 2)
+
+    tracker.record('flash', 'qa', 7, 'ok', 0.1)
+    assert not tracker.over_budget(7)
+    tracker.record('flash', 'qa', 7, 'ok', 0.1)
+
+    assert tracker.over_budget(7)
+    assert not tracker.over_budget(8)
+    assert not tracker.over_budget(None)
+    assert dict(db.get_gemini_budgets()) == {7: 2}
+
+
+def test_over_budget_guild_skips_gemini_for_images(monkeypatch):
+    calls = 0
+
+    async def generate_content(model, contents, config):
+        nonlocal calls
+        calls += 1
+        return SimpleNamespace(text='{"verdicts": []}', usage_metadata=None)
+
+    tracker = UsageTracker()
+    tracker.set_budget(7, 1)
+    monkeypatch.setattr(gemini, 'usage', tracker)
+    monkeypatch.setattr(gemini, '_client', SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))))
+    monkeypatch.setattr(gemini, '_buckets', {})
+    monkeypatch.setattr(gemini, '_breakers', {})
+    images = [(b'img', 'image/png')]
+
+    async def scenario():
+        first = await gemini.classify_code_images(images, guild_id=7)
+        second = await gemini.classify_code_images(images, guild_id=7)
+        other_guild = await gemini.classify_code_images(images, guild_id=8)
+        return first, second, other_guild
+
+    assert asyncio.run(scenario()) == ([True], [True], [True])
+    # The second request for guild 7 was answered locally
+    assert calls == 2
+    assert tracker.snapshot()['fallbacks'] == {'image_detection/budget': 1}
+
+
+def _png(width, height):
+    return b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\rIHDR' + width.to_bytes(4, 'big') + height.to_bytes(4, 'big')
+
+
+def test_over_budget_images_are_judged_locally(monkeypatch):
+    async def generate_content(model, contents, config):
+        raise AssertionError('Gemini called over budget')
+
+    tracker = UsageTracker()
+    tracker.set_budget(7, 1)
+    tracker.record('flash', 'image_detection', 7, 'ok', 0.1)
+    monkeypatch.setattr(gemini, 'usage', tracker)
+    monkeypatch.setattr(gemini, '_client', SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))))
+    screenshot, emoji, gif = (_png(1280, 720), 'image/png'), (_png(64, 64), 'image/png'), (b'GIF89a' + bytes(8), 'image/png')
+
+    async def scenario():
+        return (await gemini.classify_code_images([screenshot, emoji, gif], guild_id=7),
+                await gemini.detect_code_in_image(*emoji, guild_id=7))
+
+    assert asyncio.run(scenario()) == ([True, False, False], False)
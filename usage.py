@@ -0,0 +1,190 @@
+"""Gemini usage accounting: counters and latency histograms, a daily ledger and per-guild budgets."""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger('LupinBot.usage')
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+# Ledger rows are written to the database at most this often
+FLUSH_INTERVAL = 60
+
+
+def _token_counts(response) -> tuple[int, int, int]:
+    """Prompt, output and cached-prompt token counts of a response."""
+    metadata = getattr(response, 'usage_metadata', None)
+    if metadata is None:
+        return 0, 0, 0
+    return (getattr(metadata, 'prompt_token_count', None) or 0,
+            getattr(metadata, 'candidates_token_count', None) or 0,
+            getattr(metadata, 'cached_content_token_count', None) or 0)
+
+
+class UsageTracker:
+    """Records every Gemini call by model, purpose, guild and outcome.
+
+    Counters and histograms live in memory for /api/metrics. Per-day totals are buffered and
+    flushed to the gemini_usage table, which also seeds today's per-guild counts after a
+    restart so budgets survive it. Guild 0 stands for calls made outside a guild.
+    """
+
+    def __init__(self, default_budget: int = 0):
+        self.default_budget = default_budget
+        self.db = None
+        self.lock = threading.Lock()
+        self.calls: Counter = Counter()  # (model, purpose, guild_id, outcome)
+        self.tokens: Counter = Counter()  # (model, purpose, 'prompt' | 'output' | 'cached')
+        self.fallbacks: Counter = Counter()  # (purpose, reason)
+        self.histograms: dict = {}  # (model, purpose) -> {'buckets', 'count', 'sum'}
+        self.pending: dict = {}  # (date, guild_id, model, purpose) -> [calls, errors, fallbacks, prompt, output, latency_ms]
+        self.today = datetime.utcnow().strftime("%Y-%m-%d")
+        self.guild_calls: Counter = Counter()
+        self.budgets: dict[int, int] = {}
+        self.last_flush = time.monotonic()
+        self.flushing = False
+
+    def attach(self, db):
+        """Persist to `db` and load today's totals and the configured budgets from it."""
+        self.db = db
+        self.budgets = dict(db.get_gemini_budgets())
+        self._load_today()
+
+    def _load_today(self):
+        self.guild_calls = Counter(dict(self.db.get_gemini_calls_by_guild(self.today))) if self.db else Counter()
+
+    def _roll_day(self):
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        if today != self.today:
+            self.today = today
+            try:
+                self._load_today()
+            except Exception as e:
+                logger.error(f"Could not load today's Gemini usage: {e}")
+                self.guild_calls = Counter()
+
+    def _ledger_row(self, guild_id: int, model: str, purpose: str) -> list:
+        return self.pending.setdefault((self.today, guild_id, model, purpose), [0, 0, 0, 0, 0, 0])
+
+    def record(self, model: str, purpose: str, guild_id: Optional[int], outcome: str, latency: float, response=None):
+        guild_id = guild_id or 0
+        prompt_tokens, output_tokens, cached_tokens = _token_counts(response)
+        self._roll_day()
+        with self.lock:
+            self.calls[(model, purpose, guild_id, outcome)] += 1
+            self.tokens[(model, purpose, 'prompt')] += prompt_tokens
+            self.tokens[(model, purpose, 'output')] += output_tokens
+            if cached_tokens:
+                self.tokens[(model, purpose, 'cached')] += cached_tokens
+            histogram = self.histograms.setdefault(
+                (model, purpose), {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0}
+            )
+            histogram['buckets'][next(i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound)] += 1
+            histogram['count'] += 1
+            histogram['sum'] += latency
+            # Calls rejected locally never reached Gemini and don't count against the budget
+            if outcome not in ('circuit_open', 'rate_limited'):
+                self.guild_calls[guild_id] += 1
+                row = self._ledger_row(guild_id, model, purpose)
+                row[0] += 1
+                row[1] += outcome != 'ok'
+                row[3] += prompt_tokens
+                row[4] += output_tokens
+                row[5] += int(latency * 1000)
+        self._maybe_flush()
+
+    def record_fallback(self, purpose: str, guild_id: Optional[int], reason: str):
+        """Count a local answer given instead of a Gemini verdict (error, budget, circuit open...)."""
+        with self.lock:
+            self.fallbacks[(purpose, reason)] += 1
+            self._ledger_row(guild_id or 0, '-', purpose)[2] += 1
+        self._maybe_flush()
+
+    def budget_for(self, guild_id: int) -> int:
+        return self.budgets.get(guild_id, self.default_budget)
+
+    def over_budget(self, guild_id: Optional[int]) -> bool:
+        """True once a guild has used its daily call budget (0 means unlimited)."""
+        if not guild_id:
+            return False
+        budget = self.budget_for(guild_id)
+        if budget <= 0:
+            return False
+        self._roll_day()
+        return self.guild_calls[guild_id] >= budget
+
+    def set_budget(self, guild_id: int, daily_calls: int):
+        if self.db:
+            self.db.set_gemini_budget(guild_id, daily_calls)
+        self.budgets[guild_id] = daily_calls
+
+    def usage_today(self, guild_id: int) -> int:
+        self._roll_day()
+        return self.guild_calls[guild_id]
+
+    def _maybe_flush(self):
+        if self.db is None or self.flushing or time.monotonic() - self.last_flush < FLUSH_INTERVAL:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self.flushing = True
+        loop.create_task(self._flush_in_thread())
+
+    async def _flush_in_thread(self):
+        try:
+            await asyncio.to_thread(self.flush)
+        finally:
+            self.flushing = False
+
+    async def close(self):
+        """Write out whatever is still buffered, on shutdown."""
+        await asyncio.to_thread(self.flush)
+
+    def flush(self):
+        """Write buffered ledger rows to the database."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        if not pending or self.db is None:
+            return
+        try:
+            self.db.add_gemini_usage([key + tuple(values) for key, values in pending.items()])
+        except Exception as e:
+            logger.error(f"Failed to write Gemini usage ledger: {e}")
+            # Keep the rows for the next flush
+            with self.lock:
+                for key, values in pending.items():
+                    row = self.pending.setdefault(key, [0] * 6)
+                    for i, value in enumerate(values):
+                        row[i] += value
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            calls = [
+                {'model': m, 'purpose': p, 'guild_id': g, 'outcome': o, 'count': n}
+                for (m, p, g, o), n in sorted(self.calls.items(), key=lambda item: str(item[0]))
+            ]
+            latency = {
+                f'{m}/{p}': {
+                    'count': h['count'],
+                    'mean_seconds': round(h['sum'] / h['count'], 3) if h['count'] else 0,
+                    'buckets': {('+Inf' if b == float('inf') else str(b)): c for b, c in zip(LATENCY_BUCKETS, h['buckets'])},
+                }
+                for (m, p), h in self.histograms.items()
+            }
+            tokens = {f'{m}/{p}/{kind}': n for (m, p, kind), n in self.tokens.items()}
+            fallbacks = {f'{p}/{r}': n for (p, r), n in self.fallbacks.items()}
+            today = dict(self.guild_calls)
+        return {'calls': calls, 'latency': latency, 'tokens': tokens, 'fallbacks': fallbacks,
+                'today': {'date': self.today, 'calls_by_guild': today}}
+
+
+tracker = UsageTracker(default_budget=int(os.environ.get("GEMINI_GUILD_DAILY_BUDGET", "0")))